@@ -0,0 +1,94 @@
+"""
+batch.py  •  Run many agent sessions in parallel over a pool of sandboxes
+
+Each prompt is handed to a worker thread that checks a sandbox out of a
+bounded pool (`<prefix>-0` … `<prefix>-<jobs-1>`), launches it if it is not
+live, runs a non-interactive session against it and returns it to the pool.
+Sandboxes are reused between prompts, so any patch a session applies is
+still in place for the next prompt that lands on the same sandbox.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures, logging, pathlib, queue, time
+from typing import Any, Dict, List, Tuple
+
+from . import health, llm_agent, storage
+from .registry import get_instance, remove_instance
+from .tools.pg_manager import fresh_clone_and_launch
+
+
+def read_prompts(path: str) -> List[str]:
+    """One prompt per line; blank lines and `#` comments are skipped."""
+    lines = pathlib.Path(path).read_text().splitlines()
+    return [ln.strip() for ln in lines if ln.strip() and not ln.lstrip().startswith("#")]
+
+
+def _ensure_live(label: str) -> None:
+    info = get_instance(label)
+    if info and health.is_live(info, use_cache=False):
+        return
+    if info and info.get("evicted"):
+        # stopped by the storage cap, not dead: rebuild what was evicted
+        if storage.restore(label)["status"] in ("started", "running"):
+            return
+    if info:
+        if not info.get("datadir"):
+            from .fleet import reclaim_worktree
+
+            reclaim_worktree(pathlib.Path(info["path"]), dry_run=False)     # the new clone goes elsewhere
+        remove_instance(label)
+    fresh_clone_and_launch(label)
+
+
+def _run_one(prompt: str, sandboxes: "queue.Queue[str]", max_turns: int) -> Dict[str, Any]:
+    label = sandboxes.get()
+    started = time.time()
+    result: Dict[str, Any] = {"prompt": prompt, "sandbox": label}
+    try:
+        _ensure_live(label)
+        summary = llm_agent.run_llm_loop(
+            prompt, sandbox_label=label, max_turns=max_turns, stream=False, echo=False
+        )
+        result["status"] = "finished" if summary is not None else "unfinished"
+        result["summary"] = summary
+    except Exception as exc:
+        logging.exception("Batch prompt failed on %s", label)
+        result["status"] = "error"
+        result["error"] = f"{exc.__class__.__name__}: {exc}"
+    finally:
+        sandboxes.put(label)
+    result["seconds"] = round(time.time() - started, 1)
+    return result
+
+
+def run_batch(
+    prompts: List[str], jobs: int = 2, prefix: str = "batch", max_turns: int = 99
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Run every prompt with at most *jobs* sessions (and sandboxes) at once.
+    Returns the results in prompt order and the wall-clock seconds taken.
+    """
+    started = time.time()
+    sandboxes: "queue.Queue[str]" = queue.Queue()
+    for i in range(jobs):
+        sandboxes.put(f"{prefix}-{i}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_run_one, p, sandboxes, max_turns) for p in prompts]
+        results = [f.result() for f in futures]
+    return results, round(time.time() - started, 1)
+
+
+def summarize(results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    """*seconds* is the batch's wall-clock time; prompt_seconds adds up the prompts."""
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {
+        "total": len(results),
+        "counts": counts,
+        "seconds": seconds,
+        "prompt_seconds": round(sum(r["seconds"] for r in results), 1),
+        "results": results,
+    }
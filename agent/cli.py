@@ -1,9 +1,11 @@
-import click, logging, json, os
+import click, logging, json, time
 from dotenv import load_dotenv
 
-from .registry import list_instances, remove_instance
-from .tools.pg_manager import fresh_clone_and_launch, apply_patch_and_relaunch
-from .llm_agent import run_llm_loop
+from .registry import list_instances, migrate_to_sqlite
+from . import fleet, profiles, storage
+
+# Commands import what they need (llm_agent, batch, pg_manager) inside their
+# bodies: `list`, `apply-patch` & co. must not pay for openai/psycopg/bs4.
 
 load_dotenv()
 
@@ -16,10 +18,38 @@ def cli():
 
 @cli.command()
 @click.option("--sandbox", "-s", help="Label of an existing sandbox to use.")
+@click.option(
+    "--stream/--no-stream",
+    default=True,
+    help="Stream model output and dispatch tools as soon as each call is complete.",
+)
+@click.option(
+    "--compact/--verbose-output",
+    default=True,
+    help="Send tools' compact encodings (tables, grouped hits, diffstats) to the model.",
+)
 @click.argument("prompt")
-def run_agent(prompt, sandbox):
+def run_agent(prompt, sandbox, stream, compact):
     """Start an interactive LLM session."""
-    run_llm_loop(prompt, sandbox_label=sandbox)
+    from .llm_agent import run_llm_loop
+    run_llm_loop(prompt, sandbox_label=sandbox, stream=stream, compact=compact)
+
+
+@cli.command("run-batch")
+@click.option("--jobs", "-j", default=2, show_default=True, help="Sessions (and sandboxes) run in parallel.")
+@click.option("--prefix", default="batch", show_default=True, help="Label prefix of the pooled sandboxes.")
+@click.option("--max-turns", default=99, show_default=True)
+@click.option("--output", "-o", type=click.Path(), help="Also write the JSON summary to this file.")
+@click.argument("prompts_file", type=click.Path(exists=True))
+def run_batch_cmd(prompts_file, jobs, prefix, max_turns, output):
+    """Run every prompt in PROMPTS_FILE (one per line) across a sandbox pool."""
+    from .batch import read_prompts, run_batch, summarize
+    results, seconds = run_batch(read_prompts(prompts_file), jobs=jobs, prefix=prefix, max_turns=max_turns)
+    report = json.dumps(summarize(results, seconds), indent=2)
+    if output:
+        with open(output, "w") as fp:
+            fp.write(report)
+    click.echo(report)
 
 
 @cli.command()
@@ -29,20 +59,221 @@ def list():
     click.echo(json.dumps(data, indent=2))
 
 
+@cli.command("registry-migrate")
+def registry_migrate():
+    """Move registry.json into the SQLite (WAL) registry backend."""
+    n = migrate_to_sqlite()
+    click.echo(f"Migrated {n} instance(s) to the SQLite registry.")
+
+
+def _fleet_options(fn):
+    fn = click.option("--jobs", "-j", default=8, show_default=True, help="Sandboxes handled in parallel.")(fn)
+    fn = click.option(
+        "--timeout", "-t", default=30, show_default=True,
+        help="Seconds per shutdown mode before escalating (smart → fast → immediate).",
+    )(fn)
+    return fn
+
+
+def _echo_results(results):
+    for r in results:
+        extra = r.get("mode") or r.get("stop_mode") or r.get("error") or ""
+        click.echo(f"{r['label']:<20} {r['status']:<12} {extra}")
+
+
 @cli.command()
-def stop_all():
+@_fleet_options
+@click.option("--keep", is_flag=True, help="Keep stopped sandboxes in the registry.")
+def stop_all(jobs, timeout, keep):
     """Stop and remove all managed instances."""
-    for name, info in list_instances().items():
-        os.system(f"pg_ctl -D {info['path']}/data stop")
-        remove_instance(name)
+    results = fleet.stop_all(jobs=jobs, timeout=timeout, remove=not keep)
+    _echo_results(results)
+    failed = [r for r in results if r["status"] == "failed"]
+    if failed:
+        raise SystemExit(1)
     click.echo("All instances stopped.")
 
 
 @cli.command()
+@_fleet_options
+def restart_all(jobs, timeout):
+    """Restart every managed instance."""
+    results = fleet.restart_all(jobs=jobs, timeout=timeout)
+    _echo_results(results)
+    if any(r["status"] == "failed" for r in results):
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+@click.option("--orphans", is_flag=True, help="Also remove unregistered pgdbg_* directories.")
+@click.option("--jobs", "-j", default=8, show_default=True)
+def gc(dry_run, orphans, jobs):
+    """Drop dead sandboxes from the registry and reclaim their disk space."""
+    report = fleet.gc(dry_run=dry_run, orphans=orphans, jobs=jobs)
+    for r in report["removed"]:
+        click.echo(f"{r['label'] or '(orphan)':<20} {fleet.fmt_bytes(r['bytes']):>10}  {r['path']}")
+    verb = "Would free" if dry_run else "Freed"
+    click.echo(f"{verb} {fleet.fmt_bytes(report['freed_bytes'])} "
+               f"({len(report['dead_entries'])} dead registry entries).")
+
+
+@cli.command()
+@click.option("--jobs", "-j", default=8, show_default=True)
+def usage(jobs):
+    """Measure every sandbox: source, build, install and data sizes."""
+    results = storage.refresh(jobs=jobs)
+    instances = list_instances()
+    click.echo(f"{'sandbox':<20}" + "".join(f"{p:>10}" for p in (*storage.PARTS, "total")) + "  idle")
+    for label, u in sorted(results.items(), key=lambda kv: -kv[1]["total"]):
+        idle = (time.time() - storage.last_used(instances.get(label, {}))) / 60
+        click.echo(f"{label:<20}" + "".join(f"{fleet.fmt_bytes(u[p]):>10}" for p in (*storage.PARTS, "total"))
+                   + f"  {idle:.0f}m")
+    total = sum(u["total"] for u in results.values())
+    cap = storage.cap_bytes()
+    click.echo(f"Total {fleet.fmt_bytes(total)}" + (f" of {fleet.fmt_bytes(cap)} cap" if cap else "")
+               + f"; new sandboxes go to {storage.base_dir()}.")
+
+
+@cli.command("enforce-cap")
+@click.option("--cap", help="Size cap, e.g. 50G (default: $PG_DEBUGGER_STORAGE_CAP).")
+@click.option("--idle", default=storage.IDLE_SECONDS // 60, show_default=True,
+              help="Only evict from sandboxes unused for this many minutes.")
+@click.option("--dry-run", is_flag=True, help="Only report what would be evicted.")
+def enforce_cap(cap, idle, dry_run):
+    """Evict build objects, install prefixes, then whole sandboxes (LRU) to fit the cap."""
+    if not cap and storage.cap_bytes() is None:
+        raise click.UsageError(f"Give --cap or set {storage.CAP_ENV}")
+    report = storage.enforce(cap=storage.parse_size(cap) if cap else None, idle=idle * 60, dry_run=dry_run)
+    for a in report["actions"]:
+        click.echo(f"{a['label']:<20} {a['evict']:<8} {fleet.fmt_bytes(a['bytes']):>10}"
+                   + (f"  failed: {a['error']}" if "error" in a else ""))
+    click.echo(f"{fleet.fmt_bytes(report['total_before'])} → {fleet.fmt_bytes(report['total_after'])} "
+               f"(cap {fleet.fmt_bytes(report['cap'])})" + (" – still over cap" if report["over_cap"] else ""))
+    if report["over_cap"] and not dry_run:
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.argument("label")
+def restore(label):
+    """Rebuild what enforce-cap evicted from LABEL and start it."""
+    result = storage.restore(label)
+    click.echo(f"{label}: {result['status']}" + (f" (rebuilt {', '.join(result['rebuilt'])})" if result["rebuilt"] else ""))
+    if result["status"] == "failed":
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.option(
+    "--profile", "-p", default="default", show_default=True,
+    type=click.Choice([*profiles.PROFILES]),
+    help="postgresql.conf profile applied after initdb.",
+)
 @click.argument("label")
-def new(label):
+def new(label, profile):
     """Fresh clone, build, and launch a new Postgres sandbox."""
-    fresh_clone_and_launch(label)
+    from .tools.pg_manager import fresh_clone_and_launch
+    fresh_clone_and_launch(label, profile=profile)
+
+
+@cli.command("new-cluster")
+@click.option("--replicas", "-n", default=1, show_default=True, help="Replicas to attach.")
+@click.option("--mode", "-m", default="streaming", show_default=True,
+              type=click.Choice(["streaming", "logical"]),
+              help="pg_basebackup standbys, or subscribers made with pg_createsubscriber.")
+@click.option(
+    "--profile", "-p", default="default", show_default=True,
+    type=click.Choice([*profiles.PROFILES]),
+    help="postgresql.conf profile, if LABEL has to be built first.",
+)
+@click.argument("label")
+def new_cluster(label, replicas, mode, profile):
+    """Build sandbox LABEL (unless it exists) and attach replicas sharing its build."""
+    from .replication import create_cluster
+    result = create_cluster(label, replicas=replicas, mode=mode, profile=profile)
+    click.echo(f"{label} (primary) on port {result['port']}")
+    for r in result["replicas"]:
+        click.echo(f"{r['label']} ({mode} replica) on port {r['port']}")
+
+
+@cli.command("drop-replica")
+@click.argument("label")
+def drop_replica(label):
+    """Stop replica LABEL, drop its slot and delete its data directory."""
+    from .replication import drop_replica as drop
+    result = drop(label)
+    click.echo(f"{label}: {result['status']} ({result['datadir']})")
+
+
+@cli.command("replication-status")
+@click.option("--interval", "-i", default=2.0, show_default=True, help="Seconds between the two samples.")
+@click.argument("label")
+def replication_status_cmd(label, interval):
+    """Lag, WAL generation and apply rates of LABEL's replication group."""
+    from .registry import get_instance
+    from .tools.replication import replication_status
+
+    info = get_instance(label)
+    if not info:
+        raise click.UsageError(f"No instance named '{label}'")
+    click.echo(replication_status(info["port"], sample_seconds=interval))
+
+
+@cli.command("set-profile")
+@click.argument("label")
+@click.argument("profile", type=click.Choice([*profiles.PROFILES]))
+def set_profile(label, profile):
+    """Switch sandbox LABEL to PROFILE (reload, or restart if required)."""
+    result = profiles.apply_profile(label, profile)
+    how = "restarted" if result["restarted"] else "reloaded"
+    click.echo(f"{label}: profile {profile} ({how}; changed: {', '.join(result['changed']) or 'nothing'})")
+
+
+@cli.command("show-profiles")
+def show_profiles():
+    """Print every profile's settings as computed for this host."""
+    host = profiles.host_facts()
+    click.echo(json.dumps({"host": host, **{n: profiles.render(n, host) for n in profiles.PROFILES}}, indent=2))
+
+
+@cli.command("prefetch-thread")
+@click.option("--base-url", help="Archive base URL (default https://www.postgresql.org).")
+@click.argument("url")
+def prefetch_thread(url, base_url):
+    """Cache every message and attachment of the mailing-list thread at URL."""
+    from .tools.archive_fetch import ArchiveFetcher
+
+    stats = ArchiveFetcher(base_url=base_url).prefetch_thread(url)
+    click.echo(
+        f"Cached {stats['messages']} message(s) and {stats['attachments']} attachment(s) "
+        f"({stats['network']} downloaded, {stats['revalidated']} revalidated, "
+        f"{stats['cached']} already cached)."
+    )
+
+
+@cli.command("run-workload")
+@click.option("--sandbox", "-s", help="Label of the sandbox to run against.")
+@click.option("--port", "-p", type=int, help="Port to run against (instead of --sandbox).")
+@click.option("--duration", "-d", type=float, help="Override the scenario duration (seconds).")
+@click.option("--save", is_flag=True, help="Save the scenario file under its name for later replays.")
+@click.argument("scenario")
+def run_workload_cmd(scenario, sandbox, port, duration, save):
+    """Run SCENARIO (a scenario file or the name of a saved one) and print its stats."""
+    from .registry import get_instance
+    from .tools import workload
+
+    if sandbox:
+        info = get_instance(sandbox)
+        if not info:
+            raise click.UsageError(f"No instance named '{sandbox}'")
+        port = info["port"]
+    if not port:
+        raise click.UsageError("Give --sandbox or --port")
+    data = workload.load_scenario(scenario)
+    if save:
+        click.echo(f"Saved to {workload.save_scenario(data)}", err=True)
+    click.echo(workload.run_workload(port, scenario=data, duration=duration))
 
 
 @cli.command("apply-patch")
@@ -58,6 +289,8 @@ def apply_patch(filepath, sandbox):
     Apply the unified-diff patch at FILEPATH to the specified sandbox,
     then rebuild and restart the server.
     """
+    from .tools.pg_manager import apply_patch_and_relaunch
+
     with open(filepath, "r") as fp:
         patch_text = fp.read()
 
@@ -1,22 +1,47 @@
 """
 Central place to discover the active sandbox for tools.
 
-The runner (llm_agent.py) sets `context.ACTIVE_LABEL` at the start of a
-session.  Tools call `src_root()` to get the checkout directory.
+The runner (llm_agent.py) enters `context.session(label)` at the start of
+a session.  Tools call `src_root()` to get the checkout directory.
+
+The label lives in a `contextvars.ContextVar`, so several sessions can run
+side by side in one process (one per thread, see batch.py) without seeing
+each other's sandbox.  Work handed to a thread pool must be submitted via
+`contextvars.copy_context().run` to carry the label along.
 """
 from __future__ import annotations
-import pathlib
-from .registry import list_instances
+import contextlib, contextvars, os, pathlib
+from typing import Iterator, Optional
+from .registry import get_instance
+
+_ACTIVE_LABEL: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "pgdbg_active_label", default=None
+)
+
+def get_label() -> Optional[str]:
+    return _ACTIVE_LABEL.get()
 
-ACTIVE_LABEL: str | None = None        # set by llm_agent at runtime
+def set_label(label: Optional[str]) -> contextvars.Token:
+    return _ACTIVE_LABEL.set(label)
 
-def get_label():
-    return ACTIVE_LABEL
+@contextlib.contextmanager
+def session(label: str) -> Iterator[str]:
+    """Make *label* the active sandbox for the duration of the block."""
+    token = _ACTIVE_LABEL.set(label)
+    try:
+        yield label
+    finally:
+        _ACTIVE_LABEL.reset(token)
 
 def src_root() -> pathlib.Path:
-    if not ACTIVE_LABEL:
-        raise RuntimeError("ACTIVE_LABEL not set by llm_agent")
-    info = list_instances().get(ACTIVE_LABEL)
+    label = get_label()
+    if not label:
+        # Outside a session, honour an explicitly exported checkout path.
+        env_src = os.environ.get("PG_DEBUGGER_SRC")
+        if env_src:
+            return pathlib.Path(env_src)
+        raise RuntimeError("No active sandbox: run inside context.session(label)")
+    info = get_instance(label)
     if not info:
-        raise RuntimeError(f"Sandbox '{ACTIVE_LABEL}' missing from registry")
+        raise RuntimeError(f"Sandbox '{label}' missing from registry")
     return pathlib.Path(info["path"])
@@ -0,0 +1,212 @@
+"""
+fleet.py  •  Lifecycle commands over every registered sandbox
+
+Stops and restarts run concurrently (bounded by *jobs*).  A stop starts
+with pg_ctl's `smart` mode and escalates to `fast`, then `immediate`, each
+time the previous mode does not finish within *timeout* seconds, so one
+sandbox with an open session cannot stall the whole fleet.
+
+`gc` drops registry entries whose server is gone and deletes their
+`pgdbg_*` worktrees (checkout, build objects, install prefix and data
+directory all live there), reporting how much disk was reclaimed.  A dead
+replica only loses its own data directory and its slot on the primary
+(replication.teardown); the shared worktree stays while anything lives in it.
+"""
+from __future__ import annotations
+
+import concurrent.futures, logging, os, pathlib, shutil, subprocess, time
+from typing import Any, Callable, Dict, List, Optional
+
+from . import health
+from .registry import data_dir, list_instances, remove_instance, reserved_paths
+from .storage import base_dir as sandbox_base_dir
+
+SHUTDOWN_MODES = ("smart", "fast", "immediate")
+WORKDIR_PREFIX = "pgdbg_"
+ORPHAN_GRACE = 3600     # an unregistered worktree touched this recently may still be building
+
+# ───────────────────────────── helpers ──────────────────────────────
+def _pg_ctl(info: Dict[str, Any]) -> str:
+    local = pathlib.Path(info["path"]) / "install" / "bin" / "pg_ctl"
+    return str(local) if local.exists() else "pg_ctl"
+
+
+def _datadir(info: Dict[str, Any]) -> pathlib.Path:
+    return data_dir(info)
+
+
+def disk_usage(path: pathlib.Path) -> int:
+    """Bytes allocated on disk under *path* (like `du -s`, no symlink following)."""
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def _parallel(fn: Callable[..., Dict[str, Any]], instances, jobs: int, **kw) -> List[Dict[str, Any]]:
+    if not instances:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(jobs, len(instances))) as pool:
+        futures = [pool.submit(fn, label, info, **kw) for label, info in instances.items()]
+        return [f.result() for f in futures]
+
+
+# ─────────────────────────── stop / start ───────────────────────────
+def stop_instance(label: str, info: Dict[str, Any], timeout: int = 30) -> Dict[str, Any]:
+    """Stop one server, escalating smart → fast → immediate on timeout."""
+    datadir = _datadir(info)
+    if not (datadir / "postmaster.pid").exists():
+        return {"label": label, "status": "not running"}
+
+    for mode in SHUTDOWN_MODES:
+        cmd = [_pg_ctl(info), "-D", str(datadir), "stop", "-m", mode, "-w", "-t", str(timeout)]
+        logging.info("🛑 %s: pg_ctl stop -m %s", label, mode)
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout + 10)
+        except subprocess.TimeoutExpired:
+            continue
+        if proc.returncode == 0 or not (datadir / "postmaster.pid").exists():
+            health.invalidate(info)
+            return {"label": label, "status": "stopped", "mode": mode}
+        logging.warning("%s: %s shutdown did not finish: %s", label, mode, proc.stderr.strip())
+
+    return {"label": label, "status": "failed"}
+
+
+def start_instance(label: str, info: Dict[str, Any], timeout: int = 60) -> Dict[str, Any]:
+    datadir = _datadir(info)
+    cmd = [
+        _pg_ctl(info), "-D", str(datadir), "-o", f"-p {info['port']}",
+        "-l", str(datadir / "server.log"), "-w", "-t", str(timeout), "start",
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    health.invalidate(info)
+    if proc.returncode != 0:
+        return {"label": label, "status": "failed", "error": proc.stderr.strip()[-500:]}
+    return {"label": label, "status": "started"}
+
+
+def restart_instance(label: str, info: Dict[str, Any], timeout: int = 30) -> Dict[str, Any]:
+    stopped = stop_instance(label, info, timeout=timeout)
+    if stopped["status"] == "failed":
+        return stopped
+    started = start_instance(label, info, timeout=max(timeout, 60))
+    return {**started, "stop_mode": stopped.get("mode")}
+
+
+def stop_all(jobs: int = 8, timeout: int = 30, remove: bool = True) -> List[Dict[str, Any]]:
+    """Stop every registered sandbox; drop stopped ones from the registry."""
+    results = _parallel(stop_instance, list_instances(), jobs, timeout=timeout)
+    if remove:
+        for r in results:
+            if r["status"] != "failed":
+                remove_instance(r["label"])
+    return results
+
+
+def restart_all(jobs: int = 8, timeout: int = 30) -> List[Dict[str, Any]]:
+    return _parallel(restart_instance, list_instances(), jobs, timeout=timeout)
+
+
+# ──────────────────────────────── gc ────────────────────────────────
+def reclaim_worktree(path: pathlib.Path, dry_run: bool) -> int:
+    """Delete the `pgdbg_*` worktree *path*; returns the bytes it held (freed unless *dry_run*)."""
+    if not path.is_dir() or not path.name.startswith(WORKDIR_PREFIX):
+        return 0    # never delete anything we did not create
+    size = disk_usage(path)
+    if not dry_run:
+        shutil.rmtree(path, ignore_errors=True)
+    return size
+
+
+def _recently_modified(path: pathlib.Path, grace: float) -> bool:
+    """*path* or one of its direct entries changed within *grace* seconds."""
+    cutoff = time.time() - grace
+    try:
+        return path.stat().st_mtime > cutoff or any(
+            child.lstat().st_mtime > cutoff for child in path.iterdir())
+    except OSError:
+        return True     # vanishing under us: someone is working there
+
+
+def gc(
+    dry_run: bool = False,
+    orphans: bool = False,
+    base_dir: Optional[str] = None,
+    jobs: int = 8,
+) -> Dict[str, Any]:
+    """
+    Remove dead sandboxes and reclaim their worktrees.
+
+    With *orphans*, also delete `pgdbg_*` directories under *base_dir*
+    (default: PG_DEBUGGER_SANDBOX_DIR, else the system temp dir) that no
+    registry entry refers to and that have no running postmaster.  Sandboxes
+    still being cloned or built are not registered yet, so directories that
+    hold a live port reservation or changed in the last ORPHAN_GRACE seconds
+    are left alone.
+    """
+    instances = list_instances()
+    live = health.check_all(instances, max_workers=jobs, use_cache=False)
+    dead = {label: info for label, info in instances.items() if not live[label]}
+    keep = {pathlib.Path(info["path"]) for label, info in instances.items() if live[label]}
+
+    # dead replicas own only their data directory; their worktree is the primary's
+    replicas = {label: info for label, info in dead.items() if info.get("datadir")}
+    targets: Dict[pathlib.Path, Optional[str]] = {
+        pathlib.Path(info["path"]): label for label, info in dead.items() if label not in replicas
+    }
+    if orphans:
+        known = {pathlib.Path(info["path"]) for info in instances.values()} | reserved_paths()
+        base = pathlib.Path(base_dir) if base_dir else sandbox_base_dir()
+        for d in base.glob(f"{WORKDIR_PREFIX}*"):
+            if d in known or not d.is_dir():
+                continue
+            if health._postmaster_state(d / "data", 0) is not False:
+                continue    # something may still be running there
+            if _recently_modified(d, ORPHAN_GRACE):
+                continue    # probably a clone/build in progress elsewhere
+            targets[d] = None
+
+    removed: List[Dict[str, Any]] = []
+    if replicas:
+        from .replication import teardown
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            freed = {label: pool.submit(teardown, label, info, dry_run) for label, info in replicas.items()}
+            for label, fut in freed.items():
+                gone_anyway = dry_run and pathlib.Path(replicas[label]["path"]) in targets \
+                    and pathlib.Path(replicas[label]["path"]) not in keep
+                removed.append({"label": label, "path": str(data_dir(replicas[label])),
+                                "bytes": 0 if gone_anyway else fut.result()})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        sizes = {
+            path: pool.submit(reclaim_worktree, path, dry_run)
+            for path in targets if path not in keep
+        }
+        for path, fut in sizes.items():
+            removed.append({"label": targets[path], "path": str(path), "bytes": fut.result()})
+
+    if not dry_run:
+        for label in dead:
+            if label not in replicas:       # teardown already dropped those
+                remove_instance(label)
+
+    return {
+        "dry_run": dry_run,
+        "removed": removed,
+        "dead_entries": sorted(dead),
+        "freed_bytes": sum(r["bytes"] for r in removed),
+    }
@@ -0,0 +1,32 @@
+"""
+fsutil.py  •  Atomic file replacement
+
+`atomic_write(path, data)` writes a temp file next to *path* and renames it
+over *path*, so readers see either the old or the new contents, never a
+partial file.  The temp file is removed if anything fails.
+"""
+from __future__ import annotations
+
+import contextlib, json, os, pathlib, tempfile
+from typing import Any, Union
+
+
+def atomic_write(path: pathlib.Path, data: Union[bytes, str], fsync: bool = False) -> None:
+    """Replace *path* with *data*; with *fsync*, also flush it to disk before the rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def atomic_write_json(path: pathlib.Path, obj: Any, fsync: bool = False, **dump_kwargs: Any) -> None:
+    atomic_write(path, json.dumps(obj, **dump_kwargs), fsync=fsync)
@@ -0,0 +1,103 @@
+"""
+health.py  •  Fast liveness checks for registered sandboxes
+
+`is_live` first looks at the data directory's `postmaster.pid`: a missing
+file or a dead postmaster PID settles it without touching the network, and
+a live PID whose Unix socket exists counts as up.  Only when the pid file
+is inconclusive (unreadable, port mismatch, socket elsewhere) does it fall
+back to a real connection.  `check_all` probes every instance concurrently,
+and results are cached for LIVENESS_TTL seconds.
+"""
+from __future__ import annotations
+
+import concurrent.futures, os, pathlib, threading, time
+from typing import Any, Dict, Optional, Tuple
+
+from .registry import data_dir, list_instances, pid_alive
+
+LIVENESS_TTL = 5.0
+CONNECT_TIMEOUT = 1
+
+_cache: Dict[Tuple[str, int], Tuple[float, bool]] = {}
+_cache_lock = threading.Lock()
+
+
+def _postmaster_state(datadir: pathlib.Path, port: int) -> Optional[bool]:
+    """True/False when postmaster.pid decides it, None when we must connect."""
+    try:
+        lines = (datadir / "postmaster.pid").read_text().splitlines()
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return None
+    try:
+        pid = int(lines[0])
+    except (IndexError, ValueError):
+        return None
+    if not pid_alive(pid):
+        return False
+    # line 4 is the port, line 5 the first socket directory
+    if len(lines) >= 5 and lines[3].strip() == str(port) and lines[4].strip():
+        if (pathlib.Path(lines[4].strip()) / f".s.PGSQL.{port}").exists():
+            return True
+    return None
+
+
+def ping(port: int) -> bool:
+    """Connection-level check, as both `postgres` and the OS user."""
+    import psycopg
+
+    dsn = f"host=127.0.0.1 port={port} dbname=postgres connect_timeout={CONNECT_TIMEOUT}"
+    for user in ("postgres", os.getenv("USER", "")):
+        try:
+            psycopg.connect(f"{dsn} user={user}").close()
+            return True
+        except psycopg.OperationalError:
+            continue
+    return False
+
+
+def is_live(info: Dict[str, Any], use_cache: bool = True) -> bool:
+    key = (info["path"], info["port"])
+    now = time.monotonic()
+    if use_cache:
+        with _cache_lock:
+            hit = _cache.get(key)
+        if hit and now - hit[0] < LIVENESS_TTL:
+            return hit[1]
+
+    state = _postmaster_state(data_dir(info), info["port"])
+    live = ping(info["port"]) if state is None else state
+
+    with _cache_lock:
+        _cache[key] = (now, live)
+    return live
+
+
+def check_all(
+    instances: Optional[Dict[str, Dict[str, Any]]] = None,
+    max_workers: int = 16,
+    use_cache: bool = True,
+) -> Dict[str, bool]:
+    """{label: live?} for every instance, probed in parallel."""
+    if instances is None:
+        instances = list_instances()
+    if not instances:
+        return {}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(instances))
+    ) as pool:
+        futures = {
+            label: pool.submit(is_live, info, use_cache)
+            for label, info in instances.items()
+        }
+        return {label: f.result() for label, f in futures.items()}
+
+
+def invalidate(info: Optional[Dict[str, Any]] = None) -> None:
+    """Forget cached liveness (for one instance, or all)."""
+    with _cache_lock:
+        if info is None:
+            _cache.clear()
+        else:
+            _cache.pop((info["path"], info["port"]), None)
@@ -14,25 +14,33 @@ Agent:
 
 Because every tool result is in the conversation, the model won’t repeat
 identical calls.
+
+Streaming
+---------
+With `stream=True` (the default) the summary is printed token by token and
+each function call is dispatched to a worker thread the moment its
+arguments are complete, so a slow rebuild or query overlaps with the rest
+of the model output.  Calls still run one at a time, in the order they
+were emitted (a single worker): a query must not race a rebuild or a
+patch being applied.  Ctrl-C cancels the current generation only: the
+partial text is kept, the user may add a note, and the session continues.
+A failed response or a call with malformed arguments likewise costs one
+turn, not the session.
 """
 
 from __future__ import annotations
 
-import datetime, json, logging, os, pathlib
-from typing import Any, Dict, List, Optional
-
-import psycopg
-from openai import OpenAI
+import concurrent.futures, contextvars, dataclasses, datetime, json, logging, pathlib, subprocess, threading
+from typing import Any, Dict, List, Optional, Tuple
 
 from .registry import list_instances, remove_instance
-from .tools import code_lookup, file_ops, query_exec, search_code, list_dir, get_patch
 from .tools.pg_manager import fresh_clone_and_launch
 
-from . import context
+from . import context, health, storage, tools
+from .tools import output
 
 # ─────────────────────────── logging ────────────────────────────────
 LOG_DIR = pathlib.Path.home() / ".pg_debugger_agent"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / f"pgdbg-{datetime.date.today():%Y%m%d}.log"
 
 # logging.basicConfig(
@@ -41,22 +49,26 @@ LOG_FILE = LOG_DIR / f"pgdbg-{datetime.date.today():%Y%m%d}.log"
 #     handlers=[logging.StreamHandler(), logging.FileHandler(LOG_FILE, "a", "utf-8")],
 # )
 
-client = OpenAI()
+MODEL = "gpt-4.1"
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The OpenAI client, built on first use (so no API key is needed until then)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI()
+    return _client
 
 # ─────────────────────────── tool registry ───────────────────────────
 def finish(summary) -> str:
     return summary
 
+# Built-in tools; everything in tools.MANIFEST is added on first use.
 TOOLS: Dict[str, Dict[str, Any]] = {
-    "read_file": {"impl": file_ops.read_file, "spec": file_ops.tool_spec},
-    "lookup_code_reference": {
-        "impl": code_lookup.lookup_code_reference,
-        "spec": code_lookup.tool_spec,
-    },
-    "execute_query": {"impl": query_exec.execute_query, "spec": query_exec.tool_spec},
-    "list_dir":  {"impl": list_dir.list_dir,   "spec": list_dir.tool_spec},
-    "search_code": {"impl": search_code.search_code, "spec": search_code.tool_spec},
-    "get_patch": {"impl": get_patch.get_patch, "spec": get_patch.tool_spec},
     "finish": {
         "impl": finish,
         "spec": {
@@ -74,57 +86,223 @@ TOOLS: Dict[str, Dict[str, Any]] = {
         },
     },
 }
-TOOL_SPECS = [t["spec"] for t in TOOLS.values()]
 
-# ───────────────────── sandbox helpers ───────────────────────────────
-def _ping(port: int) -> bool:
-    dsn = f"host=127.0.0.1 port={port} dbname=postgres connect_timeout=1"
-    for user in ("postgres", os.getenv("USER", "")):
-        try:
-            psycopg.connect(f"{dsn} user={user}").close()
-            return True
-        except psycopg.OperationalError:
-            continue
-    return False
 
+def _tool(name: str) -> Dict[str, Any]:
+    if name not in TOOLS:
+        TOOLS[name] = tools.load(name)
+    return TOOLS[name]
+
+
+def _tool_specs() -> List[Dict[str, Any]]:
+    names = [*tools.MANIFEST, *(n for n in TOOLS if n not in tools.MANIFEST)]
+    return [_tool(n)["spec"] for n in names]
 
+# ───────────────────── sandbox helpers ───────────────────────────────
 def _ensure_sandbox(label: Optional[str]) -> tuple[str, int]:
     inst = list_instances()
     if label:
         info = inst.get(label)
-        if not info or not _ping(info["port"]):
+        if info and info.get("evicted") and not health.is_live(info):
+            storage.restore(label)      # stopped by the storage cap: bring it back
+        if not info or not health.is_live(info):
             raise RuntimeError(f"Sandbox '{label}' is not live.")
         return label, info["port"]
 
-    for name, info in list(inst.items()):
-        if _ping(info["port"]):
+    # replicas are read-only standbys (and their cleanup belongs to gc)
+    inst = {name: info for name, info in inst.items() if info.get("role") != "replica"}
+    live = health.check_all(inst)
+    for name, info in inst.items():
+        if live[name]:
             return name, info["port"]
-        remove_instance(name)
 
-    port, _ = fresh_clone_and_launch("default")
-    return "default", port
+    # evicted sandboxes are stopped on purpose: bring one back, drop the dead
+    for name, info in inst.items():
+        if info.get("evicted"):
+            try:
+                if storage.restore(name)["status"] in ("started", "running"):
+                    return name, info["port"]
+            except (OSError, subprocess.CalledProcessError, RuntimeError) as exc:
+                logging.warning("Could not restore sandbox %s: %s", name, exc)
+        else:
+            remove_instance(name)
+
+    label = "default"
+    taken = list_instances()
+    n = 1
+    while label in taken:       # never clone over an existing entry
+        n += 1
+        label = f"default-{n}"
+    port, _ = fresh_clone_and_launch(label)
+    return label, port
+
+
+_LOG_LOCK = threading.Lock()
 
 
 def _log_conversation(prompt, turn, conversation):
     out = {
+        "sandbox": context.get_label(),
         "turn": turn,
         "prompt": prompt,
         "conversation": conversation
     }
-    with open(LOG_FILE, 'a') as f:
-        json.dump(out, f)
-        f.write('\n')
+    meter = output.current_meter()
+    if meter is not None:
+        out["tool_tokens"] = meter.summary()
+    line = json.dumps(out) + "\n"
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with _LOG_LOCK, open(LOG_FILE, 'a') as f:
+        f.write(line)
+
+# ───────────────────────── tool dispatch ────────────────────────────
+def _dispatch(name: str, args: Dict[str, Any]) -> Any:
+    """Run one tool call, turning exceptions into a result string."""
+    logging.info("🔧 %-15s %s", name, args)
+    try:
+        result = _tool(name)["impl"](**args)
+    except Exception as exc:
+        result = f"❌ {exc.__class__.__name__}: {exc}"
+    logging.info("✅ %-15s %s", name, str(result)[:120])
+    return result
+
+
+def _render_result(name: str, result: Any) -> str:
+    """A tool result as it goes into the conversation: compacted, cut to budget, metered."""
+    try:
+        budget = _tool(name).get("budget")
+    except KeyError:            # a tool name the model made up; _dispatch already said so
+        budget = tools.DEFAULT_BUDGET
+    return output.finalize(name, result, budget)
+
+
+def _collect(turn: _Turn) -> Tuple[List[Tuple[str, Dict[str, Any], str]], bool]:
+    """
+    Wait for *turn*'s calls in emission order: [(name, args, result text)]
+    and whether the user pressed Ctrl-C meanwhile (calls not yet started
+    are then cancelled, and say so).
+    """
+    results = []
+    interrupted = False
+    for name, args, future in turn.calls:
+        try:
+            if interrupted and future.cancel():
+                result = "❌ Cancelled by user before it ran"
+            else:
+                result = _render_result(name, future.result())
+        except KeyboardInterrupt:
+            interrupted = True
+            result = ("❌ Interrupted by user while waiting for the result"
+                      + ("" if future.cancel() else " (the call keeps running in the background)"))
+        except Exception as exc:
+            result = f"❌ {exc.__class__.__name__}: {exc}"
+        results.append((name, args, result))
+    return results, interrupted
+
+
+@dataclasses.dataclass
+class _Turn:
+    """What one model response produced; filled in while it streams."""
+    text: List[str] = dataclasses.field(default_factory=list)
+    calls: List[Tuple[str, Dict[str, Any], concurrent.futures.Future]] = dataclasses.field(
+        default_factory=list
+    )
+
+    @property
+    def output_text(self) -> str:
+        return "".join(self.text)
+
+
+class TurnFailed(RuntimeError):
+    """The model's response ended in an error; the session can go on."""
+
+
+def _submit(turn: _Turn, pool, name: str, arguments: Optional[str]) -> None:
+    try:
+        args = json.loads(arguments or "{}")
+    except json.JSONDecodeError as exc:
+        # report it like any failing call, so the model can fix its JSON
+        failed: concurrent.futures.Future = concurrent.futures.Future()
+        failed.set_result(f"❌ bad arguments ({exc}): {arguments}")
+        turn.calls.append((name, {}, failed))
+        return
+    # carry the session's sandbox label into the worker thread
+    ctx = contextvars.copy_context()
+    turn.calls.append((name, args, pool.submit(ctx.run, _dispatch, name, args)))
+
+
+def _stream_turn(client_, conversation, pool, turn: _Turn, echo: bool = True) -> None:
+    """
+    Stream one response into *turn*, printing text deltas as they arrive and
+    submitting every function call to *pool* as soon as it is complete.
+    """
+    stream = client_.responses.create(
+        model=MODEL, input=conversation, tools=_tool_specs(), stream=True
+    )
+    try:
+        for event in stream:
+            etype = getattr(event, "type", "")
+            if etype == "response.output_text.delta":
+                turn.text.append(event.delta)
+                if echo:
+                    print(event.delta, end="", flush=True)
+            elif etype == "response.output_item.done":
+                item = event.item
+                if getattr(item, "type", "") == "function_call":
+                    _submit(turn, pool, item.name, item.arguments)
+            elif etype in ("response.failed", "response.incomplete", "error"):
+                raise TurnFailed(f"Model stream ended with {etype}")
+    finally:
+        stream.close()
+        if echo and turn.text:
+            print()
+
+
+def _complete_turn(client_, conversation, pool, turn: _Turn, echo: bool = True) -> None:
+    """Non-streaming variant: wait for the whole response, then dispatch."""
+    resp = client_.responses.create(model=MODEL, input=conversation, tools=_tool_specs())
+    if resp.output_text:
+        turn.text.append(resp.output_text)
+        if echo:
+            print(resp.output_text)
+    for item in resp.output:
+        if getattr(item, "type", "") == "function_call":
+            _submit(turn, pool, item.name, item.arguments)
+
+
+def _ask_after_interrupt(why: str = "Generation cancelled.") -> Optional[str]:
+    """Return a note for the agent ('' to just continue) or None to quit."""
+    try:
+        return input(
+            f"\n⏸  {why} Add a note for the agent "
+            "(Enter to continue, Ctrl-C to quit): "
+        ).strip()
+    except (KeyboardInterrupt, EOFError):
+        return None
+
 
 # ───────────────────────── main loop ────────────────────────────────
 def run_llm_loop(
     prompt: str,
     sandbox_label: Optional[str] = None,
     max_turns: int = 99,
-) -> None:
+    stream: bool = True,
+    echo: bool = True,
+    compact: bool = True,
+) -> Optional[str]:
+    """
+    Drive the model until it calls `finish` (returning its summary) or
+    *max_turns* run out (returning None).  The sandbox label is scoped to
+    this call, so concurrent sessions in other threads are unaffected.
+    With *compact* (the default) tools return their compact encodings
+    (see tools/output.py); token savings are logged at the end.
+    """
     label, port = _ensure_sandbox(sandbox_label)
+    with context.session(label), output.session(compact):
+        return _session_loop(prompt, port, max_turns, stream, echo)
 
-    context.ACTIVE_LABEL = label            
 
+def _session_loop(prompt, port, max_turns, stream, echo) -> Optional[str]:
     conversation: List[Dict[str, Any]] = [
         {
             "role": "system",
@@ -142,44 +320,59 @@ def run_llm_loop(
         },
         {"role": "user", "content": prompt},
     ]
-
-    for turn in range(max_turns):
-        _log_conversation(prompt, turn, conversation)
-        resp = client.responses.create(
-            model="gpt-4.1", input=conversation, tools=TOOL_SPECS
-        )
-
-        if resp.output_text:
-            summary = resp.output_text
-            print(summary)
-            conversation.append({"role": "assistant", "content": summary})
-
-        # Tool calls
-        for item in resp.output:
-            if getattr(item, "type", "") != "function_call":
-                continue
-
-            call = item
-            tool = TOOLS[call.name]["impl"]
-            args = json.loads(call.arguments or "{}")
-
+    run_turn = _stream_turn if stream else _complete_turn
+
+    # one worker: calls start early but never overlap (see module docstring)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        for turn_no in range(max_turns):
+            _log_conversation(prompt, turn_no, conversation)
+            storage.touch(context.get_label())
+            turn = _Turn()
+            interrupted = False
+            failure = None
             try:
-                result = tool(**args)
-            except Exception as exc:
-                result = f"❌ {exc.__class__.__name__}: {exc}"
-
-            logging.info("🔧 %-15s %s", call.name, args)
-            logging.info("✅ %-15s %s", call.name, str(result)[:120])
-
-            # Append result as plain assistant text
-            conversation.append(
-                {"role": "assistant", "content": f"{call.name}({json.dumps(args)}) result: {result}"}
-            )
-
-            if call.name == "finish":
-                print("✔️  Agent: done.")
-                return
-            
-        
+                run_turn(get_client(), conversation, pool, turn, echo=echo)
+            except KeyboardInterrupt:
+                interrupted = True
+            except TurnFailed as exc:
+                logging.warning("⚠️  %s", exc)
+                failure = str(exc)
+                # interactive: let the user retry or steer; batch: the next turn retries
+                interrupted = echo
+
+            if turn.output_text or failure:
+                summary = turn.output_text
+                if interrupted and not failure:
+                    summary += "\n[generation cancelled by user]"
+                if failure:
+                    summary += f"\n[{failure}]"
+                conversation.append({"role": "assistant", "content": summary.lstrip()})
+
+            # Tool results, in the order the calls were emitted
+            finished = None
+            results, waiting_interrupted = _collect(turn)
+            interrupted = interrupted or waiting_interrupted
+            for name, args, result in results:
+                # Append result as plain assistant text
+                conversation.append(
+                    {"role": "assistant", "content": f"{name}({json.dumps(args)}) result: {result}"}
+                )
+                if name == "finish":
+                    finished = str(result)
+
+            if finished is not None:
+                if echo:
+                    print("✔️  Agent: done.")
+                return finished
+
+            if interrupted:
+                note = _ask_after_interrupt("Model response failed." if failure else "Generation cancelled.")
+                if note is None:
+                    _log_conversation(prompt, turn_no + 1, conversation)
+                    print("⏹  Session stopped by user.")
+                    return None
+                if note:
+                    conversation.append({"role": "user", "content": note})
 
     logging.warning("Stopped after %d turns without finish.", max_turns)
+    return None
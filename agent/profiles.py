@@ -0,0 +1,163 @@
+"""
+profiles.py  •  Named postgresql.conf profiles for sandboxes
+
+A profile is a set of GUCs written to `<datadir>/pgdbg_profile.conf`,
+which `postgresql.conf` pulls in with `include_if_exists`.  Profiles are
+applied right after initdb and can be switched later; the server is
+reloaded, or restarted when a changed setting needs it.
+
+* default         – stock settings
+* fast-iteration  – durability off, small buffers, no autovacuum noise
+* benchmark       – sized from host RAM/cores, huge pages when the host
+                    has them reserved
+
+The active profile, the exact settings and the host they were computed
+for are stored in the registry entry, so benchmark output can say what it
+ran against (see `benchmark_context`).
+"""
+from __future__ import annotations
+
+import logging, os, pathlib, re, subprocess
+from typing import Any, Callable, Dict, Optional
+
+from .registry import data_dir, find_by_port, get_instance, update_instance
+
+PROFILE_FILE = "pgdbg_profile.conf"
+INCLUDE_LINE = f"include_if_exists = '{PROFILE_FILE}'"
+
+# GUCs that only take effect after a restart
+RESTART_GUCS = {
+    "shared_buffers", "huge_pages", "max_connections", "max_worker_processes",
+    "wal_level", "max_wal_senders", "max_replication_slots", "wal_buffers",
+    "shared_preload_libraries", "max_locks_per_transaction", "max_prepared_transactions",
+    "autovacuum_max_workers",
+}
+
+MB = 1024 * 1024
+
+
+# ─────────────────────────── host facts ─────────────────────────────
+def host_facts() -> Dict[str, Any]:
+    mem = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    hugepages = 0
+    try:
+        m = re.search(r"^HugePages_Total:\s+(\d+)", pathlib.Path("/proc/meminfo").read_text(), re.M)
+        hugepages = int(m.group(1)) if m else 0
+    except OSError:
+        pass
+    return {"cpus": os.cpu_count() or 1, "mem_bytes": mem, "hugepages": hugepages}
+
+
+def _mb(n: float) -> str:
+    return f"{max(int(n // MB), 1)}MB"
+
+
+# ───────────────────────────── profiles ─────────────────────────────
+def _default(host: Dict[str, Any]) -> Dict[str, str]:
+    return {}
+
+
+def _fast_iteration(host: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "fsync": "off",
+        "synchronous_commit": "off",
+        "full_page_writes": "off",
+        "shared_buffers": "32MB",      # well below the 128MB default: quick start, small footprint
+        "autovacuum": "off",
+        "checkpoint_timeout": "30min",
+        "max_wal_size": "4GB",
+        "jit": "off",
+    }
+
+
+def _benchmark(host: Dict[str, Any]) -> Dict[str, str]:
+    mem, cpus = host["mem_bytes"], host["cpus"]
+    return {
+        "shared_buffers": _mb(min(mem // 4, 16 * 1024 * MB)),
+        "effective_cache_size": _mb(mem * 3 // 4),
+        "maintenance_work_mem": _mb(min(mem // 16, 2048 * MB)),
+        "work_mem": "64MB",
+        "huge_pages": "try" if host["hugepages"] else "off",
+        "max_worker_processes": str(max(cpus, 8)),
+        "max_parallel_workers": str(cpus),
+        "max_parallel_workers_per_gather": str(min(4, max(cpus // 2, 1))),
+        "checkpoint_timeout": "15min",
+        "max_wal_size": "16GB",
+        "wal_buffers": "64MB",
+        "track_io_timing": "on",
+        "jit": "off",
+    }
+
+
+PROFILES: Dict[str, Callable[[Dict[str, Any]], Dict[str, str]]] = {
+    "default": _default,
+    "fast-iteration": _fast_iteration,
+    "benchmark": _benchmark,
+}
+
+
+def render(name: str, host: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile '{name}' (choose from {', '.join(PROFILES)})")
+    return PROFILES[name](host or host_facts())
+
+
+# ───────────────────────────── applying ─────────────────────────────
+def write_profile(datadir: pathlib.Path, name: str, settings: Dict[str, str]) -> None:
+    """Write pgdbg_profile.conf and make sure postgresql.conf includes it."""
+    datadir.mkdir(parents=True, exist_ok=True)
+    body = "".join(f"{k} = '{v}'\n" for k, v in sorted(settings.items()))
+    (datadir / PROFILE_FILE).write_text(
+        f"# pg-debugger profile: {name} (managed file, rewritten on profile switch)\n{body}"
+    )
+    conf = datadir / "postgresql.conf"
+    text = conf.read_text() if conf.exists() else ""
+    if INCLUDE_LINE not in text:
+        conf.write_text(text + ("" if text.endswith("\n") or not text else "\n") + INCLUDE_LINE + "\n")
+
+
+def initial_profile(datadir: pathlib.Path, name: str) -> Dict[str, Any]:
+    """Apply *name* to a fresh data directory; returns the registry fields."""
+    host = host_facts()
+    settings = render(name, host)
+    write_profile(datadir, name, settings)
+    return {"profile": name, "profile_settings": settings, "profile_host": host}
+
+
+def apply_profile(label: str, name: str) -> Dict[str, Any]:
+    """Switch sandbox *label* to profile *name*, reloading or restarting it."""
+    from .fleet import restart_instance
+
+    info = get_instance(label)
+    if not info:
+        raise RuntimeError(f"No instance named '{label}'")
+    old = info.get("profile_settings", {})
+    fields = initial_profile(data_dir(info), name)
+    new = fields["profile_settings"]
+
+    changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+    restart = bool(changed & RESTART_GUCS)
+    if restart:
+        result = restart_instance(label, info)
+        if result["status"] != "started":
+            raise RuntimeError(f"Restart of {label} failed: {result.get('error')}")
+    else:
+        bin_dir = pathlib.Path(info["path"]) / "install" / "bin"
+        subprocess.run([str(bin_dir / "pg_ctl"), "-D", str(data_dir(info)), "reload"],
+                       check=True, capture_output=True)
+    update_instance(label, **fields)
+    logging.info("⚙️  %s now uses profile %s (%s)", label, name, "restarted" if restart else "reloaded")
+    return {"label": label, "profile": name, "changed": sorted(changed), "restarted": restart}
+
+
+def benchmark_context(port: int) -> Dict[str, Any]:
+    """What a benchmark on *port* ran against: sandbox, profile and settings."""
+    hit = find_by_port(port)
+    if not hit:
+        return {"sandbox": None, "profile": None}
+    label, info = hit
+    return {
+        "sandbox": label,
+        "profile": info.get("profile", "default"),
+        "settings": info.get("profile_settings", {}),
+    }
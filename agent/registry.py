@@ -1,43 +1,379 @@
-import json, os, random, contextlib, pathlib, time
+"""
+registry.py  •  Where the running sandboxes are recorded
+
+Two interchangeable backends sit behind the same functions:
+
+* json   – `~/.pg_debugger_agent/registry.json` (default).  Writes go to a
+           temp file that is renamed over the original, every
+           read-modify-write holds an exclusive `flock` on `registry.json.lock`,
+           and parsed contents are cached in-process until the file's
+           mtime/inode changes.
+* sqlite – `registry.db` next to it, in WAL mode with an index on `port`,
+           for fleets of hundreds of sandboxes.  Selected with
+           `PG_DEBUGGER_REGISTRY=sqlite`, or automatically once the database
+           exists (see `migrate_to_sqlite`).
+
+Every entry is a dict with at least `port`, `path` and `started`; callers
+may attach further fields through `add_instance(..., **extra)` and
+`update_instance`.
+"""
+from __future__ import annotations
+
+import contextlib, copy, fcntl, json, os, pathlib, random, socket, sqlite3, threading, time
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from .fsutil import atomic_write_json
+
 REG_PATH = pathlib.Path.home() / ".pg_debugger_agent" / "registry.json"
 REG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-def _load():
-    if REG_PATH.exists():
-        with open(REG_PATH) as f:
-            return json.load(f)
-    return {}
-
-def _save(data):
-    with open(REG_PATH, "w") as f:
-        json.dump(data, f, indent=2)
-
-def list_instances():
-    return _load()
-
-def add_instance(name, port, path):
-    data = _load()
-    data[name] = {
-        "port": port,
-        "path": str(path),
-        "started": time.time()
+BACKEND_ENV = "PG_DEBUGGER_REGISTRY"
+
+PORT_RANGE = (56000, 60000)
+RESERVATION_TTL = 2 * 3600      # a clone + build must register within this
+
+# ───────────────────────────── locking ──────────────────────────────
+_local = threading.local()
+_thread_lock = threading.RLock()
+
+
+def _lock_path() -> pathlib.Path:
+    return REG_PATH.with_name(REG_PATH.name + ".lock")
+
+
+@contextlib.contextmanager
+def locked() -> Iterator[None]:
+    """
+    Hold the registry lock (threads of this process and other processes).
+    Re-entrant within a thread, so helpers may nest it freely.
+    """
+    with _thread_lock:
+        depth = getattr(_local, "depth", 0)
+        if depth:
+            _local.depth = depth + 1
+            try:
+                yield
+            finally:
+                _local.depth -= 1
+            return
+        REG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(_lock_path(), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            _local.depth = 1
+            try:
+                yield
+            finally:
+                _local.depth = 0
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ─────────────────────────── json backend ───────────────────────────
+_cache: Dict[str, Any] = {"entry": (None, {})}   # (stat key, parsed data)
+
+
+def _stat_key(path: pathlib.Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return (str(path), None)
+    return (str(path), st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _load() -> Dict[str, Dict[str, Any]]:
+    """Parsed registry.json, re-read only when the file changed on disk."""
+    key = _stat_key(REG_PATH)
+    cached_key, data = _cache["entry"]
+    if cached_key != key:
+        data = {}
+        if key[1] is not None:
+            with open(REG_PATH) as f:
+                data = json.load(f)
+        _cache["entry"] = (key, data)
+    return data
+
+
+def _save(data) -> None:
+    """Atomically replace registry.json (write temp file, fsync, rename)."""
+    atomic_write_json(REG_PATH, data, fsync=True, indent=2)
+    _cache["entry"] = (_stat_key(REG_PATH), data)
+
+
+class _JsonBackend:
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return _load()
+
+    def get(self, label: str) -> Optional[Dict[str, Any]]:
+        return _load().get(label)
+
+    def by_port(self, port: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        for label, info in _load().items():
+            if info["port"] == port:
+                return label, info
+        return None
+
+    def put(self, label: str, info: Dict[str, Any]) -> None:
+        with locked():
+            data = copy.deepcopy(_load())
+            data[label] = info
+            _save(data)
+
+    def update(self, label: str, fields: Dict[str, Any]) -> None:
+        with locked():
+            data = copy.deepcopy(_load())
+            if label not in data:
+                raise RuntimeError(f"Sandbox '{label}' not known")
+            data[label].update(fields)
+            _save(data)
+
+    def delete(self, label: str) -> None:
+        with locked():
+            data = copy.deepcopy(_load())
+            if data.pop(label, None) is not None:
+                _save(data)
+
+
+# ────────────────────────── sqlite backend ──────────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    label   TEXT PRIMARY KEY,
+    port    INTEGER NOT NULL,
+    path    TEXT NOT NULL,
+    started REAL,
+    extra   TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS instances_port ON instances (port);
+"""
+_CORE = ("port", "path", "started")
+
+
+def _db_path() -> pathlib.Path:
+    return REG_PATH.with_suffix(".db")
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread and database file."""
+    path = str(_db_path())
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def _row_to_info(row) -> Dict[str, Any]:
+    port, path, started, extra = row
+    return {"port": port, "path": path, "started": started, **json.loads(extra)}
+
+
+@contextlib.contextmanager
+def _write_txn() -> Iterator[sqlite3.Connection]:
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class _SqliteBackend:
+    _COLS = "port, path, started, extra"
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        rows = _connect().execute(f"SELECT label, {self._COLS} FROM instances ORDER BY label")
+        return {r[0]: _row_to_info(r[1:]) for r in rows}
+
+    def get(self, label: str) -> Optional[Dict[str, Any]]:
+        row = _connect().execute(
+            f"SELECT {self._COLS} FROM instances WHERE label = ?", (label,)
+        ).fetchone()
+        return _row_to_info(row) if row else None
+
+    def by_port(self, port: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = _connect().execute(
+            f"SELECT label, {self._COLS} FROM instances WHERE port = ?", (port,)
+        ).fetchone()
+        return (row[0], _row_to_info(row[1:])) if row else None
+
+    @staticmethod
+    def _write(conn, label: str, info: Dict[str, Any]) -> None:
+        extra = {k: v for k, v in info.items() if k not in _CORE}
+        conn.execute(
+            "INSERT OR REPLACE INTO instances (label, port, path, started, extra) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (label, info["port"], str(info["path"]), info.get("started"), json.dumps(extra)),
+        )
+
+    def put(self, label: str, info: Dict[str, Any]) -> None:
+        with _write_txn() as conn:
+            self._write(conn, label, info)
+
+    def update(self, label: str, fields: Dict[str, Any]) -> None:
+        with _write_txn() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLS} FROM instances WHERE label = ?", (label,)
+            ).fetchone()
+            if not row:
+                raise RuntimeError(f"Sandbox '{label}' not known")
+            self._write(conn, label, {**_row_to_info(row), **fields})
+
+    def delete(self, label: str) -> None:
+        with _write_txn() as conn:
+            conn.execute("DELETE FROM instances WHERE label = ?", (label,))
+
+
+def _backend():
+    kind = os.environ.get(BACKEND_ENV) or ("sqlite" if _db_path().exists() else "json")
+    if kind == "sqlite":
+        return _SqliteBackend()
+    if kind == "json":
+        return _JsonBackend()
+    raise RuntimeError(f"Unknown {BACKEND_ENV} backend '{kind}' (use json or sqlite)")
+
+
+def migrate_to_sqlite() -> int:
+    """
+    Copy every registry.json entry into registry.db and retire the JSON
+    file (renamed to registry.json.migrated).  Returns the number of
+    entries copied.  From then on the SQLite backend is picked up
+    automatically.
+    """
+    with locked():
+        data = _load()
+        db = _SqliteBackend()
+        with _write_txn() as conn:
+            for label, info in data.items():
+                db._write(conn, label, info)
+        if REG_PATH.exists():
+            os.replace(REG_PATH, REG_PATH.with_name(REG_PATH.name + ".migrated"))
+        return len(data)
+
+
+# ───────────────────────── port reservations ────────────────────────
+# A port is handed out long before its sandbox is registered (clone +
+# build take minutes), so allocations are recorded in ports.json under the
+# registry lock.  Entries lapse after RESERVATION_TTL or when the
+# reserving process is gone.
+
+def _reservations_path() -> pathlib.Path:
+    return REG_PATH.with_name("ports.json")
+
+
+def pid_alive(pid: int) -> bool:
+    """True if *pid* exists, even when it belongs to another user."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_reservations() -> Dict[int, Dict[str, Any]]:
+    try:
+        raw = json.loads(_reservations_path().read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    now = time.time()
+    return {
+        int(port): r for port, r in raw.items()
+        if r["expires"] > now and pid_alive(r["pid"])
     }
-    _save(data)
+
+
+def _save_reservations(res: Dict[int, Dict[str, Any]]) -> None:
+    atomic_write_json(_reservations_path(), {str(p): r for p, r in res.items()}, fsync=True, indent=2)
+
+
+def port_is_free(port: int) -> bool:
+    """Bind probe on the TCP port plus a check for a stale Unix socket."""
+    if pathlib.Path(f"/tmp/.s.PGSQL.{port}").exists():
+        return False
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("127.0.0.1", port))
+        except OSError:
+            return False
+    return True
+
+
+def release_port(port: int) -> None:
+    """Drop a reservation (e.g. when a launch fails before registering)."""
+    with locked():
+        res = _load_reservations()
+        if res.pop(port, None) is not None:
+            _save_reservations(res)
+
+
+# ─────────────────────────── public API ─────────────────────────────
+def list_instances() -> Dict[str, Dict[str, Any]]:
+    return copy.deepcopy(_backend().all())
+
+def get_instance(label: str) -> Optional[Dict[str, Any]]:
+    info = _backend().get(label)
+    return copy.deepcopy(info) if info else None
+
+def find_by_port(port: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(label, info) of the sandbox listening on *port*, if any."""
+    hit = _backend().by_port(port)
+    return copy.deepcopy(hit) if hit else None
+
+def add_instance(name, port, path, **extra):
+    with locked():
+        _backend().put(name, {
+            "port": port,
+            "path": str(path),
+            "started": time.time(),
+            **extra,
+        })
+        release_port(port)
+
+def update_instance(name, **fields):
+    """Merge *fields* into an existing entry."""
+    _backend().update(name, fields)
 
 def remove_instance(name):
-    data = _load()
-    data.pop(name, None)
-    _save(data)
-
-def next_free_port():
-    used = {v["port"] for v in _load().values()}
-    while True:
-        p = random.randint(56000, 60000)
-        if p not in used:
+    _backend().delete(name)
+
+def next_free_port(attempts: int = 200, path: Optional[pathlib.Path] = None) -> int:
+    """
+    Reserve a port that no sandbox (registered or still building) owns and
+    that nothing on the host is bound to.  The reservation is released by
+    `add_instance` for that port, or by `release_port`.  *path* names the
+    worktree being built for it (see `reserved_paths`).
+    """
+    with locked():
+        res = _load_reservations()
+        used = {v["port"] for v in _backend().all().values()} | set(res)
+        for _ in range(attempts):
+            p = random.randint(*PORT_RANGE)
+            if p in used or not port_is_free(p):
+                continue
+            res[p] = {"pid": os.getpid(), "expires": time.time() + RESERVATION_TTL}
+            if path is not None:
+                res[p]["path"] = str(path)
+            _save_reservations(res)
             return p
+    raise RuntimeError(f"No free port found in {PORT_RANGE} after {attempts} attempts")
+
+def reserved_paths() -> Set[pathlib.Path]:
+    """Worktrees of sandboxes still being cloned/built (live port reservations)."""
+    return {pathlib.Path(r["path"]) for r in _load_reservations().values() if r.get("path")}
+
+def data_dir(info: Dict[str, Any]) -> pathlib.Path:
+    """The entry's data directory: `datadir` if set (replicas), else <path>/data."""
+    return pathlib.Path(info.get("datadir") or pathlib.Path(info["path"]) / "data")
 
 def src_path(label: str) -> pathlib.Path:
-    info = list_instances().get(label)
+    info = get_instance(label)
     if not info:
         raise RuntimeError(f"Sandbox '{label}' not known")
     return pathlib.Path(info["path"])
@@ -0,0 +1,242 @@
+"""
+replication.py  •  Primary + replica topologies built from one sandbox
+
+`create_cluster(label, replicas=N, mode=...)` builds (or reuses) sandbox
+*label* as the primary and attaches N replicas to it; `add_replicas` does
+the second half for a sandbox that already runs.  Replicas live inside the
+primary's worktree as `replica_<n>/` data directories and run the
+primary's `install/` binaries, so a replica costs one data copy and a
+port – no clone, no build.
+
+* streaming – `pg_basebackup -R -X stream` with a physical slot per replica
+* logical   – the same base backup turned into a subscriber by
+              `pg_createsubscriber` (PostgreSQL 17+), which creates one
+              publication/subscription pair per replica
+
+Every replica is registered like any sandbox, with `datadir`, `role`,
+`primary`, `group` and `mode` fields; the primary gets `group` and
+`role = "primary"`.  fleet, health, gc and the storage manager all honour
+`datadir`, so replicas are stopped, probed and evicted on their own.
+"""
+from __future__ import annotations
+
+import logging, os, pathlib, re, shutil, subprocess
+from typing import Any, Dict, List, Optional
+
+from .registry import (add_instance, data_dir, get_instance, list_instances, next_free_port, release_port,
+                       remove_instance, update_instance)
+
+MODES = ("streaming", "logical")
+REPLICA_PREFIX = "replica_"
+WAL_LEVEL = {"streaming": "replica", "logical": "logical"}     # changing it needs a restart
+_ORDER = {"minimal": 0, "replica": 1, "logical": 2}
+
+
+def _bin(info: Dict[str, Any], name: str) -> str:
+    return str(pathlib.Path(info["path"]) / "install" / "bin" / name)
+
+
+def _slot_name(label: str) -> str:
+    """Replication slot / subscription name for replica *label*."""
+    return "pgdbg_" + re.sub(r"\W", "_", label.lower())
+
+
+def _run(cmd: List[str], **kw) -> None:
+    logging.info("🛠️  %s", " ".join(map(str, cmd)))
+    proc = subprocess.run(cmd, capture_output=True, text=True, **kw)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{pathlib.Path(cmd[0]).name} failed: {(proc.stderr or proc.stdout).strip()[-500:]}")
+
+
+# ───────────────────────────── helpers ──────────────────────────────
+def members(group: str) -> Dict[str, Dict[str, Any]]:
+    """Registry entries of replication group *group* (primary first)."""
+    found = {label: info for label, info in list_instances().items() if info.get("group") == group}
+    return dict(sorted(found.items(), key=lambda kv: kv[1].get("role") != "primary"))
+
+
+def replicas_of(label: str) -> Dict[str, Dict[str, Any]]:
+    return {other: info for other, info in list_instances().items() if info.get("primary") == label}
+
+
+def _next_datadir(workdir: pathlib.Path) -> pathlib.Path:
+    taken = {int(p.name[len(REPLICA_PREFIX):]) for p in workdir.glob(f"{REPLICA_PREFIX}*")
+             if p.name[len(REPLICA_PREFIX):].isdigit()}
+    return workdir / f"{REPLICA_PREFIX}{max(taken, default=0) + 1}"
+
+
+def prepare_primary(label: str, info: Dict[str, Any], mode: str, replicas: int = 1) -> bool:
+    """Raise the primary's WAL settings to what *replicas* *mode* replicas need; True if it restarted."""
+    import psycopg
+    from .fleet import restart_instance
+
+    senders = str(max(10, replicas + 2))        # 10 is the server default
+    wanted = {"wal_level": WAL_LEVEL[mode], "max_wal_senders": senders, "max_replication_slots": senders}
+    restart = False
+    with psycopg.connect(f"host=127.0.0.1 port={info['port']} dbname=postgres user=postgres",
+                         autocommit=True) as conn:
+        current = {name: conn.execute(f"SHOW {name}").fetchone()[0] for name in wanted}
+        for name, value in wanted.items():
+            if name == "wal_level":
+                low = _ORDER.get(current[name], 0) < _ORDER[value]
+            else:
+                low = int(current[name]) < int(value)
+            if low:
+                conn.execute(f"ALTER SYSTEM SET {name} = '{value}'")
+                restart = True
+    if restart:
+        logging.info("🔁 %s: restarting with %s for %s replicas", label, wanted, mode)
+        result = restart_instance(label, info)
+        if result["status"] != "started":
+            raise RuntimeError(f"Restart of {label} failed: {result.get('error')}")
+    return restart
+
+
+# ──────────────────────────── replicas ──────────────────────────────
+def _base_backup(info: Dict[str, Any], datadir: pathlib.Path, slot: Optional[str]) -> None:
+    cmd = [
+        _bin(info, "pg_basebackup"), "-h", "127.0.0.1", "-p", str(info["port"]), "-U", "postgres",
+        "-D", str(datadir), "-R", "-X", "stream", "-c", "fast",
+    ]
+    if slot:
+        cmd += ["-C", "-S", slot]
+    _run(cmd)
+
+
+def _make_subscriber(info: Dict[str, Any], datadir: pathlib.Path, port: int, name: str) -> None:
+    tool = _bin(info, "pg_createsubscriber")
+    if not os.path.exists(tool):
+        raise RuntimeError("Logical replicas need pg_createsubscriber (PostgreSQL 17 or later)")
+    _run([
+        tool, "-D", str(datadir), "-p", str(port), "-U", "postgres", "-s", str(datadir),
+        "-P", f"host=127.0.0.1 port={info['port']} dbname=postgres user=postgres",
+        "-d", "postgres", f"--publication={name}", f"--subscription={name}",
+    ], cwd=str(datadir))
+
+
+def add_replica(label: str, mode: str = "streaming", name: Optional[str] = None) -> Dict[str, Any]:
+    """Attach one *mode* replica to running sandbox *label*; returns its registry entry."""
+    from .fleet import start_instance
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown replication mode '{mode}' (choose from {', '.join(MODES)})")
+    primary = get_instance(label)
+    if not primary:
+        raise RuntimeError(f"No instance named '{label}'")
+    if primary.get("datadir"):
+        raise RuntimeError(f"'{label}' is itself a replica; attach replicas to {primary.get('primary')}")
+
+    workdir = pathlib.Path(primary["path"])
+    datadir = _next_datadir(workdir)
+    name = name or f"{label}-r{datadir.name[len(REPLICA_PREFIX):]}"
+    if get_instance(name):
+        raise RuntimeError(f"Sandbox '{name}' already exists")
+    slot = _slot_name(name)
+    port = next_free_port()
+    try:
+        _base_backup(primary, datadir, slot if mode == "streaming" else None)
+        with open(datadir / "postgresql.auto.conf", "a") as fp:
+            # the walreceiver reports cluster_name as its application_name
+            fp.write(f"cluster_name = '{name}'\n")
+        if mode == "logical":
+            _make_subscriber(primary, datadir, port, slot)
+        entry = {
+            "port": port, "path": str(workdir), "datadir": str(datadir), "role": "replica",
+            "primary": label, "group": primary.get("group") or label, "mode": mode, "slot": slot,
+            "profile": primary.get("profile"),
+        }
+        started = start_instance(name, entry)
+        if started["status"] != "started":
+            raise RuntimeError(f"Replica {name} did not start: {started.get('error')}")
+    except BaseException:
+        release_port(port)
+        shutil.rmtree(datadir, ignore_errors=True)
+        raise
+
+    add_instance(name, port, workdir, **{k: v for k, v in entry.items() if k not in ("port", "path")})
+    update_instance(label, group=entry["group"], role="primary")
+    logging.info("🪞 %s: %s replica of %s on port %s (%s)", name, mode, label, port, datadir)
+    return {"label": name, **entry}
+
+
+def add_replicas(label: str, count: int = 1, mode: str = "streaming") -> List[Dict[str, Any]]:
+    """Attach *count* replicas to sandbox *label*, preparing the primary first."""
+    from . import storage
+
+    primary = get_instance(label)
+    if not primary:
+        raise RuntimeError(f"No instance named '{label}'")
+    prepare_primary(label, primary, mode, replicas=len(replicas_of(label)) + count)
+    added = [add_replica(label, mode) for _ in range(count)]
+    for r in added:
+        storage.record(r["label"])
+    storage.record(label)
+    return added
+
+
+def create_cluster(label: str, replicas: int = 1, mode: str = "streaming",
+                   profile: str = "default") -> Dict[str, Any]:
+    """Build sandbox *label* if needed, then give it *replicas* replicas."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown replication mode '{mode}' (choose from {', '.join(MODES)})")
+    if not get_instance(label):
+        from .tools.pg_manager import fresh_clone_and_launch
+        fresh_clone_and_launch(label, profile=profile)
+    added = add_replicas(label, replicas, mode)
+    return {"primary": label, "port": get_instance(label)["port"], "mode": mode,
+            "replicas": [{"label": r["label"], "port": r["port"]} for r in added]}
+
+
+def restart_replicas(label: str) -> List[Dict[str, Any]]:
+    """Restart *label*'s replicas, e.g. after the shared install was rebuilt."""
+    from .fleet import restart_instance
+
+    return [restart_instance(name, info) for name, info in replicas_of(label).items()]
+
+
+def _drop_slot(name: str, info: Dict[str, Any]) -> None:
+    """Drop replica *name*'s slot (and publication) on its primary, so WAL is not kept for it."""
+    primary = get_instance(info.get("primary") or "")
+    if not primary or not info.get("slot"):
+        return
+    import psycopg
+    try:
+        with psycopg.connect(f"host=127.0.0.1 port={primary['port']} dbname=postgres user=postgres "
+                             "connect_timeout=5", autocommit=True) as conn:
+            if info.get("mode") == "logical":
+                conn.execute("DROP PUBLICATION IF EXISTS " + info["slot"])
+            conn.execute("SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots "
+                         "WHERE slot_name = %s AND NOT active", (info["slot"],))
+    except psycopg.Error as exc:
+        logging.warning("%s: could not drop slot %s on %s: %s", name, info["slot"], info["primary"], exc)
+
+
+def teardown(name: str, info: Dict[str, Any], dry_run: bool = False) -> int:
+    """
+    Remove replica *name* for good: stop it, drop its slot/publication on
+    the primary, delete its data directory and its registry entry.
+    Returns the bytes freed.  drop_replica, storage eviction and gc all
+    come through here.
+    """
+    from .fleet import disk_usage, stop_instance
+
+    datadir = data_dir(info)
+    ours = datadir.parent == pathlib.Path(info["path"]) and datadir.name.startswith(REPLICA_PREFIX)
+    size = disk_usage(datadir) if ours and datadir.is_dir() else 0
+    if dry_run:
+        return size
+    stop_instance(name, info)
+    _drop_slot(name, info)
+    if ours:
+        shutil.rmtree(datadir, ignore_errors=True)
+    remove_instance(name)
+    return size
+
+
+def drop_replica(name: str) -> Dict[str, Any]:
+    """Stop replica *name*, drop its slot on the primary and delete its data directory."""
+    info = get_instance(name)
+    if not info or not info.get("datadir"):
+        raise RuntimeError(f"No replica named '{name}'")
+    teardown(name, info)
+    return {"label": name, "status": "dropped", "datadir": str(data_dir(info))}
@@ -0,0 +1,289 @@
+"""
+storage.py  •  Disk usage of sandboxes and a size-capped storage manager
+
+Each `pgdbg_*` worktree holds four kinds of bytes:
+
+* source   – the git checkout
+* build    – object files and binaries in the tree (`make clean` removes them)
+* install  – the `install/` prefix (`make install` recreates it)
+* data     – the data directory; never rebuilt, only lost with the sandbox
+
+`record(label)` stores that breakdown in the registry entry (`usage`).
+`enforce(cap)` keeps the total under *cap* by evicting from sandboxes that
+have been idle for a while, least recently used first: build objects of
+every idle sandbox go before any install prefix, and whole sandboxes go
+last.  Evicted parts are listed in the entry's `evicted` field and
+`restore(label)` rebuilds them; until then an evicted sandbox is stopped
+but not dead – session and batch code restore it instead of dropping it.
+Any successful `make && make install` of the tree clears the field
+(`rebuilt(label)`).
+
+Replicas (agent/replication.py) share their primary's worktree and own
+only their `datadir`: their usage is that directory alone, the primary's
+excludes it, and a worktree is only evicted past `build` once no other
+entry lives in it.
+
+PG_DEBUGGER_SANDBOX_DIR chooses where new worktrees are created (e.g. a
+local NVMe mount instead of tmpfs); PG_DEBUGGER_STORAGE_CAP (like "50G")
+is the default cap, enforced before every new sandbox is built.
+"""
+from __future__ import annotations
+
+import concurrent.futures, logging, os, pathlib, re, shutil, subprocess, tempfile, time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .registry import data_dir, get_instance, list_instances, remove_instance, update_instance
+
+SANDBOX_DIR_ENV = "PG_DEBUGGER_SANDBOX_DIR"
+CAP_ENV = "PG_DEBUGGER_STORAGE_CAP"
+IDLE_SECONDS = 30 * 60
+USAGE_MAX_AGE = 5 * 60      # enforce() reuses measurements this recent
+PARTS = ("source", "build", "install", "data")
+# used when the worktree is not a git checkout
+BUILD_SUFFIXES = {".o", ".a", ".so", ".bc", ".lo", ".dylib", ".gcda", ".gcno"}
+
+
+# ───────────────────────────── settings ─────────────────────────────
+def sandbox_dir() -> Optional[pathlib.Path]:
+    """The configured base directory for new worktrees, if any."""
+    env = os.environ.get(SANDBOX_DIR_ENV)
+    return pathlib.Path(env) if env else None
+
+
+def base_dir() -> pathlib.Path:
+    """Where worktrees live: the configured directory or the system temp dir."""
+    return sandbox_dir() or pathlib.Path(tempfile.gettempdir())
+
+
+def parse_size(text: str) -> int:
+    """'50G', '512M', '1.5T' or plain bytes → bytes."""
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)i?B?\s*", str(text), re.I)
+    if not m:
+        raise ValueError(f"Cannot parse size '{text}' (use e.g. 500M, 50G)")
+    return int(float(m.group(1)) * 1024 ** " KMGT".index(m.group(2).upper() or " "))
+
+
+def cap_bytes() -> Optional[int]:
+    env = os.environ.get(CAP_ENV)
+    return parse_size(env) if env else None
+
+
+# ───────────────────────────── measuring ────────────────────────────
+def _ignored_files(workdir: pathlib.Path) -> Optional[Set[str]]:
+    """Paths git ignores in *workdir* (build output), or None outside git."""
+    try:
+        proc = subprocess.run(
+            ["git", "-C", str(workdir), "ls-files", "--others", "--ignored", "--exclude-standard", "-z"],
+            capture_output=True, text=True,
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return {p for p in proc.stdout.split("\0") if p}
+
+
+def measure(path: pathlib.Path, exclude: Iterable[pathlib.Path] = ()) -> Dict[str, Any]:
+    """Bytes on disk under *path*, split into source/build/install/data."""
+    path = pathlib.Path(path)
+    skip = {str(pathlib.Path(p)) for p in exclude}
+    ignored = _ignored_files(path)
+    usage = dict.fromkeys(PARTS, 0)
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in skip]
+        rel_dir = os.path.relpath(dirpath, path)
+        top = rel_dir.split(os.sep, 1)[0]
+        for name in filenames:
+            try:
+                size = os.lstat(os.path.join(dirpath, name)).st_blocks * 512
+            except OSError:
+                continue
+            rel = name if rel_dir == "." else f"{rel_dir}/{name}"
+            if top in ("data", "install"):
+                usage[top] += size
+            elif (rel in ignored) if ignored is not None else os.path.splitext(name)[1] in BUILD_SUFFIXES:
+                usage["build"] += size
+            else:
+                usage["source"] += size
+    usage["total"] = sum(usage[p] for p in PARTS)
+    usage["measured"] = time.time()
+    return usage
+
+
+def _sharers(label: str, info: Dict[str, Any], instances: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Other entries living in *label*'s worktree (its replicas, or their primary)."""
+    return [other for other, o in instances.items() if other != label and o["path"] == info["path"]]
+
+
+def record(label: str, info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Measure sandbox *label* and store the result in its registry entry."""
+    info = info or get_instance(label)
+    if not info:
+        return None
+    if info.get("datadir"):
+        usage = dict.fromkeys(PARTS, 0)
+        usage["data"] = usage["total"] = measure(data_dir(info))["total"]
+        usage["measured"] = time.time()
+    else:
+        instances = list_instances()
+        usage = measure(pathlib.Path(info["path"]),
+                        exclude=[data_dir(instances[o]) for o in _sharers(label, info, instances)])
+    try:
+        update_instance(label, usage=usage)
+    except RuntimeError:
+        return None     # entry dropped meanwhile
+    return usage
+
+
+def refresh(jobs: int = 8, max_age: float = 0) -> Dict[str, Dict[str, Any]]:
+    """Re-measure every registered sandbox (in parallel), keeping measurements younger than *max_age* seconds."""
+    instances = list_instances()
+    if not instances:
+        return {}
+    now = time.time()
+    fresh = {label: info["usage"] for label, info in instances.items()
+             if max_age and now - info.get("usage", {}).get("measured", 0) < max_age}
+    stale = {label: info for label, info in instances.items() if label not in fresh}
+    if not stale:
+        return fresh
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(jobs, len(stale))) as pool:
+        futures = {label: pool.submit(record, label, info) for label, info in stale.items()}
+        return {**fresh, **{label: f.result() for label, f in futures.items() if f.result()}}
+
+
+def touch(label: Optional[str]) -> None:
+    """Mark *label* as used now (for LRU eviction)."""
+    if not label:
+        return
+    try:
+        update_instance(label, last_used=time.time())
+    except RuntimeError:
+        pass
+
+
+def last_used(info: Dict[str, Any]) -> float:
+    return info.get("last_used") or info.get("started") or 0.0
+
+
+# ───────────────────────────── eviction ─────────────────────────────
+def _evict(label: str, info: Dict[str, Any], part: str) -> None:
+    from .fleet import reclaim_worktree, stop_instance
+
+    path = pathlib.Path(info["path"])
+    if info.get("datadir"):         # a replica: only its data directory is its own
+        from .replication import teardown
+        teardown(label, info)
+        return
+    if part == "build":
+        subprocess.run(["make", "-s", "clean"], cwd=path, check=True, capture_output=True)
+    elif part == "install":
+        stop_instance(label, info)
+        shutil.rmtree(path / "install", ignore_errors=True)
+    else:
+        stop_instance(label, info)
+        reclaim_worktree(path, dry_run=False)
+        remove_instance(label)
+        return
+
+    usage = {**info.get("usage", {}), part: 0}
+    usage["total"] = sum(usage.get(p, 0) for p in PARTS)
+    update_instance(label, usage=usage, evicted=sorted({*info.get("evicted", []), part}))
+
+
+def enforce(
+    cap: Optional[int] = None,
+    idle: float = IDLE_SECONDS,
+    dry_run: bool = False,
+    protect: Iterable[str] = (),
+    jobs: int = 8,
+) -> Dict[str, Any]:
+    """
+    Evict until all sandboxes together use at most *cap* bytes (default:
+    PG_DEBUGGER_STORAGE_CAP; nothing happens without a cap).  Only
+    sandboxes unused for *idle* seconds and not in *protect* are touched.
+    """
+    cap = cap if cap is not None else cap_bytes()
+    if cap is None:
+        return {"cap": None, "actions": []}
+
+    usage = refresh(jobs, max_age=USAGE_MAX_AGE)
+    instances = list_instances()
+    total = before = sum(u["total"] for u in usage.values())
+    now = time.time()
+    # a worktree is as recently used as its busiest entry (primary or replica)
+    recent: Dict[str, float] = {}
+    for info in instances.values():
+        recent[info["path"]] = max(recent.get(info["path"], 0.0), last_used(info))
+    protected = {instances[p]["path"] for p in protect if p in instances}
+    candidates = sorted(
+        (label for label, info in instances.items()
+         if label in usage and info["path"] not in protected and now - recent[info["path"]] >= idle),
+        key=lambda label: (recent[instances[label]["path"]], "datadir" not in instances[label]),
+    )
+
+    actions: List[Dict[str, Any]] = []
+    for part in ("build", "install", "sandbox"):
+        for label in candidates:
+            if total <= cap:
+                break
+            if label not in instances:
+                continue
+            if part != "build" and not instances[label].get("datadir") and _sharers(label, instances[label], instances):
+                continue    # replicas still run from this worktree
+            freed = usage[label]["total"] if part == "sandbox" else usage[label][part]
+            if not freed:
+                continue
+            action = {"label": label, "evict": part, "bytes": freed}
+            if not dry_run:
+                try:
+                    _evict(label, instances[label], part)
+                except (OSError, subprocess.CalledProcessError, RuntimeError) as exc:
+                    action["error"] = str(exc)
+                    actions.append(action)
+                    continue
+                logging.info("🧹 %s: evicted %s (%d bytes)", label, part, freed)
+            actions.append(action)
+            total -= freed
+            if part == "sandbox":
+                instances.pop(label)
+            else:
+                usage[label] = {**usage[label], part: 0, "total": usage[label]["total"] - freed}
+                instances[label] = {**instances[label], "usage": usage[label]}
+
+    return {
+        "cap": cap,
+        "dry_run": dry_run,
+        "total_before": before,
+        "total_after": total,
+        "over_cap": total > cap,
+        "actions": actions,
+    }
+
+
+def rebuilt(label: str) -> None:
+    """*label*'s tree was just built and installed: nothing is evicted any more."""
+    info = get_instance(label)
+    if info and info.get("evicted"):
+        update_instance(label, evicted=[])
+
+
+def restore(label: str) -> Dict[str, Any]:
+    """Rebuild what eviction removed from *label* and start it again."""
+    from . import health
+    from .fleet import start_instance
+
+    info = get_instance(label)
+    if not info:
+        raise RuntimeError(f"No instance named '{label}'")
+    evicted = info.get("evicted", [])
+    path = pathlib.Path(info["path"])
+    if evicted:
+        subprocess.run(["make", "-s", "-j4"], cwd=path, check=True, capture_output=True)
+        subprocess.run(["make", "-s", "install"], cwd=path, check=True, capture_output=True)
+        rebuilt(label)
+    if health.is_live(info, use_cache=False):
+        started = {"label": label, "status": "running"}
+    else:
+        started = start_instance(label, info)
+    record(label)
+    return {**started, "rebuilt": evicted}
@@ -1,10 +1,73 @@
-from . import file_ops, code_lookup, query_exec, search_code, list_dir, get_patch
-
-TOOL_DEFINITIONS = [
-    file_ops.tool_spec,
-    code_lookup.tool_spec,
-    query_exec.tool_spec,
-    search_code.tool_spec,
-    list_dir.tool_spec,
-    get_patch.tool_spec
-]
+"""
+Tool manifest.
+
+Maps each tool name to the `module:function[:spec]` that implements it
+(`spec` defaults to the module's `tool_spec`).  Tool
+modules (and their heavy dependencies such as psycopg, requests or bs4)
+are imported only when a tool is first looked up, so commands that never
+talk to the model do not pay for them.
+
+`BUDGETS` caps how many tokens of each tool's output the dispatcher puts
+into the conversation (see output.fit); tools themselves do not truncate.
+"""
+from __future__ import annotations
+
+import functools, importlib
+from typing import Any, Dict, List
+
+MANIFEST: Dict[str, str] = {
+    "read_file": "file_ops:read_file",
+    "lookup_code_reference": "code_lookup:lookup_code_reference",
+    "execute_query": "query_exec:execute_query",
+    "search_code": "search_code:search_code",
+    "list_dir": "list_dir:list_dir",
+    "get_patch": "get_patch:get_patch",
+    "run_regression_tests": "regress:run_regression_tests",
+    "sample_performance": "perf_sample:sample_performance",
+    "profile_query": "cpu_profile:profile_query",
+    "diff_cpu_profiles": "cpu_profile:diff_cpu_profiles:diff_tool_spec",
+    "run_workload": "workload:run_workload",
+    "replication_status": "replication:replication_status",
+    "add_replicas": "replication:add_replicas:add_tool_spec",
+}
+
+# output budget per call, in tokens
+DEFAULT_BUDGET = 4000
+BUDGETS: Dict[str, int] = {
+    "read_file": 12000,
+    "lookup_code_reference": 2000,
+    "execute_query": 1500,
+    "search_code": 3000,
+    "list_dir": 2000,
+    "get_patch": 8000,
+    "run_regression_tests": 3000,
+    "sample_performance": 3000,
+    "profile_query": 2500,
+    "diff_cpu_profiles": 2500,
+    "run_workload": 3000,
+    "replication_status": 2000,
+    "add_replicas": 500,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load(name: str) -> Dict[str, Any]:
+    """Import the tool's module and return {"impl": callable, "spec": tool_spec, "budget": tokens}."""
+    module_name, func, *spec = MANIFEST[name].split(":")
+    module = importlib.import_module(f"{__name__}.{module_name}")
+    return {
+        "impl": getattr(module, func),
+        "spec": getattr(module, spec[0] if spec else "tool_spec"),
+        "budget": BUDGETS.get(name, DEFAULT_BUDGET),
+    }
+
+
+def specs() -> List[Dict[str, Any]]:
+    return [load(name)["spec"] for name in MANIFEST]
+
+
+def __getattr__(name: str):
+    # kept for callers of the old eager list
+    if name == "TOOL_DEFINITIONS":
+        return specs()
+    raise AttributeError(name)
@@ -0,0 +1,199 @@
+"""
+agent/tools/archive_fetch.py   •   cached fetcher for the mailing-list archive
+
+`ArchiveFetcher` downloads message pages and attachments from the
+postgresql.org archive (or any stand-in given as *base_url*) through one
+keep-alive `requests.Session` and a persistent on-disk cache:
+
+    ~/.pg_debugger_agent/http_cache/
+        objects/<sha256>      response bodies, content-addressed
+        urls/<sha256(url)>    {"sha", "etag", "last_modified", "fetched"}
+
+Attachments never change once posted and are served straight from the
+cache; other pages are revalidated with If-None-Match / If-Modified-Since.
+In offline mode (`offline=True` or PG_DEBUGGER_OFFLINE=1) nothing goes to
+the network and a cache miss raises `CacheMiss`.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+from ..fsutil import atomic_write
+
+DEFAULT_BASE_URL = "https://www.postgresql.org"
+IMMUTABLE_PREFIXES = ("/message-id/attachment/",)
+TIMEOUT = 30
+
+
+class CacheMiss(LookupError):
+    """Offline mode and the URL is not cached."""
+
+
+def _default_cache_dir() -> pathlib.Path:
+    return pathlib.Path.home() / ".pg_debugger_agent" / "http_cache"
+
+
+class ArchiveFetcher:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        cache_dir: Optional[pathlib.Path] = None,
+        offline: Optional[bool] = None,
+    ) -> None:
+        self.base_url = (base_url or os.environ.get("PG_DEBUGGER_ARCHIVE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else _default_cache_dir()
+        self.offline = offline if offline is not None else os.environ.get("PG_DEBUGGER_OFFLINE") == "1"
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"network": 0, "revalidated": 0, "cached": 0}
+
+    # ───────────────────────────── plumbing ─────────────────────────
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+        return self._session
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:      # fetch_all runs fetch() on worker threads
+            self.stats[key] += 1
+
+    def _meta_path(self, url: str) -> pathlib.Path:
+        return self.cache_dir / "urls" / hashlib.sha256(url.encode()).hexdigest()
+
+    def _object_path(self, sha: str) -> pathlib.Path:
+        return self.cache_dir / "objects" / sha
+
+    def _cached(self, url: str) -> Tuple[Optional[dict], Optional[bytes]]:
+        try:
+            meta = json.loads(self._meta_path(url).read_text())
+            return meta, self._object_path(meta["sha"]).read_bytes()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None, None
+
+    def _store(self, url: str, body: bytes, headers) -> None:
+        sha = hashlib.sha256(body).hexdigest()
+        obj = self._object_path(sha)
+        if not obj.exists():
+            atomic_write(obj, body)
+        meta = {
+            "url": url,
+            "sha": sha,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched": time.time(),
+        }
+        atomic_write(self._meta_path(url), json.dumps(meta).encode())
+
+    def url_for(self, href_or_msgid: str) -> str:
+        """Absolute URL for an archive href, a full URL, or a bare message-id."""
+        if "://" in href_or_msgid:
+            return href_or_msgid
+        if href_or_msgid.startswith("/"):
+            return self.base_url + href_or_msgid
+        return f"{self.base_url}/message-id/{urllib.parse.quote(href_or_msgid.strip('<>'))}"
+
+    # ───────────────────────────── fetching ─────────────────────────
+    def fetch(self, url: str) -> bytes:
+        url = self.url_for(url)
+        meta, body = self._cached(url)
+        immutable = urllib.parse.urlparse(url).path.startswith(IMMUTABLE_PREFIXES)
+        if body is not None and (immutable or self.offline):
+            self._count("cached")
+            return body
+        if self.offline:
+            raise CacheMiss(f"{url} is not cached (offline mode)")
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        resp = self.session.get(url, headers=headers, timeout=TIMEOUT)
+        if resp.status_code == 304 and body is not None:
+            self._count("revalidated")
+            return body
+        resp.raise_for_status()
+        self._count("network")
+        self._store(url, resp.content, resp.headers)
+        return resp.content
+
+    def fetch_text(self, url: str) -> str:
+        return self.fetch(url).decode("utf-8", errors="replace")
+
+    def fetch_all(self, urls: Dict[str, str]) -> Dict[str, str]:
+        """{name: url} → {name: text}, downloaded concurrently over the shared session."""
+        if not urls:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+            texts = pool.map(self.fetch_text, urls.values())
+            return dict(zip(urls.keys(), texts))
+
+    # ───────────────────────────── parsing ──────────────────────────
+    def message(self, url: str) -> Tuple[str, Dict[str, str]]:
+        """(plain-text body, {attachment filename: url}) of one archive message."""
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(self.fetch_text(url), "html.parser")
+        body_div = soup.find("div", class_="message-content")
+        text = body_div.get_text("\n", strip=True) if body_div else ""
+        attachments = {
+            tag["href"].split("/")[-1]: self.url_for(tag["href"])
+            for tag in soup.find_all("a", href=lambda h: h and h.startswith("/message-id/attachment/"))
+        }
+        return text, attachments
+
+    def prefetch_thread(self, url: str) -> Dict[str, int]:
+        """
+        Warm the cache with every message page and attachment of the thread
+        containing *url*, using the archive's flat thread view.
+        """
+        from bs4 import BeautifulSoup
+
+        path = urllib.parse.urlparse(self.url_for(url)).path
+        msgid = path.split("/message-id/", 1)[-1].removeprefix("flat/")
+        soup = BeautifulSoup(self.fetch_text(f"/message-id/flat/{msgid}"), "html.parser")
+
+        pages: List[str] = []
+        attachments: Dict[str, str] = {}
+        for tag in soup.find_all("a", href=True):
+            href = tag["href"]
+            if href.startswith("/message-id/attachment/"):
+                attachments[href] = self.url_for(href)
+            elif href.startswith("/message-id/") and href.count("/") == 2:
+                pages.append(self.url_for(href))
+        self.fetch_all({u: u for u in pages})
+        self.fetch_all(attachments)
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {"messages": len(set(pages)), "attachments": len(attachments), **stats}
+
+
+_default: Optional[ArchiveFetcher] = None
+_default_lock = threading.Lock()
+
+
+def default_fetcher() -> ArchiveFetcher:
+    """Process-wide fetcher, so all get_patch calls share one session."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ArchiveFetcher()
+    return _default
@@ -18,8 +18,7 @@ from pathlib import Path
 from typing import Optional
 
 from .. import context
-
-MAX_OUTPUT_BYTES = 8_000
+from .output import emit
 
 # ─────────────────────────── helpers ────────────────────────────────
 def _run_rg(pattern: str, target: Path) -> str:
@@ -57,6 +56,35 @@ def _run_grep(pattern: str, target: Path) -> str:
 
 
 # ────────────────────────── public API ──────────────────────────────
+def find_definition(symbol: str, root: Path, path: str = "src") -> Optional[str]:
+    """
+    `file:line` (relative to *root*) of the first likely C definition of
+    *symbol*, or None.  Cheap enough to call for a handful of symbols.
+    """
+    target = root / path
+    # also matches PostgreSQL style, with the return type on the line above;
+    # POSIX classes only, so rg and grep -E read it the same way
+    pattern = rf"^([[:alnum:]_][[:alnum:]_[:space:]*]*[[:space:]*])?{re.escape(symbol)}[[:space:]]*\("
+    for cmd in (
+        ["rg", "-n", "--no-heading", "--with-filename", "-g", "*.[chy]", pattern, str(target)],
+        ["grep", "-R", "-n", "-H", "--include=*.[chy]", "-E", pattern, str(target)],
+    ):
+        try:
+            out = subprocess.run(cmd, text=True, capture_output=True).stdout
+        except FileNotFoundError:
+            continue
+        hits = []
+        for line in out.splitlines():
+            file, lineno, text = (line.split(":", 2) + ["", ""])[:3]
+            if not lineno.isdigit() or text.rstrip().endswith(";"):
+                continue        # a prototype, not the definition
+            hits.append((not file.endswith(".c"), file, int(lineno)))
+        if hits:                # otherwise rg failed or found nothing: try grep
+            _, file, lineno = min(hits)
+            return f"{Path(file).relative_to(root)}:{lineno}"
+    return None
+
+
 def lookup_code_reference(symbol: str, path: Optional[str] = None) -> str:
     """
     Return a snippet around the (likely) C definition of *symbol*.
@@ -75,7 +103,8 @@ def lookup_code_reference(symbol: str, path: Optional[str] = None) -> str:
     -----
     * Automatically resolves the sandbox’s checkout path via context.src_root().
     * Uses ripgrep when available, else grep.
-    * Output is capped at MAX_OUTPUT_BYTES.
+    * Output size is capped by the dispatcher (tools.BUDGETS); compact mode
+      drops the sandbox prefix from every path.
     """
     root = context.src_root()  # raises if sandbox not set
     target = (root / path) if path else (root / "src")
@@ -90,9 +119,7 @@ def lookup_code_reference(symbol: str, path: Optional[str] = None) -> str:
     if not out:
         return f"No definition found for '{symbol}' under '{target.relative_to(root)}'."
 
-    if len(out) > MAX_OUTPUT_BYTES:
-        out = out[: MAX_OUTPUT_BYTES - 15] + "\n…(truncated)"
-    return out
+    return emit(out, lambda text: text.replace(f"{root}/", ""))
 
 
 # ────────────────────────── tool spec ───────────────────────────────
@@ -0,0 +1,329 @@
+"""
+agent/tools/cpu_profile.py   •   CPU profiles of the backend serving a query
+
+`profile_query(sql, port, frequency=99, repeat=1)`
+    Looks up the PID of its own backend (`pg_backend_pid()`), samples that
+    process while *sql* runs – with `perf record --call-graph dwarf` when
+    perf is installed, otherwise by attaching gdb for a backtrace in a
+    loop – and
+    folds the stacks (`root;…;leaf count`).  Returns the top inclusive and
+    exclusive functions, each linked to its definition (`file:line`) in
+    the sandbox checkout, plus a profile id.
+
+`diff_cpu_profiles(baseline, patched)`
+    Compares two saved profiles (e.g. the same query on a baseline and a
+    patched sandbox) by share of samples per function.
+
+Folded stacks are kept in ~/.pg_debugger_agent/profiles/<id>.folded with a
+small <id>.json describing where they came from.
+"""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+
+from ..profiles import benchmark_context
+from ..registry import find_by_port, get_instance
+from .code_lookup import find_definition
+
+TOP_N = 15
+GDB_MAX_HZ = 20         # each gdb attach stops the backend for a while
+# sandboxes build with stock -O2, i.e. without frame pointers: unwind from
+# DWARF info over a copy of this many bytes of each sample's stack
+PERF_STACK_BYTES = 16384
+
+
+def _profiles_dir() -> pathlib.Path:
+    d = pathlib.Path.home() / ".pg_debugger_agent" / "profiles"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+# ──────────────────────────── stack parsing ─────────────────────────
+def _clean(sym: str) -> str:
+    sym = re.sub(r"\+0x[0-9a-f]+$", "", sym.strip())
+    return sym or "[unknown]"
+
+
+def fold_perf_script(text: str) -> Counter:
+    """Fold `perf script` output into Counter({"root;…;leaf": samples})."""
+    stacks: Counter = Counter()
+    for block in re.split(r"\n\s*\n", text):
+        frames = []
+        for line in block.splitlines()[1:]:         # first line is the event header
+            m = re.match(r"\s+[0-9a-f]+\s+(.+?)\s+\(", line)
+            if m:
+                frames.append(_clean(m.group(1)))
+        if frames:
+            stacks[";".join(reversed(frames))] += 1
+    return stacks
+
+
+def parse_gdb_backtrace(text: str) -> Optional[str]:
+    """One gdb `bt` → folded stack string (root first)."""
+    frames = re.findall(r"^#\d+\s+(?:0x[0-9a-f]+ in )?([\w.$@]+)", text, flags=re.M)
+    return ";".join(reversed(frames)) if frames else None
+
+
+# ────────────────────────────── samplers ────────────────────────────
+def perf_record_command(pid: int, frequency: int, output: pathlib.Path) -> List[str]:
+    return ["perf", "record", "-F", str(frequency), "--call-graph", f"dwarf,{PERF_STACK_BYTES}",
+            "-p", str(pid), "-o", str(output)]
+
+
+def _sample_with_perf(pid: int, frequency: int, run) -> Counter:
+    with tempfile.TemporaryDirectory(prefix="pgdbg_perf_") as tmp:
+        data = pathlib.Path(tmp) / "perf.data"
+        rec = subprocess.Popen(
+            perf_record_command(pid, frequency, data),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        time.sleep(0.2)         # let perf attach before the query starts
+        try:
+            run()
+        finally:
+            rec.send_signal(signal.SIGINT)
+            _, err = rec.communicate(timeout=60)
+        if not data.exists():
+            raise RuntimeError(f"perf record failed: {err.decode(errors='replace')[-500:]}")
+        script = subprocess.run(
+            ["perf", "script", "-i", str(data)], capture_output=True, text=True, check=True
+        ).stdout
+    return fold_perf_script(script)
+
+
+def _sample_with_gdb(pid: int, frequency: int, run) -> Counter:
+    stacks: Counter = Counter()
+    stop = threading.Event()
+    interval = 1.0 / min(frequency, GDB_MAX_HZ)
+
+    def loop():
+        while not stop.is_set():
+            out = subprocess.run(
+                ["gdb", "-p", str(pid), "-batch", "-nx", "-ex", "bt"],
+                capture_output=True, text=True,
+            ).stdout
+            stack = parse_gdb_backtrace(out)
+            if stack:
+                stacks[stack] += 1
+            stop.wait(interval)
+
+    sampler = threading.Thread(target=loop, daemon=True)
+    sampler.start()
+    try:
+        run()
+    finally:
+        stop.set()
+        sampler.join()
+    return stacks
+
+
+# ──────────────────────────── summaries ─────────────────────────────
+def top_functions(stacks: Counter, n: int = TOP_N) -> Tuple[List, List, int]:
+    """([(func, exclusive samples)], [(func, inclusive samples)], total)."""
+    exclusive: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        exclusive[frames[-1]] += count
+        for func in set(frames):
+            inclusive[func] += count
+    return exclusive.most_common(n), inclusive.most_common(n), sum(stacks.values())
+
+
+def _located(rows, total: int, root: Optional[pathlib.Path]) -> List[Dict[str, Any]]:
+    out = []
+    for func, count in rows:
+        entry = {"function": func, "samples": count, "pct": round(100.0 * count / total, 1)}
+        if root and re.fullmatch(r"\w+", func):
+            entry["source"] = find_definition(func, root)
+        out.append(entry)
+    return out
+
+
+def _checked(profile_id: str) -> str:
+    """*profile_id* if it is a plain file stem (ids come from the model, too)."""
+    if not re.fullmatch(r"[\w.-]+", profile_id or ""):
+        raise ValueError(f"Invalid profile id '{profile_id}'")
+    return profile_id
+
+
+def new_profile_id(label: Optional[str], port: int) -> str:
+    """<sandbox>-<timestamp>-<random>: unique even for profiles started in the same second."""
+    stem = re.sub(r"[^\w.-]", "_", str(label or port))
+    return f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _save(profile_id: str, stacks: Counter, meta: Dict[str, Any]) -> None:
+    _checked(profile_id)
+    d = _profiles_dir()
+    (d / f"{profile_id}.folded").write_text(
+        "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    )
+    (d / f"{profile_id}.json").write_text(json.dumps(meta, indent=2))
+
+
+def _load(profile_id: str) -> Tuple[Counter, Dict[str, Any]]:
+    _checked(profile_id)
+    d = _profiles_dir()
+    folded = d / f"{profile_id}.folded"
+    if not folded.exists():
+        raise FileNotFoundError(f"No saved profile '{profile_id}'")
+    stacks: Counter = Counter()
+    for line in folded.read_text().splitlines():
+        stack, _, count = line.rpartition(" ")
+        stacks[stack] += int(count)
+    return stacks, json.loads((d / f"{profile_id}.json").read_text())
+
+
+# ────────────────────────── public API ──────────────────────────────
+def profile_query(sql: str, port: int, frequency: int = 99, repeat: int = 1) -> str:
+    """
+    Profile the backend executing *sql* on *port*.
+
+    Returns
+    -------
+    JSON string {profile_id, sandbox, profile, settings, sampler, samples,
+                 top_exclusive, top_inclusive}
+    where each top entry is {function, samples, pct, source}.
+    """
+    hit = find_by_port(port)
+    label, root = (hit[0], pathlib.Path(hit[1]["path"])) if hit else (None, None)
+
+    if shutil.which("perf"):
+        sampler, sample = "perf", _sample_with_perf
+    elif shutil.which("gdb"):
+        sampler, sample = "gdb", _sample_with_gdb
+    else:
+        raise RuntimeError("Neither perf nor gdb is installed; cannot profile")
+
+    with psycopg.connect(
+        f"host=localhost port={port} dbname=postgres user=postgres", autocommit=True
+    ) as conn:
+        pid = conn.execute("SELECT pg_backend_pid()").fetchone()[0]
+
+        def run():
+            for _ in range(repeat):
+                conn.execute(sql)
+
+        stacks = sample(pid, frequency, run)
+
+    if not stacks:
+        raise RuntimeError(f"{sampler} collected no samples (query too short? try repeat > 1)")
+
+    profile_id = new_profile_id(label, port)
+    context = benchmark_context(port)
+    _save(profile_id, stacks, {**context, "port": port, "sql": sql,
+                               "sampler": sampler, "frequency": frequency, "repeat": repeat})
+    exclusive, inclusive, total = top_functions(stacks)
+    return json.dumps(
+        {
+            "profile_id": profile_id,
+            **context,
+            "sampler": sampler,
+            "samples": total,
+            "top_exclusive": _located(exclusive, total, root),
+            "top_inclusive": _located(inclusive, total, root),
+        },
+        indent=2,
+    )
+
+
+def diff_cpu_profiles(baseline: str, patched: str) -> str:
+    """
+    Compare two saved profiles by share of samples per function.
+
+    Returns
+    -------
+    JSON string {baseline, patched, exclusive: [...], inclusive: [...]} where
+    each row is {function, baseline_pct, patched_pct, delta_pct, source},
+    largest absolute change first.
+    """
+    base_stacks, base_meta = _load(baseline)
+    new_stacks, new_meta = _load(patched)
+    info = get_instance(new_meta["sandbox"]) if new_meta.get("sandbox") else None
+    root = pathlib.Path(info["path"]) if info else None
+
+    b_ex, b_in, b_total = top_functions(base_stacks, n=None)
+    n_ex, n_in, n_total = top_functions(new_stacks, n=None)
+
+    def compare(before, after):
+        bp = {f: 100.0 * c / b_total for f, c in before}
+        np_ = {f: 100.0 * c / n_total for f, c in after}
+        rows = [
+            {"function": f, "baseline_pct": round(bp.get(f, 0), 1),
+             "patched_pct": round(np_.get(f, 0), 1),
+             "delta_pct": round(np_.get(f, 0) - bp.get(f, 0), 1)}
+            for f in set(bp) | set(np_)
+        ]
+        rows.sort(key=lambda r: (-abs(r["delta_pct"]), r["function"]))
+        rows = [r for r in rows[:TOP_N] if r["delta_pct"]]
+        for r in rows:
+            if root and re.fullmatch(r"\w+", r["function"]):
+                r["source"] = find_definition(r["function"], root)
+        return rows
+
+    return json.dumps(
+        {
+            "baseline": {"id": baseline, "samples": b_total, "profile": base_meta.get("profile")},
+            "patched": {"id": patched, "samples": n_total, "profile": new_meta.get("profile")},
+            "exclusive": compare(b_ex, n_ex),
+            "inclusive": compare(b_in, n_in),
+        },
+        indent=2,
+    )
+
+
+# ─────────────────────────── tool specs ─────────────────────────────
+tool_spec = {
+    "type": "function",
+    "name": "profile_query",
+    "description": (
+        "CPU-profile the PostgreSQL backend while it executes a query (perf, or a gdb "
+        "stack sampler as fallback). Returns the hottest functions by exclusive and "
+        "inclusive samples with their source locations, and a profile_id that can be "
+        "passed to diff_cpu_profiles."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "sql": {"type": "string"},
+            "port": {"type": "integer"},
+            "frequency": {"type": "integer", "description": "Samples per second (default 99)."},
+            "repeat": {"type": "integer", "description": "Run the query this many times (default 1)."},
+        },
+        "required": ["sql", "port"],
+        "additionalProperties": False,
+    },
+}
+
+diff_tool_spec = {
+    "type": "function",
+    "name": "diff_cpu_profiles",
+    "description": (
+        "Compare two profiles returned by profile_query (e.g. baseline vs patched sandbox) "
+        "and list the functions whose share of CPU samples changed most."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "baseline": {"type": "string", "description": "profile_id of the baseline run."},
+            "patched": {"type": "string", "description": "profile_id of the patched run."},
+        },
+        "required": ["baseline", "patched"],
+        "additionalProperties": False,
+    },
+}
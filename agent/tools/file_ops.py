@@ -1,12 +1,19 @@
+from typing import Optional
+
 from .. import context 
 
-def read_file(path: str) -> str:
+def read_file(path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> str:
     root = context.src_root()
     p = root / path
 
     if not p.exists():
         raise FileNotFoundError(path)
-    return p.read_text()
+    text = p.read_text()
+    if start_line is None and end_line is None:
+        return text
+    # 1-based, inclusive; lets the model page through files over its budget
+    lines = text.splitlines(keepends=True)
+    return "".join(lines[max((start_line or 1) - 1, 0):end_line])
 
 tool_spec = {
     "type": "function",
@@ -18,6 +25,14 @@ tool_spec = {
             "path": {
                 "type": "string",
                 "description": "Absolute path to the file."
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "First line to return (1-based). Use with end_line for large files."
+            },
+            "end_line": {
+                "type": "integer",
+                "description": "Last line to return (inclusive)."
             }
         },
         "required": ["path"],
@@ -1,18 +1,48 @@
-import concurrent.futures
-import json
-import urllib.parse
-from typing import Dict, Tuple, List
-
-import requests
-from bs4 import BeautifulSoup
+from typing import Dict, List, Optional
 
 from ..context import get_label          
+from .archive_fetch import default_fetcher
+from .output import diffstat, emit, select_hunks
 from .pg_manager import apply_patch_and_relaunch
 
 
-def get_patch(url: str) -> str:
+def _compact(url: str):
+    def encode(data) -> str:
+        parts = [data["message"], ""]
+        if data["applied"]:
+            parts.append(f"applied to {data['applied']}: {', '.join(data['applied_patches'])}")
+        parts += [diffstat(name, text) for name, text in sorted(data["patches"].items())]
+        if data["patches"]:
+            parts.append(f'(hunk text: get_patch(url="{url}", patch=<name>, file=<path>, hunks="1-3"))')
+        return "\n".join(parts)
+    return encode
+
+
+def _show_hunks(patches: Dict[str, str], patch: Optional[str], file: Optional[str], hunks: Optional[str]) -> str:
+    if patch and patch not in patches:
+        raise ValueError(f"No attachment '{patch}' (have: {', '.join(sorted(patches))})")
+    names = [patch] if patch else sorted(patches)
+    shown = []
+    for name in names:
+        try:
+            shown.append(f"=== {name}\n{select_hunks(patches[name], file, hunks)}")
+        except ValueError:
+            continue
+    if not shown:
+        raise ValueError(f"No hunks matched file={file!r} hunks={hunks!r}")
+    return "\n".join(shown)
+
+
+def get_patch(
+    url: str,
+    patch: Optional[str] = None,
+    file: Optional[str] = None,
+    hunks: Optional[str] = None,
+) -> str:
     """
     Download a PostgreSQL mailing-list message and all its patch attachments.
+    Downloads go through the on-disk archive cache (see archive_fetch.py),
+    so repeated investigations do not hit the network again.
 
     If agent.context.get_label() is set, apply **each** patch in
     filename-sorted order to that sandbox, rebuilding and relaunching after
@@ -25,38 +55,21 @@ def get_patch(url: str) -> str:
           "applied": "<ACTIVE_LABEL|None>",
           "applied_patches": ["patch1.diff", "patch2.diff", ...]
         }
+    In compact mode the patches are summarised as a diffstat instead.
+
+    With *patch*, *file* or *hunks* ("1-3,5", numbered per file) nothing is
+    applied: only the selected hunk text is returned, from the cache.
     """
-    # 1. Fetch the message HTML
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    # 2. Extract plain-text body
-    body_div = soup.find("div", class_="message-content")
-    message_text = body_div.get_text("\n", strip=True) if body_div else ""
-
-    # 3. Locate attachment links
-    attachment_tags = soup.find_all(
-        "a", href=lambda h: h and h.startswith("/message-id/attachment/")
-    )
-    base = "https://www.postgresql.org"
-    attachments: Dict[str, str] = {
-        tag["href"].split("/")[-1]: urllib.parse.urljoin(base, tag["href"])
-        for tag in attachment_tags
-    }
+    fetcher = default_fetcher()
+
+    # 1–3. Fetch the message (cached) and locate its attachments
+    message_text, attachments = fetcher.message(url)
 
-    # 4. Download attachments concurrently
-    def _download(item: Tuple[str, str]) -> Tuple[str, str]:
-        name, url_ = item
-        r = requests.get(url_, timeout=30)
-        r.raise_for_status()
-        return name, r.text
+    # 4. Download attachments concurrently over the shared session
+    patches: Dict[str, str] = fetcher.fetch_all(attachments)
 
-    patches: Dict[str, str] = {}
-    if attachments:
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            for name, text in pool.map(_download, attachments.items()):
-                patches[name] = text
+    if patch or file or hunks:
+        return _show_hunks(patches, patch, file, hunks)
 
     applied_patches: List[str] = []
     applied_label = None
@@ -71,15 +84,15 @@ def get_patch(url: str) -> str:
             applied_patches.append(name)
         applied_label = label
 
-    # 6. Return JSON-encoded result
-    return json.dumps(
+    # 6. Return JSON-encoded result (diffstat in compact mode)
+    return emit(
         {
             "message": message_text,
             "patches": patches,
             "applied": applied_label,
             "applied_patches": applied_patches,
         },
-        indent=2,
+        _compact(url),
     )
 
 
@@ -89,14 +102,28 @@ tool_spec = {
     "description": (
         "Download a PostgreSQL mailing-list message (body + patch attachments). "
         "This tool automatically applies the patches to the active DB, so any "
-        "future queries you run can test the patch."
+        "future queries you run can test the patch. Patches are summarised as a "
+        "diffstat; call again with patch/file/hunks to read hunk text (nothing is "
+        "re-applied then)."
     ),
     "parameters": {
         "type": "object",
         "properties": {
             "url": {
                 "type": "string",
-                "description": "Full URL of the message on postgresql.org"
+                "description": "Full URL of the message on postgresql.org, or its bare message-id"
+            },
+            "patch": {
+                "type": "string",
+                "description": "Attachment name: show its hunks instead of applying anything."
+            },
+            "file": {
+                "type": "string",
+                "description": "Only show hunks touching this path (as listed in the diffstat)."
+            },
+            "hunks": {
+                "type": "string",
+                "description": "Hunk numbers to show, per file, e.g. \"1-3,5\"."
             }
         },
         "required": ["url"],
@@ -1,34 +1,134 @@
-import os, pathlib, json
-from .. import context 
+import fnmatch
+from typing import Any, Dict, List, Optional
+from .. import context
+from . import tree_index
+from .output import emit
 
-def list_dir(path: str = ".") -> str:
+LARGE_BYTES = 1024 * 1024
+
+
+def list_dir(
+    path: str = ".",
+    depth: int = 1,
+    glob: Optional[str] = None,
+    hide_generated: bool = False,
+    hide_build: bool = False,
+) -> str:
     """
-    Return a JSON list of filenames (dirs end with '/').
+    Return a JSON list of filenames (dirs end with '/'); one name per line
+    in compact mode.
     Path is interpreted relative to the PostgreSQL source root inside
     the active sandbox.
+
+    With *depth* > 1, a *glob* or a hide_* flag the listing comes from the
+    cached tree snapshot (see tree_index.py) instead: a recursive tree,
+    *depth* levels deep, with size, line count and generated/build/large
+    flags per file and totals per directory.
     """
     root = context.src_root()
     p = root / path
     if not p.is_dir():
         raise FileNotFoundError(p)
-    entries = [
-        f"{child.name}/" if child.is_dir() else child.name
-        for child in sorted(p.iterdir())
-    ]
-    return json.dumps(entries, indent=2)
+    if depth <= 1 and not (glob or hide_generated or hide_build):
+        entries = [
+            f"{child.name}/" if child.is_dir() else child.name
+            for child in sorted(p.iterdir())
+        ]
+        return emit(entries, "\n".join)
+
+    files = tree_index.snapshot(root)
+    hidden = {k for k, hide in (("generated", hide_generated), ("build", hide_build)) if hide}
+    # "./src", "src/", "src/../src" → "src" (snapshot keys are plain relative paths)
+    prefix = p.resolve().relative_to(root.resolve()).as_posix()
+    return emit(build_tree(files, prefix, depth, glob, hidden), tree_text)
+
+
+# ───────────────────────────── tree mode ────────────────────────────
+def _flags(entry: tree_index.Entry) -> List[str]:
+    flags = [entry[tree_index.KIND]] if entry[tree_index.KIND] != "source" else []
+    if entry[tree_index.SIZE] >= LARGE_BYTES:
+        flags.append("large")
+    return flags
+
+
+def build_tree(files, path: str, depth: int, glob: Optional[str], hidden) -> List[Dict[str, Any]]:
+    """
+    Pre-order [{path, type, size, lines, files, flags}] below *path*: files
+    down to *depth* levels, directories with totals over their whole subtree.
+    """
+    dirs: Dict[str, Dict[str, Any]] = {}
+    shown: List[Dict[str, Any]] = []
+    for rel, entry in tree_index.files_under(files, path):
+        if entry[tree_index.KIND] in hidden:
+            continue
+        if glob and not fnmatch.fnmatch(rel if "/" in glob else rel.rsplit("/", 1)[-1], glob):
+            continue
+        parts = rel.split("/")
+        for i in range(1, len(parts)):
+            d = dirs.setdefault("/".join(parts[:i]), {"size": 0, "lines": 0, "files": 0})
+            d["size"] += entry[tree_index.SIZE]
+            d["lines"] += entry[tree_index.LINES] or 0
+            d["files"] += 1
+        if len(parts) <= depth:
+            shown.append({"path": rel, "type": "file", "size": entry[tree_index.SIZE],
+                          "lines": entry[tree_index.LINES], "flags": _flags(entry)})
+    shown += [{"path": d + "/", "type": "dir", **totals}
+              for d, totals in dirs.items() if d.count("/") < depth]
+    shown.sort(key=lambda e: e["path"].rstrip("/").split("/"))
+    return shown
+
+
+def _fmt_size(n: int) -> str:
+    for unit in ("B", "K", "M"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}G"
+
+
+def tree_text(entries: List[Dict[str, Any]]) -> str:
+    """Indented tree: `name  size  lines [flags]`, dirs with file counts."""
+    lines = []
+    for e in entries:
+        name = e["path"].rstrip("/")
+        indent = "  " * name.count("/")
+        name = name.rsplit("/", 1)[-1]
+        if e["type"] == "dir":
+            lines.append(f"{indent}{name}/  {e['files']} files  {_fmt_size(e['size'])}  {e['lines']}L")
+        else:
+            extra = f"  {e['lines']}L" if e["lines"] is not None else ""
+            flags = f"  [{','.join(e['flags'])}]" if e["flags"] else ""
+            lines.append(f"{indent}{name}  {_fmt_size(e['size'])}{extra}{flags}")
+    return "\n".join(lines)
 
 
 tool_spec = {
     "type": "function",
     "name": "list_dir",
-    "description": "List files in a directory relative to the Postgres source root.",
+    "description": (
+        "List files in a directory relative to the Postgres source root. "
+        "Give `depth` (e.g. 3) for a recursive tree with sizes, line counts and "
+        "generated/build/large flags in one call; `glob` filters file names "
+        "and `hide_generated` / `hide_build` drop gram.c-style generated "
+        "sources and build artifacts."
+    ),
     "parameters": {
         "type": "object",
         "properties": {
             "path": {
                 "type": "string",
                 "description": "Directory path (e.g. 'src/backend/parser')",
-            }
+            },
+            "depth": {
+                "type": "integer",
+                "description": "Levels to expand (default 1: just this directory's names).",
+            },
+            "glob": {
+                "type": "string",
+                "description": "Only files matching this pattern, e.g. '*.c' or 'executor/*.h'.",
+            },
+            "hide_generated": {"type": "boolean", "description": "Drop generated sources (gram.c, fmgroids.h, …)."},
+            "hide_build": {"type": "boolean", "description": "Drop build artifacts (.o, .so, binaries)."},
         },
         "required": [],
         "additionalProperties": False,
@@ -0,0 +1,273 @@
+"""
+agent/tools/output.py   •   compact tool-output encodings, budgets, metering
+
+Tool results are pasted into the conversation verbatim, so every space of
+an `indent=2` dump and every repeated `"file":` key is paid for on each
+following turn.  In compact mode (the default for model sessions, see
+`session`) tools encode their results for the model instead:
+
+* query rows          → a tab-separated table with one header line
+* search hits         → grouped by file, `line: text` underneath
+* patches             → a diffstat per patch; hunks on request
+* any other JSON      → re-dumped without whitespace
+
+Tools call `emit(data, encoder)`: outside compact mode that returns the
+same JSON as before, inside it an `Output` carrying both the compact text
+and the verbose equivalent, which the dispatcher meters.
+
+The dispatcher also enforces each tool's output budget (tokens, from the
+manifest) with `fit`, so truncation looks the same for every tool.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import json
+import logging
+import math
+import re
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+_COMPACT: contextvars.ContextVar[bool] = contextvars.ContextVar("pgdbg_compact_output", default=False)
+_METER: contextvars.ContextVar[Optional["Meter"]] = contextvars.ContextVar("pgdbg_output_meter", default=None)
+
+
+@dataclasses.dataclass
+class Output:
+    text: str           # what the model sees
+    verbose: str        # what the tool would have returned outside compact mode
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def compact_enabled() -> bool:
+    return _COMPACT.get()
+
+
+@contextlib.contextmanager
+def compact_mode(on: bool = True) -> Iterator[None]:
+    token = _COMPACT.set(on)
+    try:
+        yield
+    finally:
+        _COMPACT.reset(token)
+
+
+def emit(data: Any, encoder: Optional[Callable[[Any], str]] = None, indent: Optional[int] = 2) -> Union[str, Output]:
+    """JSON of *data* as before, or (compact mode) an Output encoded by *encoder*."""
+    verbose = data if isinstance(data, str) else json.dumps(data, indent=indent, default=str)
+    if not compact_enabled():
+        return verbose
+    return Output(encoder(data) if encoder else dumps(data), verbose)
+
+
+# ───────────────────────────── encoders ─────────────────────────────
+def dumps(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    text = value if isinstance(value, str) else json.dumps(value, default=str) if isinstance(value, (dict, list)) else str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def table(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    """Tab-separated rows under one header line, NULL for nulls."""
+    lines = ["\t".join(columns)] if columns else []
+    lines += ["\t".join(_cell(v) for v in row) for row in rows]
+    lines.append(f"({len(rows)} row{'s' if len(rows) != 1 else ''})")
+    return "\n".join(lines)
+
+
+def hits_by_file(hits: Sequence[Dict[str, Any]]) -> str:
+    """[{file, line, text}] → one header per file, `line: text` underneath."""
+    grouped: Dict[str, List[str]] = defaultdict(list)
+    for hit in hits:
+        grouped[hit["file"]].append(f"  {hit['line']}: {hit['text']}")
+    lines: List[str] = []
+    for file, entries in grouped.items():
+        lines.append(file)
+        lines.extend(entries)
+    lines.append(f"({len(hits)} hit{'s' if len(hits) != 1 else ''} in {len(grouped)} file{'s' if len(grouped) != 1 else ''})")
+    return "\n".join(lines)
+
+
+# ───────────────────────────── patches ──────────────────────────────
+_HUNK = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+
+def parse_patch(text: str) -> List[Dict[str, Any]]:
+    """Unified diff → [{file, added, removed, hunks: [hunk text]}] in patch order."""
+    files: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    old_left = new_left = 0             # lines still expected in the current hunk
+    for line in text.splitlines():
+        if old_left > 0 or new_left > 0:
+            current["hunks"][-1].append(line)
+            if line.startswith("+"):
+                current["added"] += 1
+                new_left -= 1
+            elif line.startswith("-"):
+                current["removed"] += 1
+                old_left -= 1
+            elif not line.startswith("\\"):      # "\ No newline at end of file"
+                old_left -= 1
+                new_left -= 1
+            continue
+        m = _HUNK.match(line)
+        if m and current is not None:
+            current["hunks"].append([line])
+            old_left = int(m.group(1) or 1)
+            new_left = int(m.group(2) or 1)
+        elif line.startswith("diff --git ") or (line.startswith("--- ") and (current is None or current["hunks"])):
+            current = {"file": None, "added": 0, "removed": 0, "hunks": []}
+            files.append(current)
+            git = re.match(r"diff --git a/(\S+) b/(\S+)", line)
+            if git:
+                current["file"] = git.group(2)
+            elif line[4:].split("\t")[0] != "/dev/null":
+                current["file"] = re.sub(r"^a/", "", line[4:].split("\t")[0])
+        elif current is not None and line.startswith("+++ ") and line[4:].split("\t")[0] != "/dev/null":
+            current["file"] = re.sub(r"^b/", "", line[4:].split("\t")[0])
+    for f in files:
+        f["hunks"] = ["\n".join(h) for h in f["hunks"]]
+    return [f for f in files if f["file"]]
+
+
+def diffstat(name: str, text: str) -> str:
+    files = parse_patch(text)
+    added = sum(f["added"] for f in files)
+    removed = sum(f["removed"] for f in files)
+    lines = [f"{name}: {len(files)} file{'s' if len(files) != 1 else ''}, +{added} -{removed}"]
+    for f in files:
+        n = len(f["hunks"])
+        lines.append(f"  {f['file']}  +{f['added']} -{f['removed']}  ({n} hunk{'s' if n != 1 else ''})")
+    return "\n".join(lines)
+
+
+def _ranges(spec: str) -> List[int]:
+    out: List[int] = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        lo, _, hi = part.partition("-")
+        out.extend(range(int(lo), int(hi or lo) + 1))
+    return out
+
+
+def select_hunks(text: str, file: Optional[str] = None, hunks: Optional[str] = None) -> str:
+    """Hunks of *file* (all files if None); *hunks* like "1-3,5", numbered per file."""
+    wanted = _ranges(hunks) if hunks else None
+    out: List[str] = []
+    for f in parse_patch(text):
+        if file and f["file"] != file:
+            continue
+        picked = [(i, h) for i, h in enumerate(f["hunks"], 1) if wanted is None or i in wanted]
+        if picked:
+            out.append(f"--- {f['file']}")
+            out.extend(f"[hunk {i}]\n{h}" for i, h in picked)
+    if not out:
+        raise ValueError(f"No hunks matched file={file!r} hunks={hunks!r}")
+    return "\n".join(out)
+
+
+# ───────────────────────────── budgets ──────────────────────────────
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:           # optional dependency (or no cached BPE file)
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def fit(text: str, budget: Optional[int]) -> str:
+    """Cut *text* (at a line boundary) to about *budget* tokens, saying so."""
+    if not budget:
+        return text
+    total = estimate_tokens(text)
+    if total <= budget:
+        return text
+    cut = text[: max(int(len(text) * budget / total), 1)]
+    if "\n" in cut:
+        cut = cut[: cut.rindex("\n")]
+    return (f"{cut}\n…[truncated: ~{estimate_tokens(cut)} of ~{total} tokens shown; "
+            "narrow the request (path, max_hits, LIMIT, line range, hunks) to see the rest]")
+
+
+# ───────────────────────────── metering ─────────────────────────────
+class Meter:
+    """Per-tool token counts: verbose (pre-compact) output vs what was sent."""
+
+    def __init__(self) -> None:
+        self.tools: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "verbose": 0, "sent": 0})
+
+    def record(self, tool: str, verbose: str, sent: str) -> Dict[str, int]:
+        v, s = estimate_tokens(verbose), estimate_tokens(sent)
+        row = self.tools[tool]
+        row["calls"] += 1
+        row["verbose"] += v
+        row["sent"] += s
+        return {"verbose": v, "sent": s}
+
+    def summary(self) -> Dict[str, Any]:
+        verbose = sum(r["verbose"] for r in self.tools.values())
+        sent = sum(r["sent"] for r in self.tools.values())
+        return {
+            "verbose_tokens": verbose,
+            "sent_tokens": sent,
+            "saved_pct": round(100.0 * (verbose - sent) / verbose, 1) if verbose else 0.0,
+            "tools": {k: dict(v) for k, v in sorted(self.tools.items())},
+        }
+
+
+def current_meter() -> Optional[Meter]:
+    return _METER.get()
+
+
+@contextlib.contextmanager
+def session(compact: bool = True) -> Iterator[Meter]:
+    """Compact mode on/off plus a fresh Meter for one model session."""
+    meter = Meter()
+    token = _METER.set(meter)
+    try:
+        with compact_mode(compact):
+            yield meter
+    finally:
+        _METER.reset(token)
+        s = meter.summary()
+        if s["verbose_tokens"]:
+            logging.info("📉 tool output: ~%d tokens sent for ~%d verbose (%.1f%% saved)",
+                         s["sent_tokens"], s["verbose_tokens"], s["saved_pct"])
+
+
+def finalize(tool: str, result: Any, budget: Optional[int]) -> str:
+    """What the dispatcher puts in the conversation: compacted, budgeted, metered."""
+    if isinstance(result, Output):
+        text, verbose = result.text, result.verbose
+    else:
+        verbose = text = str(result)
+        if compact_enabled() and text[:1] in "[{":
+            try:
+                text = dumps(json.loads(text))
+            except ValueError:
+                pass
+    text = fit(text, budget)
+    meter = current_meter()
+    if meter is not None:
+        counts = meter.record(tool, verbose, text)
+        if counts["verbose"] != counts["sent"]:
+            logging.info("📉 %-15s ~%d → ~%d tokens", tool, counts["verbose"], counts["sent"])
+    return text
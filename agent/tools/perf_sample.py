@@ -0,0 +1,293 @@
+"""
+agent/tools/perf_sample.py   •   server-side performance sampling
+
+`sample_performance(port, sql=None, duration=10, interval_ms=10, repeat=1)`
+
+While *sql* runs (repeated *repeat* times on its own connection) – or, with
+no *sql*, for *duration* seconds of whatever workload is already running –
+a second connection polls `pg_stat_activity` every *interval_ms* and builds
+a wait-event histogram of the active backends (`CPU` = active, not
+waiting).  `pg_stat_statements`, `pg_stat_io`, `pg_stat_bgwriter`,
+`pg_stat_checkpointer`, `pg_stat_database` and the user table/index stats
+are snapshotted before and after, and only the non-zero deltas are
+returned.
+
+On first use the sandbox is instrumented automatically: pg_stat_statements
+is installed from contrib if needed, added to shared_preload_libraries
+(restarting the server once), and track_io_timing is switched on.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import decimal
+import json
+import pathlib
+import subprocess
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import psycopg
+
+from ..profiles import benchmark_context
+from ..registry import find_by_port
+
+# name → (relation, key expression, extra WHERE)
+SNAPSHOT_VIEWS = {
+    "statements": (
+        "pg_stat_statements", "queryid::text",
+        "dbid = (SELECT oid FROM pg_database WHERE datname = current_database())",
+    ),
+    "io": ("pg_stat_io", "concat_ws('/', backend_type, object, context)", None),
+    "bgwriter": ("pg_stat_bgwriter", "'bgwriter'", None),
+    "checkpointer": ("pg_stat_checkpointer", "'checkpointer'", None),
+    "database": ("pg_stat_database", "datname", "datname = current_database()"),
+    "tables": ("pg_stat_user_tables", "relname", None),
+    "indexes": ("pg_stat_user_indexes", "indexrelname", None),
+}
+TOP_STATEMENTS = 10
+GUCS = {"track_io_timing": "on", "track_wal_io_timing": "on"}
+
+
+def _connect(port: int, **kw) -> psycopg.Connection:
+    return psycopg.connect(
+        f"host=localhost port={port} dbname=postgres user=postgres", autocommit=True, **kw
+    )
+
+
+# ─────────────────────────── instrumentation ────────────────────────
+def _install_contrib(port: int, module: str) -> None:
+    hit = find_by_port(port)
+    if not hit:
+        raise RuntimeError(f"No sandbox registered on port {port}; cannot install {module}")
+    src = pathlib.Path(hit[1]["path"]) / "contrib" / module
+    subprocess.run(["make", "-s", "-C", str(src), "install"], check=True, capture_output=True)
+
+
+def _restart(port: int) -> None:
+    from ..fleet import restart_instance
+
+    hit = find_by_port(port)
+    if not hit:
+        raise RuntimeError(f"No sandbox registered on port {port}; restart it to load pg_stat_statements")
+    label, info = hit
+    result = restart_instance(label, info)
+    if result["status"] != "started":
+        raise RuntimeError(f"Restart of {label} failed: {result.get('error')}")
+
+
+def ensure_instrumentation(port: int) -> List[str]:
+    """Enable pg_stat_statements and timing GUCs; return what was changed."""
+    notes: List[str] = []
+    with _connect(port) as conn:
+        available = conn.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_stat_statements'"
+        ).fetchone()
+        preload = conn.execute("SHOW shared_preload_libraries").fetchone()[0]
+
+        if not available:
+            _install_contrib(port, "pg_stat_statements")
+            notes.append("installed contrib/pg_stat_statements")
+        for guc, value in GUCS.items():
+            try:
+                if conn.execute(f"SHOW {guc}").fetchone()[0] != value:
+                    conn.execute(f"ALTER SYSTEM SET {guc} = '{value}'")
+                    notes.append(f"{guc} = {value}")
+            except psycopg.errors.UndefinedObject:
+                pass            # older server without this GUC
+        libs = [lib.strip() for lib in preload.split(",") if lib.strip()]
+        needs_restart = "pg_stat_statements" not in libs
+        if needs_restart:
+            libs.append("pg_stat_statements")
+            conn.execute(f"ALTER SYSTEM SET shared_preload_libraries = '{','.join(libs)}'")
+            notes.append("shared_preload_libraries += pg_stat_statements (restarted)")
+        else:
+            conn.execute("SELECT pg_reload_conf()")
+
+    if needs_restart:
+        _restart(port)
+    with _connect(port) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+    return notes
+
+
+# ───────────────────────────── snapshots ────────────────────────────
+def _numeric(v: Any) -> bool:
+    return isinstance(v, (int, float, decimal.Decimal)) and not isinstance(v, bool)
+
+
+def snapshot(conn: psycopg.Connection) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    conn.execute("SELECT pg_stat_clear_snapshot()")
+    snap: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for name, (rel, key, where) in SNAPSHOT_VIEWS.items():
+        if conn.execute("SELECT to_regclass(%s)", (rel,)).fetchone()[0] is None:
+            continue
+        cur = conn.execute(
+            f"SELECT {key} AS _key, * FROM {rel}" + (f" WHERE {where}" if where else "")
+        )
+        cols = [d.name for d in cur.description]
+        snap[name] = {}
+        for row in cur.fetchall():
+            rec = dict(zip(cols, row))
+            snap[name][str(rec.pop("_key"))] = rec
+    return snap
+
+
+def delta(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per key, the non-zero changes of numeric columns (`query` text is kept)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, rec in after.items():
+        prev = before.get(key, {})
+        changes = {}
+        for col, val in rec.items():
+            if _numeric(val):
+                d = val - (prev.get(col) or 0)
+                if d:
+                    changes[col] = round(float(d), 3) if isinstance(d, (float, decimal.Decimal)) else d
+        if changes:
+            if "query" in rec:
+                changes["query"] = rec["query"][:200]
+            out[key] = changes
+    return out
+
+
+def _top_statements(stmts: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    ranked = sorted(stmts.values(), key=lambda s: -s.get("total_exec_time", 0))
+    return ranked[:TOP_STATEMENTS]
+
+
+# ──────────────────────────── wait sampling ─────────────────────────
+def histogram(samples: Counter) -> List[Dict[str, Any]]:
+    total = sum(samples.values())
+    return [
+        {"event": event, "samples": n, "pct": round(100.0 * n / total, 1)}
+        for event, n in samples.most_common()
+    ]
+
+
+def _sample_waits(port: int, stop: threading.Event, interval: float, out: Dict[str, Any]) -> None:
+    """Runs on its own thread: results (and any error, which would otherwise be lost) go to *out*."""
+    counts: Counter = Counter()
+    ticks = 0
+    try:
+        with _connect(port) as conn:
+            while not stop.is_set():
+                rows = conn.execute(
+                    "SELECT wait_event_type, wait_event FROM pg_stat_activity "
+                    "WHERE state = 'active' AND pid <> pg_backend_pid()"
+                ).fetchall()
+                ticks += 1
+                for wtype, wevent in rows:
+                    counts[f"{wtype}:{wevent}" if wtype else "CPU"] += 1
+                stop.wait(interval)
+    except Exception as exc:
+        out["error"] = f"{exc.__class__.__name__}: {exc}"
+    finally:
+        out["counts"], out["ticks"] = counts, ticks
+
+
+# ────────────────────────── public API ──────────────────────────────
+def sample_performance(
+    port: int,
+    sql: Optional[str] = None,
+    duration: float = 10,
+    interval_ms: int = 10,
+    repeat: int = 1,
+) -> str:
+    """
+    Profile the server on *port* while *sql* (or an external workload) runs.
+
+    Returns
+    -------
+    JSON string {sandbox, profile, settings, setup, error, sampler_error, elapsed, ticks,
+                 wait_events: [{event, samples, pct}],
+                 top_statements, deltas: {view: {key: {col: delta}}}}
+    """
+    notes = ensure_instrumentation(port)
+
+    with _connect(port) as snap_conn:
+        before = snapshot(snap_conn)
+
+        stop = threading.Event()
+        waits: Dict[str, Any] = {}
+        sampler = threading.Thread(
+            target=_sample_waits, args=(port, stop, interval_ms / 1000.0, waits), daemon=True
+        )
+        start = time.monotonic()
+        sampler.start()
+        error = None
+        try:
+            if sql:
+                with _connect(port) as work:
+                    for _ in range(repeat):
+                        work.execute(sql)
+                    with contextlib.suppress(psycopg.Error):    # PG15+
+                        work.execute("SELECT pg_stat_force_next_flush()")
+            else:
+                time.sleep(duration)
+        except psycopg.Error as exc:
+            error = f"{exc.__class__.__name__}: {exc}"
+        finally:
+            stop.set()
+            sampler.join()
+        elapsed = time.monotonic() - start
+
+        time.sleep(0.5)     # let other backends flush their stats
+        after = snapshot(snap_conn)
+
+    deltas = {name: delta(before.get(name, {}), rows) for name, rows in after.items()}
+    statements = deltas.pop("statements", {})
+    return json.dumps(
+        {
+            **benchmark_context(port),
+            "setup": notes,
+            "error": error,
+            "sampler_error": waits.get("error"),
+            "elapsed": round(elapsed, 3),
+            "ticks": waits.get("ticks", 0),
+            "wait_events": histogram(waits.get("counts", Counter())),
+            "top_statements": _top_statements(statements),
+            "deltas": {k: v for k, v in deltas.items() if v},
+        },
+        indent=2,
+        default=str,
+    )
+
+
+# ─────────────────────────── tool spec ──────────────────────────────
+tool_spec = {
+    "type": "function",
+    "name": "sample_performance",
+    "description": (
+        "Sample wait events (pg_stat_activity) at high frequency while a SQL statement "
+        "or an already-running workload executes, and return the wait-event histogram "
+        "plus before/after deltas of pg_stat_statements, pg_stat_io, bgwriter/checkpointer, "
+        "database and table/index stats. Enables pg_stat_statements automatically."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "port": {"type": "integer"},
+            "sql": {
+                "type": "string",
+                "description": "Statement(s) to run and measure. Omit to observe the server for `duration` seconds.",
+            },
+            "duration": {
+                "type": "number",
+                "description": "Seconds to observe when no sql is given (default 10).",
+            },
+            "interval_ms": {
+                "type": "integer",
+                "description": "Sampling interval for pg_stat_activity (default 10).",
+            },
+            "repeat": {
+                "type": "integer",
+                "description": "Number of times to execute sql (default 1).",
+            },
+        },
+        "required": ["port"],
+        "additionalProperties": False,
+    },
+}
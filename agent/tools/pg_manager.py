@@ -5,7 +5,10 @@ import subprocess
 import tempfile
 from typing import Tuple
 
-from ..registry import add_instance, list_instances, next_free_port
+from ..profiles import initial_profile
+from ..registry import add_instance, data_dir, get_instance, next_free_port, release_port
+from ..storage import enforce, rebuilt, record, sandbox_dir, touch
+from . import tree_index
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -104,32 +107,44 @@ def _apply_patch(sandbox: pathlib.Path, patch: str, check_only: bool = False) ->
 # ─────────────────────────── public API ────────────────────────────
 
 
-def fresh_clone_and_launch(label: str) -> Tuple[int, pathlib.Path]:
+def fresh_clone_and_launch(label: str, profile: str = "default") -> Tuple[int, pathlib.Path]:
     """
     Clone, build, install, initdb, start, and register a sandbox.
-    Returns (port, workdir).
+    *profile* names the postgresql.conf profile applied after initdb
+    (see agent/profiles.py).  Returns (port, workdir).
     """
-    workdir = pathlib.Path(tempfile.mkdtemp(prefix="pgdbg_"))
-    logging.info("Cloning PostgreSQL into %s", workdir)
-    _run(["git", "clone", "--depth=1", POSTGRES_GIT, str(workdir)])
-
-    port = next_free_port()
+    report = enforce(protect=[label])
+    if report["actions"]:
+        logging.info("🧹 Storage cap: evicted %s", [(a["label"], a["evict"]) for a in report["actions"]])
+
+    base = sandbox_dir()
+    if base:
+        base.mkdir(parents=True, exist_ok=True)
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="pgdbg_", **({"dir": str(base)} if base else {})))
+    # reserved before cloning, so `gc --orphans` knows this worktree is in use
+    port = next_free_port(path=workdir)
     env = os.environ.copy()
     env["PGPORT"] = str(port)
 
-    prefix = _configure(workdir, env)
-    _build_and_install(workdir, env)
-
-    bin_dir = prefix / "bin"
-    datadir = workdir / "data"
-    _initdb(bin_dir, datadir, env)
-    _start_postgres(bin_dir, datadir, port, env)
+    try:
+        logging.info("Cloning PostgreSQL into %s", workdir)
+        _run(["git", "clone", "--depth=1", POSTGRES_GIT, str(workdir)])
+        prefix = _configure(workdir, env)
+        _build_and_install(workdir, env)
+
+        bin_dir = prefix / "bin"
+        datadir = workdir / "data"
+        _initdb(bin_dir, datadir, env)
+        profile_fields = initial_profile(datadir, profile)
+        _start_postgres(bin_dir, datadir, port, env)
+    except BaseException:
+        release_port(port)
+        raise
 
-    add_instance(label, port, workdir)
+    add_instance(label, port, workdir, **profile_fields)
+    record(label)
 
-    os.environ["PG_DEBUGGER_SRC"] = str(workdir)
-    print(f"🌱 launched {label} on port {port} in {workdir}")
-    print("Set PG_DEBUGGER_SRC to this path for code lookups.")
+    print(f"🌱 launched {label} on port {port} in {workdir} (profile: {profile})")
     return port, workdir
 
 
@@ -137,7 +152,7 @@ def edit_and_rebuild(file_path: str, replacement: str, label: str) -> None:
     """
     Overwrite *file_path* in sandbox *label* with *replacement*, rebuild, reinstall.
     """
-    inst = list_instances().get(label)
+    inst = get_instance(label)
     if not inst:
         raise RuntimeError(f"No instance named '{label}'")
 
@@ -152,6 +167,8 @@ def edit_and_rebuild(file_path: str, replacement: str, label: str) -> None:
     env = os.environ.copy()
     env["PGPORT"] = str(inst["port"])
     _rebuild_and_install(sandbox, env)
+    rebuilt(label)
+    tree_index.invalidate(sandbox)
 
     print(f"✅ Rebuilt {label}")
 
@@ -169,7 +186,7 @@ def apply_patch_and_relaunch(label: str, patch: str) -> None:
     5. If anything fails after the stop, roll back the working tree and
        bring the original server back online.
     """
-    inst = list_instances().get(label)
+    inst = get_instance(label)
     if not inst:
         raise RuntimeError(f"No instance named '{label}'")
 
@@ -177,10 +194,11 @@ def apply_patch_and_relaunch(label: str, patch: str) -> None:
     port = inst["port"]
     env = os.environ.copy()
     env["PGPORT"] = str(port)
+    touch(label)
 
     prefix = sandbox / "install"
     bin_dir = prefix / "bin"
-    datadir = sandbox / "data"
+    datadir = data_dir(inst)
 
     # 1 – dry-run for safety
     logging.info("🧪 Dry-running patch for %s", label)
@@ -197,18 +215,28 @@ def apply_patch_and_relaunch(label: str, patch: str) -> None:
 
         logging.info("🔨 Rebuilding & installing")
         _rebuild_and_install(sandbox, env)
+        rebuilt(label)
+        tree_index.invalidate(sandbox)
 
         # 4 – relaunch
         logging.info("🚀 Restarting Postgres on port %s", port)
         _start_postgres(bin_dir, datadir, port, env)
         print(f"✅ Patch applied and {label} relaunched on port {port}")
 
+        # replicas run the same install/ binaries: pick up the new build too
+        from ..replication import restart_replicas
+        for r in restart_replicas(label):
+            if r["status"] != "started":
+                logging.warning("⚠️  Replica %s did not come back: %s", r["label"], r.get("error"))
+
     except Exception as exc:
         logging.error("❌ Patch/rebuild failed: %s – rolling back", exc)
         # Restore source tree and binaries
         _run(["git", "reset", "--hard", "HEAD"], cwd=sandbox)
+        tree_index.invalidate(sandbox)
         try:
             _rebuild_and_install(sandbox, env)
+            rebuilt(label)
             _start_postgres(bin_dir, datadir, port, env)
             logging.info("🔄 Original server for %s restored.", label)
         except Exception as exc2:
@@ -1,12 +1,16 @@
-import psycopg, json, os
+import psycopg
 
-def execute_query(sql: str, port: int) -> str:
+from .output import emit, table
+
+def execute_query(sql: str, port: int):
     conn = psycopg.connect(f"host=localhost port={port} dbname=postgres user=postgres")
     with conn, conn.cursor() as cur:
         cur.execute(sql)
         if cur.description:
             rows = cur.fetchall()
-            return json.dumps(rows, default=str)[:4000]
+            columns = [getattr(col, "name", col) for col in cur.description]
+            # the dispatcher enforces the output budget
+            return emit(rows, lambda r: table(columns, r), indent=None)
         return "OK"
 
 tool_spec = {
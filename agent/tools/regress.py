@@ -0,0 +1,492 @@
+"""
+agent/tools/regress.py   •   change-aware regression test runner
+
+`run_regression_tests(patch=None, time_budget=300, max_parallel=4)`
+
+1. Collect the changed files – from *patch* (its `+++ b/…` headers) or,
+   by default, `git diff --name-only HEAD` in the active sandbox.
+2. Map them to pg_regress tests, isolation specs, contrib `installcheck`
+   suites and TAP suites (path rules + file-name matching).
+3. Run the selection against the *installed* sandbox, installcheck
+   style, highest signal first and fastest first within a signal level,
+   until the time budget is spent: one pg_regress run per score tier from
+   a generated schedule (after test_setup, keeping upstream's
+   parallel_schedule groups, so only tests upstream runs together run
+   concurrently), the isolation specs in one pg_isolation_regress run,
+   and contrib and TAP `installcheck` suites one by one.  A tier that
+   will not fit the remaining budget (by cached durations) is cut down to
+   its fastest tests up front rather than killed half way.
+4. Return a compact JSON summary: pass/fail/skip lists plus the
+   `regression.diffs` excerpt for failing tests only.
+
+Per-test durations are cached in ~/.pg_debugger_agent/test_durations.json
+so later runs can order the queue well.
+"""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import re
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .. import context
+from ..fsutil import atomic_write_json
+from ..registry import get_instance
+
+DEFAULT_DURATION = 5.0
+MAX_DIFF_CHARS = 3_000
+
+# Source prefix → regress tests / isolation specs worth running for it.
+REGRESS_BY_PATH: Dict[str, List[str]] = {
+    "src/backend/optimizer": ["select", "join", "subselect", "aggregates", "union", "partition_join"],
+    "src/backend/executor": ["select", "join", "insert", "update", "delete", "aggregates", "subselect"],
+    "src/backend/parser": ["select", "insert", "update", "create_table", "alter_table"],
+    "src/backend/rewrite": ["rules", "updatable_views"],
+    "src/backend/partitioning": ["partition_prune", "partition_join", "partition_aggregate", "partition_info"],
+    "src/backend/catalog": ["create_table", "alter_table"],
+    "src/backend/commands/tablecmds": ["alter_table", "create_table"],
+    "src/backend/commands/vacuum": ["vacuum"],
+    "src/backend/postmaster/autovacuum": ["vacuum"],
+    "src/backend/access/nbtree": ["btree_index", "create_index"],
+    "src/backend/access/gin": ["gin"],
+    "src/backend/access/gist": ["gist"],
+    "src/backend/access/brin": ["brin"],
+    "src/backend/access/hash": ["hash_index"],
+    "src/backend/access/spgist": ["spgist"],
+    "src/backend/access/heap": ["vacuum", "update", "insert"],
+    "src/backend/replication/logical": ["publication", "subscription"],
+    "src/backend/tcop": ["prepare"],
+    "src/backend/utils/cache": ["plancache"],
+    "src/pl/plpgsql": ["plpgsql"],
+}
+ISOLATION_BY_PATH: Dict[str, List[str]] = {
+    "src/backend/storage/lmgr": ["deadlock-simple", "deadlock-hard", "lock-update-delete"],
+    "src/backend/access/heap": ["eval-plan-qual", "lock-update-delete", "update-locked-tuple"],
+    "src/backend/executor/nodeModifyTable": ["eval-plan-qual", "insert-conflict-do-update"],
+    "src/backend/storage/ipc": ["deadlock-simple"],
+    "src/backend/commands/vacuum": ["vacuum-concurrent-drop"],
+}
+SMOKE_TESTS = ["boolean", "int4", "select", "join", "aggregates"]
+
+
+# ─────────────────────────── change detection ───────────────────────
+def files_from_patch(patch: str) -> List[str]:
+    files = re.findall(r"^\+\+\+ b/(\S+)", patch, flags=re.M)
+    files += re.findall(r"^--- a/(\S+)", patch, flags=re.M)
+    return sorted(set(files))
+
+
+def changed_files(root: pathlib.Path, patch: Optional[str] = None) -> List[str]:
+    if patch:
+        return files_from_patch(patch)
+    out = subprocess.run(
+        ["git", "diff", "--name-only", "HEAD"], cwd=root, capture_output=True, text=True
+    ).stdout
+    return sorted(set(out.split()))
+
+
+# ─────────────────────────── test selection ─────────────────────────
+def _stems(directory: pathlib.Path, suffix: str) -> set:
+    return {p.stem for p in directory.glob(f"*{suffix}")} if directory.is_dir() else set()
+
+
+def _tap_enabled(root: pathlib.Path) -> bool:
+    mk = root / "src" / "Makefile.global"
+    return mk.exists() and re.search(r"^enable_tap_tests\s*=\s*yes", mk.read_text(), re.M) is not None
+
+
+def select_tests(root: pathlib.Path, files: List[str]) -> List[Dict[str, Any]]:
+    """Candidate tests for *files*, as [{suite, name, score}] (higher = more relevant)."""
+    regress = _stems(root / "src/test/regress/sql", ".sql")
+    isolation = _stems(root / "src/test/isolation/specs", ".spec")
+    picks: Dict[tuple, int] = {}
+
+    def add(suite: str, name: str, score: int) -> None:
+        picks[(suite, name)] = max(score, picks.get((suite, name), 0))
+
+    for f in files:
+        parts = pathlib.PurePosixPath(f).parts
+        stem = pathlib.PurePosixPath(f).stem.lower()
+
+        m = re.match(r"src/test/regress/(?:sql|expected)/([^/.]+)", f)
+        if m and m.group(1) in regress:
+            add("regress", m.group(1), 100)
+            continue
+        m = re.match(r"src/test/isolation/(?:specs|expected)/([^/.]+)", f)
+        if m and m.group(1) in isolation:
+            add("isolation", m.group(1), 100)
+            continue
+        if parts[:1] == ("contrib",) and len(parts) > 2:
+            add("contrib", parts[1], 90)
+            continue
+        if parts[:2] == ("src", "bin") and len(parts) > 3:
+            if (root / "src/bin" / parts[2] / "t").is_dir():
+                add("tap", f"src/bin/{parts[2]}", 60)
+            continue
+
+        for prefix, names in REGRESS_BY_PATH.items():
+            if f.startswith(prefix):
+                for name in names:
+                    if name in regress:
+                        add("regress", name, 70)
+        for prefix, names in ISOLATION_BY_PATH.items():
+            if f.startswith(prefix):
+                for name in names:
+                    if name in isolation:
+                        add("isolation", name, 60)
+
+        # file-name matches: utils/adt/json.c → json, jsonb_util.c → jsonb, …
+        for token in {stem, re.sub(r"^(node|pg_)", "", stem), stem.split("_")[0]}:
+            if token in regress:
+                add("regress", token, 80)
+
+    if not picks and any(f.endswith((".c", ".h", ".y", ".l")) for f in files):
+        for name in SMOKE_TESTS:
+            if name in regress:
+                add("regress", name, 10)
+
+    return [{"suite": s, "name": n, "score": sc} for (s, n), sc in picks.items()]
+
+
+def _durations_path() -> pathlib.Path:
+    return pathlib.Path.home() / ".pg_debugger_agent" / "test_durations.json"
+
+
+def _load_durations() -> Dict[str, float]:
+    try:
+        return json.loads(_durations_path().read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_durations(durations: Dict[str, float]) -> None:
+    atomic_write_json(_durations_path(), durations, indent=2, sort_keys=True)
+
+
+def _key(test: Dict[str, Any]) -> str:
+    return f"{test['suite']}:{test['name']}"
+
+
+def order_tests(tests: List[Dict[str, Any]], durations: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Highest score first; within a score, fastest (by cached duration) first."""
+    return sorted(tests, key=lambda t: (-t["score"], durations.get(_key(t), DEFAULT_DURATION), t["name"]))
+
+
+# ───────────────────────────── runners ──────────────────────────────
+# pg_regress progress lines: "ok 7 + boolean  78 ms" (PG16+) or
+# "     boolean  ... ok  78 ms" / "test x ... FAILED 80 ms" (older)
+_RESULT_LINE = re.compile(
+    r"^(?:(?P<not>not )?ok\s+\d+\s+[-+]\s+(?P<name>\S+)\s+(?P<ms>\d+) ms"
+    r"|\s*(?:test\s+)?(?P<oname>\S+)\s+\.\.\.\s+(?P<ostatus>ok|FAILED|failed)[^\n]*?(?P<oms>\d+) ms)",
+    re.M,
+)
+
+
+def parse_results(output: str) -> Dict[str, Dict[str, Any]]:
+    """pg_regress stdout → {test: {passed, seconds}}."""
+    found = {}
+    for m in _RESULT_LINE.finditer(output):
+        if m.group("name"):
+            found[m.group("name")] = {"passed": not m.group("not"), "seconds": int(m.group("ms")) / 1000}
+        else:
+            found[m.group("oname")] = {"passed": m.group("ostatus") == "ok", "seconds": int(m.group("oms")) / 1000}
+    return found
+
+
+def split_diffs(text: str) -> Dict[str, str]:
+    """regression.diffs → {test: its part}, keyed by the results file name."""
+    out: Dict[str, str] = {}
+    name = None
+    for line in text.splitlines(keepends=True):
+        if line.startswith("diff "):
+            name = pathlib.PurePath(line.split()[-1]).stem
+        if name:
+            out[name] = out.get(name, "") + line
+    return {k: v if len(v) <= MAX_DIFF_CHARS else v[:MAX_DIFF_CHARS] + "\n…(truncated)" for k, v in out.items()}
+
+
+def _read_diffs(outdir: pathlib.Path) -> str:
+    diffs = outdir / "regression.diffs"
+    text = diffs.read_text(errors="replace") if diffs.exists() else ""
+    if len(text) > MAX_DIFF_CHARS:
+        text = text[:MAX_DIFF_CHARS] + "\n…(truncated)"
+    return text
+
+
+def upstream_groups(root: pathlib.Path) -> List[List[str]]:
+    """The `test:` lines of parallel_schedule, in order (tests in one group may run together)."""
+    path = root / "src/test/regress/parallel_schedule"
+    if not path.exists():
+        return []
+    return [line.split(":", 1)[1].split() for line in path.read_text().splitlines()
+            if line.startswith("test:")]
+
+
+def write_schedule(root: pathlib.Path, names: List[str], path: pathlib.Path) -> List[str]:
+    """
+    A schedule running *names* (after test_setup) the way installcheck-parallel
+    would: in upstream order, and concurrently only with tests upstream puts in
+    the same parallel group.  Tests upstream does not list run on their own.
+    Returns the tests in the order scheduled.
+    """
+    wanted = set(names) - {"test_setup"}
+    lines, order = ["test: test_setup"], ["test_setup"]
+    for group in upstream_groups(root):
+        picked = [n for n in group if n in wanted]
+        if picked:
+            lines.append("test: " + " ".join(picked))
+            order += picked
+            wanted -= set(picked)
+    for name in sorted(wanted):
+        lines.append(f"test: {name}")
+        order.append(name)
+    path.write_text("\n".join(lines) + "\n")
+    return order
+
+
+def _prepare(tests: List[Dict[str, Any]], root: pathlib.Path, deadline: float) -> None:
+    """Build what the selected suites need, once, before anything runs (raises TimeoutExpired)."""
+    suites = {t["suite"] for t in tests}
+    builds = []
+    if "regress" in suites and not (root / "src/test/regress/pg_regress").exists():
+        builds.append(["make", "-s", "-C", str(root / "src/test/regress")])
+    if "isolation" in suites and not (root / "src/test/isolation/isolationtester").exists():
+        builds.append(["make", "-s", "-C", str(root / "src/test/isolation")])
+    builds += [["make", "-s", "-C", str(root / "contrib" / t["name"]), "install"]
+               for t in tests if t["suite"] == "contrib"]
+    for argv in builds:
+        subprocess.run(argv, check=True, capture_output=True,
+                       timeout=max(deadline - time.monotonic(), 0.001))
+
+
+def _batch_command(suite: str, tests: List[Dict[str, Any]], root: pathlib.Path, port: int,
+                   outdir: pathlib.Path, max_parallel: int):
+    """One pg_regress (or pg_isolation_regress) run for all selected tests of *suite*: (argv, cwd)."""
+    bindir = root / "install" / "bin"
+    common = [f"--bindir={bindir}", "--host=localhost", f"--port={port}", "--user=postgres",
+              f"--dbname=pgdbg_{suite}", f"--outputdir={outdir}"]
+    if suite == "regress":
+        d = root / "src/test/regress"
+        write_schedule(root, [t["name"] for t in tests], outdir / "schedule")
+        return [str(d / "pg_regress"), f"--inputdir={d}", f"--dlpath={d}", *common,
+                f"--schedule={outdir / 'schedule'}", f"--max-concurrent-tests={max_parallel}"], d
+    d = root / "src/test/isolation"
+    # tests named on the command line run one after another
+    return [str(d / "pg_isolation_regress"), f"--inputdir={d}", *common, *(t["name"] for t in tests)], d
+
+
+def _run_batch(suite, tests, root, port, workdir, deadline, max_parallel) -> List[Dict[str, Any]]:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return [{**t, "status": "skipped", "reason": "time budget"} for t in tests]
+    outdir = workdir / suite
+    outdir.mkdir(parents=True, exist_ok=True)
+    argv, cwd = _batch_command(suite, tests, root, port, outdir, max_parallel)
+    timed_out = False
+    try:
+        proc = subprocess.run(argv, cwd=cwd, capture_output=True, text=True, timeout=remaining)
+        output = proc.stdout + proc.stderr
+    except subprocess.TimeoutExpired as exc:
+        timed_out = True
+        output = exc.stdout.decode(errors="replace") if isinstance(exc.stdout, bytes) else (exc.stdout or "")
+    except OSError as exc:
+        return [{**t, "status": "error", "diff": str(exc)[:MAX_DIFF_CHARS]} for t in tests]
+
+    ran = parse_results(output)
+    diffs = split_diffs((outdir / "regression.diffs").read_text(errors="replace")) \
+        if (outdir / "regression.diffs").exists() else {}
+    results = []
+    for t in tests:
+        r = ran.get(t["name"])
+        if r is None:
+            results.append({**t, "status": "skipped", "reason": "time budget"} if timed_out else
+                           {**t, "status": "error", "diff": output[-MAX_DIFF_CHARS:]})
+        elif r["passed"]:
+            results.append({**t, "status": "passed", "seconds": r["seconds"]})
+        else:
+            results.append({**t, "status": "failed", "seconds": r["seconds"],
+                            "diff": diffs.get(t["name"]) or output[-MAX_DIFF_CHARS:]})
+    setup = ran.get("test_setup")
+    if suite == "regress" and setup and not setup["passed"] and all(t["name"] != "test_setup" for t in tests):
+        results.append({"suite": "regress", "name": "test_setup", "score": 0, "status": "failed",
+                        "seconds": setup["seconds"], "diff": diffs.get("test_setup", "")})
+    return results
+
+
+def _command(test: Dict[str, Any], root: pathlib.Path, port: int):
+    """(argv, cwd, directory holding the diffs) of a contrib or TAP suite."""
+    env = [f"PGPORT={port}", "PGHOST=localhost", "PGUSER=postgres"]
+    if test["suite"] == "contrib":
+        d = root / "contrib" / test["name"]
+        return ["make", "-s", "-C", str(d), "installcheck", *env], d, d
+    # TAP: installcheck uses the sandbox's installed binaries, not a temp install
+    d = root / test["name"]
+    return ["make", "-s", "-C", str(d), "installcheck", *env], d, d / "tmp_check"
+
+
+def _run_one(test, root, port, deadline) -> Dict[str, Any]:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return {**test, "status": "skipped", "reason": "time budget"}
+    if test["suite"] == "tap" and not _tap_enabled(root):
+        return {**test, "status": "skipped", "reason": "TAP tests not configured"}
+
+    start = time.monotonic()
+    try:
+        argv, cwd, diffdir = _command(test, root, port)
+        proc = subprocess.run(argv, cwd=cwd, capture_output=True, text=True, timeout=remaining)
+    except subprocess.TimeoutExpired:
+        return {**test, "status": "skipped", "reason": "time budget"}
+    except OSError as exc:
+        return {**test, "status": "error", "diff": str(exc)[:MAX_DIFF_CHARS]}
+    seconds = time.monotonic() - start
+
+    if proc.returncode == 0:
+        return {**test, "status": "passed", "seconds": seconds}
+    diff = _read_diffs(diffdir) or (proc.stdout + proc.stderr)[-MAX_DIFF_CHARS:]
+    return {**test, "status": "failed", "seconds": seconds, "diff": diff}
+
+
+def plan(tests: List[Dict[str, Any]], durations: Dict[str, float]) -> List[List[Dict[str, Any]]]:
+    """
+    Run units, most relevant (then quickest) first: one regress batch per
+    score tier, one batch for all isolation specs, one unit per contrib/TAP
+    suite.  Units run one after another – contrib suites share
+    `contrib_regression` and regress tests share roles and tablespaces – so
+    concurrency comes only from the schedule's parallel groups.  Tests keep
+    their `order_tests` order inside a unit.
+    """
+    queue = order_tests(tests, durations)
+    regress = [t for t in queue if t["suite"] == "regress"]
+    units = [[t for t in regress if t["score"] == score]
+             for score in sorted({t["score"] for t in regress}, reverse=True)]
+    isolation = [t for t in queue if t["suite"] == "isolation"]
+    units += [isolation] if isolation else []
+    units += [[t] for t in queue if t["suite"] in ("contrib", "tap")]
+    return sorted(units, key=lambda u: (-max(t["score"] for t in u),
+                                        sum(durations.get(_key(t), DEFAULT_DURATION) for t in u)))
+
+
+def fit(unit: List[Dict[str, Any]], durations: Dict[str, float], remaining: float):
+    """
+    (tests to run, tests skipped): the longest prefix of *unit* whose cached
+    durations add up to *remaining* seconds – always at least one test.
+    Serial sums overestimate a parallel schedule, so this errs on the safe side.
+    """
+    total = 0.0
+    for i, t in enumerate(unit):
+        total += durations.get(_key(t), DEFAULT_DURATION)
+        if total > remaining and i:
+            return unit[:i], unit[i:]
+    return unit, []
+
+
+def run_tests(tests, root: pathlib.Path, port: int, time_budget: float, max_parallel: int):
+    durations = _load_durations()
+    deadline = time.monotonic() + time_budget
+    try:
+        _prepare(tests, root, deadline)
+    except subprocess.TimeoutExpired:
+        return [{**t, "status": "skipped", "reason": "time budget"} for t in tests]
+    except (OSError, subprocess.CalledProcessError) as exc:
+        return [{**t, "status": "error", "diff": f"build failed: {exc}"[:MAX_DIFF_CHARS]} for t in tests]
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="pgdbg_regress_") as tmp:
+        for i, unit in enumerate(plan(tests, durations)):
+            suite = unit[0]["suite"]
+            if suite == "regress":
+                unit, later = fit(unit, durations, deadline - time.monotonic())
+                results += [{**t, "status": "skipped", "reason": "time budget"} for t in later]
+                workdir = pathlib.Path(tmp) / f"tier{i}"
+                results += _run_batch(suite, unit, root, port, workdir, deadline, max_parallel)
+            elif suite == "isolation":
+                results += _run_batch(suite, unit, root, port, pathlib.Path(tmp), deadline, max_parallel)
+            else:
+                results.append(_run_one(unit[0], root, port, deadline))
+
+    for r in results:
+        if "seconds" in r:
+            durations[_key(r)] = round(r["seconds"], 2)
+    _save_durations(durations)
+    return results
+
+
+# ────────────────────────── public API ──────────────────────────────
+def run_regression_tests(
+    patch: Optional[str] = None, time_budget: int = 300, max_parallel: int = 4
+) -> str:
+    """
+    Run the regression tests relevant to the active sandbox's changes.
+
+    Parameters
+    ----------
+    patch        : optional unified diff; defaults to `git diff HEAD` in the sandbox
+    time_budget  : seconds after which remaining tests are skipped
+    max_parallel : at most this many tests of one parallel group run at once
+
+    Returns
+    -------
+    JSON string {changed_files, ran, passed, failed: {test: diff}, skipped, seconds}
+    """
+    label = context.get_label()
+    info = get_instance(label) if label else None
+    if not info:
+        raise RuntimeError("No active sandbox to test against")
+    root = pathlib.Path(info["path"])
+
+    files = changed_files(root, patch)
+    tests = select_tests(root, files)
+    start = time.monotonic()
+    results = run_tests(tests, root, info["port"], time_budget, max_parallel) if tests else []
+
+    by_status: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        by_status.setdefault(r["status"], []).append(r)
+    return json.dumps(
+        {
+            "changed_files": len(files),
+            "ran": len(by_status.get("passed", [])) + len(by_status.get("failed", [])),
+            "passed": [_key(r) for r in by_status.get("passed", [])],
+            "failed": {_key(r): r["diff"] for r in by_status.get("failed", []) + by_status.get("error", [])},
+            "skipped": [f"{_key(r)} ({r['reason']})" for r in by_status.get("skipped", [])],
+            "seconds": round(time.monotonic() - start, 1),
+        },
+        indent=2,
+    )
+
+
+# ─────────────────────────── tool spec ──────────────────────────────
+tool_spec = {
+    "type": "function",
+    "name": "run_regression_tests",
+    "description": (
+        "Run the pg_regress, isolation, contrib and TAP tests relevant to the files "
+        "changed in the active sandbox (or in a given patch) against the installed "
+        "server, installcheck-parallel style and within a time budget. Returns pass/fail lists and "
+        "diffs for failing tests only."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "patch": {
+                "type": "string",
+                "description": "Optional unified diff; by default the sandbox's uncommitted changes are used.",
+            },
+            "time_budget": {
+                "type": "integer",
+                "description": "Seconds to spend before skipping the remaining tests (default 300).",
+            },
+            "max_parallel": {
+                "type": "integer",
+                "description": "Max tests of one parallel group run at once (default 4).",
+            },
+        },
+        "required": [],
+        "additionalProperties": False,
+    },
+}
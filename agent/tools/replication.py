@@ -0,0 +1,235 @@
+"""
+agent/tools/replication.py   •   replica topologies and replication metrics
+
+`replication_status(port, sample_seconds=2)`
+
+Samples the primary of *port*'s replication group twice, *sample_seconds*
+apart, and reports
+
+* WAL generation rate   – pg_current_wal_lsn() delta per second
+* per standby           – state, sent/flush/replay lag in bytes and the
+                          write/flush/replay lag times of pg_stat_replication,
+                          plus its apply rate (replay_lsn delta per second)
+* per replication slot  – active?, WAL retained for it
+* per registered replica – what the replica itself sees: replay delay of
+                          a streaming standby, pg_stat_subscription of a
+                          logical subscriber
+
+`add_replicas(port, count=1, mode="streaming")` attaches replicas to the
+sandbox on *port* (see agent/replication.py).
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg
+
+from .. import replication
+from ..profiles import benchmark_context
+from ..registry import find_by_port, get_instance
+from .output import emit
+
+STANDBY_SQL = """
+SELECT application_name, state, sync_state,
+       sent_lsn::text, write_lsn::text, flush_lsn::text, replay_lsn::text,
+       extract(epoch FROM write_lag)::float8  AS write_lag_s,
+       extract(epoch FROM flush_lag)::float8  AS flush_lag_s,
+       extract(epoch FROM replay_lag)::float8 AS replay_lag_s
+  FROM pg_stat_replication
+"""
+SLOT_SQL = """
+SELECT slot_name, slot_type, active, wal_status,
+       pg_wal_lsn_diff(pg_current_wal_lsn(), restart_lsn)::bigint AS retained_bytes
+  FROM pg_replication_slots
+"""
+STANDBY_SIDE_SQL = """
+SELECT pg_is_in_recovery(),
+       pg_last_wal_receive_lsn()::text, pg_last_wal_replay_lsn()::text,
+       extract(epoch FROM now() - pg_last_xact_replay_timestamp())::float8
+"""
+SUBSCRIBER_SQL = """
+SELECT subname, received_lsn::text, latest_end_lsn::text,
+       extract(epoch FROM now() - last_msg_receipt_time)::float8 AS last_msg_age_s
+  FROM pg_stat_subscription
+"""
+
+
+def _connect(port: int) -> psycopg.Connection:
+    return psycopg.connect(
+        f"host=localhost port={port} dbname=postgres user=postgres", autocommit=True, connect_timeout=5
+    )
+
+
+def lsn(text: Optional[str]) -> Optional[int]:
+    """'16/B374D848' → byte position (None stays None)."""
+    if not text:
+        return None
+    hi, lo = text.split("/")
+    return (int(hi, 16) << 32) | int(lo, 16)
+
+
+def _rows(conn: psycopg.Connection, sql: str) -> List[Dict[str, Any]]:
+    cur = conn.execute(sql)
+    cols = [c[0] for c in cur.description]
+    return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+# ───────────────────────────── sampling ─────────────────────────────
+def sample_primary(conn: psycopg.Connection) -> Dict[str, Any]:
+    """One look at the primary: current LSN and its walsenders."""
+    current = conn.execute("SELECT pg_current_wal_lsn()::text").fetchone()[0]
+    return {
+        "t": time.monotonic(),
+        "lsn": lsn(current),
+        "standbys": {r["application_name"]: r for r in _rows(conn, STANDBY_SQL)},
+    }
+
+
+def rates(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """WAL generation rate and per-standby lag / apply rate from two samples."""
+    dt = max(after["t"] - before["t"], 1e-6)
+    standbys = []
+    for name, row in after["standbys"].items():
+        replay = lsn(row["replay_lsn"])
+        prev = before["standbys"].get(name, {})
+        prev_replay = lsn(prev.get("replay_lsn"))
+        standbys.append({
+            "name": name,
+            "state": row["state"],
+            "sync_state": row["sync_state"],
+            **{f"{kind}_lag_bytes": after["lsn"] - lsn(row[f"{kind}_lsn"]) if row[f"{kind}_lsn"] else None
+               for kind in ("sent", "flush", "replay")},
+            **{k: row[k] for k in ("write_lag_s", "flush_lag_s", "replay_lag_s")},
+            "apply_bytes_per_s": round((replay - prev_replay) / dt) if replay is not None and prev_replay is not None else None,
+        })
+    return {
+        "interval_s": round(dt, 3),
+        "wal_bytes_per_s": round((after["lsn"] - before["lsn"]) / dt),
+        "current_lsn": after["lsn"],
+        "standbys": standbys,
+    }
+
+
+def replica_view(info: Dict[str, Any]) -> Dict[str, Any]:
+    """What a registered replica reports about itself."""
+    try:
+        with _connect(info["port"]) as conn:
+            if info.get("mode") == "logical":
+                return {"subscriptions": _rows(conn, SUBSCRIBER_SQL)}
+            in_recovery, received, replayed, delay = conn.execute(STANDBY_SIDE_SQL).fetchone()
+    except psycopg.Error as exc:
+        return {"error": f"{exc.__class__.__name__}: {exc}"}
+    return {
+        "in_recovery": in_recovery,
+        "receive_lsn": received,
+        "replay_lsn": replayed,
+        "replay_delay_s": delay,
+        "unreplayed_bytes": lsn(received) - lsn(replayed) if received and replayed else None,
+    }
+
+
+# ────────────────────────── public API ──────────────────────────────
+def replication_status(port: int, sample_seconds: float = 2.0) -> str:
+    """
+    Replication lag, WAL generation and apply rates for *port*'s group.
+
+    Returns
+    -------
+    JSON string {sandbox, profile, settings, group, primary: {label, port},
+                 interval_s, wal_bytes_per_s, current_lsn,
+                 standbys: [{name, label, port, mode, state, sync_state, *_lag_bytes, *_lag_s,
+                             apply_bytes_per_s, replica}],
+                 slots: [{slot_name, slot_type, active, wal_status, retained_bytes}]}
+    """
+    hit = find_by_port(port)
+    label, info = hit if hit else (None, {})
+    primary_label = info.get("primary") or label
+    primary = get_instance(primary_label) if primary_label else None
+    primary_port = primary["port"] if primary else port
+
+    with _connect(primary_port) as conn:
+        before = sample_primary(conn)
+        time.sleep(sample_seconds)
+        after = sample_primary(conn)
+        slots = _rows(conn, SLOT_SQL)
+
+    report = rates(before, after)
+    known = replication.replicas_of(primary_label) if primary_label else {}
+    by_name = {}
+    for name, r in known.items():
+        by_name[name] = by_name[r.get("slot")] = (name, r)
+    for standby in report["standbys"]:
+        name, r = by_name.get(standby["name"], (None, None))
+        if r:
+            standby.update(label=name, port=r["port"], mode=r.get("mode"), replica=replica_view(r))
+    for name, r in known.items():
+        if not any(s.get("label") == name for s in report["standbys"]):
+            report["standbys"].append({"name": None, "label": name, "port": r["port"], "mode": r.get("mode"),
+                                       "state": "disconnected", "replica": replica_view(r)})
+
+    return emit({
+        **benchmark_context(primary_port),
+        "group": (primary or {}).get("group"),
+        "primary": {"label": primary_label, "port": primary_port},
+        **report,
+        "slots": slots,
+    }, indent=2)
+
+
+def add_replicas(port: int, count: int = 1, mode: str = "streaming") -> str:
+    """Attach *count* replicas to the sandbox on *port*; JSON list of {label, port, mode, datadir}."""
+    hit = find_by_port(port)
+    if not hit:
+        return json.dumps({"error": f"No sandbox registered on port {port}"})
+    try:
+        added = replication.add_replicas(hit[0], count=count, mode=mode)
+    except (RuntimeError, ValueError) as exc:
+        return json.dumps({"error": str(exc)})
+    return json.dumps([{k: r[k] for k in ("label", "port", "mode", "datadir")} for r in added], indent=2)
+
+
+tool_spec = {
+    "type": "function",
+    "name": "replication_status",
+    "description": (
+        "Replication metrics for the group of the sandbox on `port`: WAL generation rate, "
+        "each standby's state, sent/flush/replay lag (bytes and seconds) and apply rate, "
+        "replication slots with retained WAL, and each replica's own view (replay delay, "
+        "subscription progress). Samples the primary twice, `sample_seconds` apart."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "port": {"type": "integer", "description": "Port of the primary or of any of its replicas."},
+            "sample_seconds": {
+                "type": "number",
+                "description": "Seconds between the two samples used for rates (default 2).",
+            },
+        },
+        "required": ["port"],
+        "additionalProperties": False,
+    },
+}
+
+add_tool_spec = {
+    "type": "function",
+    "name": "add_replicas",
+    "description": (
+        "Attach streaming (pg_basebackup) or logical (pg_createsubscriber) replicas to the sandbox "
+        "on `port`. Replicas reuse the sandbox's build, so each costs only a data-directory copy. "
+        "Returns their labels and ports."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "port": {"type": "integer"},
+            "count": {"type": "integer", "description": "Number of replicas to add (default 1)."},
+            "mode": {"type": "string", "enum": ["streaming", "logical"]},
+        },
+        "required": ["port"],
+        "additionalProperties": False,
+    },
+}
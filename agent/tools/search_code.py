@@ -10,12 +10,12 @@ search_code({"pattern": "enum  NodeTag", "path": "src/include/nodes/nodes.h"})
 
 from __future__ import annotations
 
-import json
 import re
 from pathlib import Path
 from typing import Optional, List, Dict
 
 from .. import context  # provides src_root()
+from .output import emit, hits_by_file
 
 # ────────────────────────── implementation ──────────────────────────
 def _scan_file(path: Path, rx: re.Pattern, hits: List[Dict], limit: int, root: Path):
@@ -48,6 +48,7 @@ def search_code(pattern: str, max_hits: int = 100, path: Optional[str] = None) -
     Returns
     -------
     JSON string  [{file, line, text}, ...]
+    (compact mode: hits grouped by file, see output.hits_by_file)
     """
     root = context.src_root()
     target = root / path if path else root
@@ -66,7 +67,7 @@ def search_code(pattern: str, max_hits: int = 100, path: Optional[str] = None) -
     except StopIteration:
         pass
 
-    return json.dumps(hits, indent=2)
+    return emit(hits, hits_by_file)
 
 
 # ─────────────────────────── tool spec ──────────────────────────────
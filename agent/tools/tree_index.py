@@ -0,0 +1,240 @@
+"""
+agent/tools/tree_index.py   •   cached metadata snapshot of a checkout
+
+`snapshot(root)` returns {relpath: entry} for every file of the checkout,
+where an entry is `[size, mtime_ns, lines, kind, clean]`:
+
+* lines – newline count of text files (None for binaries, build output and
+          files over LINE_COUNT_MAX)
+* kind  – "source", "generated" (git-ignored sources such as gram.c or
+          fmgroids.h, or a .c/.h next to a .y/.l of the same stem) or
+          "build" (objects, libraries, ignored executables)
+* clean – tracked and unmodified at the snapshot's HEAD
+
+The first call lists the checkout with `git ls-files` / `git status` (or
+walks it outside git) and counts lines once.  Later calls re-read only
+what `git status --ignored` and `git diff <old HEAD>` name, plus whatever
+was dirty last time, and recount a file only when its size or mtime moved.
+Snapshots are kept in memory (re-checked after REFRESH_TTL seconds) and in
+~/.pg_debugger_agent/tree_cache/ so a new session starts warm.
+
+The sandbox's own runtime directories (data/, install/, replica_N/) are
+not part of the checkout and are left out.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..fsutil import atomic_write_json
+from ..storage import BUILD_SUFFIXES
+
+SNAPSHOT_VERSION = 1
+REFRESH_TTL = 2.0
+LINE_COUNT_MAX = 16 * 1024 * 1024
+SKIP_TOP = ("data", "install", ".git")
+SKIP_TOP_PREFIXES = ("replica_",)
+GRAMMAR_SUFFIXES = (".y", ".l")
+
+Entry = List[Any]       # [size, mtime_ns, lines, kind, clean]
+SIZE, MTIME, LINES, KIND, CLEAN = range(5)
+
+_lock = threading.Lock()
+_memory: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _cache_dir() -> pathlib.Path:
+    return pathlib.Path.home() / ".pg_debugger_agent" / "tree_cache"
+
+
+def _cache_file(root: pathlib.Path) -> pathlib.Path:
+    return _cache_dir() / (hashlib.sha1(str(root).encode()).hexdigest()[:16] + ".json")
+
+
+def _skipped(rel: str) -> bool:
+    top = rel.split("/", 1)[0]
+    return top in SKIP_TOP or top.startswith(SKIP_TOP_PREFIXES)
+
+
+# ───────────────────────────── classifying ──────────────────────────
+def count_lines(path: pathlib.Path, size: int) -> Optional[int]:
+    if size > LINE_COUNT_MAX:
+        return None
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if b"\0" in data[:8192]:
+        return None
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+def classify(root: pathlib.Path, rel: str, st: os.stat_result, ignored: Optional[bool]) -> str:
+    """"build", "generated" or "source"; *ignored* is None outside git."""
+    name = rel.rsplit("/", 1)[-1]
+    stem, suffix = os.path.splitext(name)
+    if suffix in BUILD_SUFFIXES:
+        return "build"
+    if ignored and not suffix and st.st_mode & 0o111:
+        return "build"          # linked executables (postgres, psql, …)
+    if ignored:
+        return "generated"
+    if suffix in (".c", ".h"):
+        parent = (root / rel).parent
+        if any((parent / (stem + g)).exists() for g in GRAMMAR_SUFFIXES):
+            return "generated"
+    return "source"
+
+
+def _entry(root: pathlib.Path, rel: str, old: Optional[Entry], ignored: Optional[bool],
+           clean: bool) -> Optional[Entry]:
+    """Fresh entry for *rel*, reusing *old*'s line count when unchanged; None if gone."""
+    path = root / rel
+    try:
+        st = path.lstat()
+    except OSError:
+        return None
+    if not path.is_file() or path.is_symlink():
+        return None
+    kind = classify(root, rel, st, ignored)
+    if old and old[SIZE] == st.st_size and old[MTIME] == st.st_mtime_ns and old[KIND] == kind:
+        return [st.st_size, st.st_mtime_ns, old[LINES], kind, clean]
+    lines = None if kind == "build" else count_lines(path, st.st_size)
+    return [st.st_size, st.st_mtime_ns, lines, kind, clean]
+
+
+# ───────────────────────────── git ──────────────────────────────────
+def _git(root: pathlib.Path, *args: str) -> Optional[str]:
+    try:
+        proc = subprocess.run(["git", "-C", str(root), *args], capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def _pathspec() -> List[str]:
+    return ["--", ".", *(f":(exclude){d}" for d in SKIP_TOP if d != ".git"),
+            *(f":(exclude,glob){p}*" for p in SKIP_TOP_PREFIXES)]
+
+
+def _status(root: pathlib.Path) -> Optional[Dict[str, str]]:
+    """{path: XY status code} of everything not clean ("!!" ignored, "??" untracked)."""
+    out = _git(root, "status", "--porcelain=v1", "-z", "--ignored", "-uall", "--no-renames", *_pathspec())
+    if out is None:
+        return None
+    return {rec[3:]: rec[:2] for rec in out.split("\0") if len(rec) > 3}
+
+
+def _ls_files(root: pathlib.Path) -> List[str]:
+    return [p for p in (_git(root, "ls-files", "-z") or "").split("\0") if p and not _skipped(p)]
+
+
+def _head(root: pathlib.Path) -> Optional[str]:
+    out = _git(root, "rev-parse", "HEAD")
+    return out.strip() if out else None
+
+
+# ───────────────────────────── building ─────────────────────────────
+def _walk(root: pathlib.Path, files: Dict[str, Entry]) -> Dict[str, Entry]:
+    """Outside git: stat everything, recounting only what changed."""
+    fresh: Dict[str, Entry] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        if rel_dir == ".":
+            dirnames[:] = [d for d in dirnames if not _skipped(d)]
+        for name in filenames:
+            rel = name if rel_dir == "." else f"{rel_dir}/{name}".replace(os.sep, "/")
+            entry = _entry(root, rel, files.get(rel), None, False)
+            if entry:
+                fresh[rel] = entry
+    return fresh
+
+
+def _update(root: pathlib.Path, snap: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    head = _head(root)
+    status = _status(root) if head else None
+    if status is None:
+        files = _walk(root, snap["files"] if snap else {})
+        return {"version": SNAPSHOT_VERSION, "root": str(root), "head": None, "files": files}
+
+    files: Dict[str, Entry] = dict(snap["files"]) if snap else {}
+    if snap is None or snap.get("head") is None:
+        check: Set[str] = set(_ls_files(root))
+    else:
+        check = {rel for rel, e in files.items() if not e[CLEAN]}
+        if snap["head"] != head:
+            diff = _git(root, "diff", "--name-only", "-z", "--no-renames", snap["head"], head)
+            if diff is None:        # old HEAD gone (e.g. re-cloned): start over
+                return _update(root, None)
+            check |= {p for p in diff.split("\0") if p}
+    check |= {p for p in status if not _skipped(p)}
+
+    for rel in check:
+        code = status.get(rel)
+        entry = _entry(root, rel, files.get(rel), code == "!!", code is None)
+        if entry:
+            files[rel] = entry
+        else:
+            files.pop(rel, None)
+    return {"version": SNAPSHOT_VERSION, "root": str(root), "head": head, "files": files}
+
+
+def _load(root: pathlib.Path) -> Optional[Dict[str, Any]]:
+    try:
+        snap = json.loads(_cache_file(root).read_text())
+    except (OSError, ValueError):
+        return None
+    return snap if snap.get("version") == SNAPSHOT_VERSION and snap.get("root") == str(root) else None
+
+
+def _save(root: pathlib.Path, snap: Dict[str, Any]) -> None:
+    """Persist *snap*; the disk copy is only a warm start, so failures are logged, not raised."""
+    try:
+        atomic_write_json(_cache_file(root), snap, separators=(",", ":"))
+    except OSError as exc:
+        logging.warning("tree snapshot for %s not saved: %s", root, exc)
+
+
+def snapshot(root: pathlib.Path, max_age: float = REFRESH_TTL) -> Dict[str, Entry]:
+    """{relpath: entry} for *root*, refreshed if older than *max_age* seconds."""
+    root = pathlib.Path(root).resolve()
+    key = str(root)
+    with _lock:
+        hit = _memory.get(key)
+        if hit and time.monotonic() - hit[0] < max_age:
+            return hit[1]["files"]
+        old = hit[1] if hit else _load(root)
+        snap = _update(root, old)
+        if old is None or snap["head"] != old.get("head") or snap["files"] != old["files"]:
+            _save(root, snap)
+        _memory[key] = (time.monotonic(), snap)
+        return snap["files"]
+
+
+def invalidate(root: Optional[pathlib.Path] = None) -> None:
+    """Force the next `snapshot` of *root* (or of every root) to re-check."""
+    with _lock:
+        if root is None:
+            for key, (_, snap) in _memory.items():
+                _memory[key] = (float("-inf"), snap)
+        else:
+            key = str(pathlib.Path(root).resolve())
+            if key in _memory:
+                _memory[key] = (float("-inf"), _memory[key][1])
+
+
+def files_under(files: Dict[str, Entry], prefix: str) -> Iterable[Tuple[str, Entry]]:
+    """(path relative to *prefix*, entry) for files below directory *prefix*."""
+    prefix = prefix.strip("/")
+    if prefix in ("", "."):
+        return files.items()
+    lead = prefix + "/"
+    return ((rel[len(lead):], e) for rel, e in files.items() if rel.startswith(lead))
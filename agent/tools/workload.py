@@ -0,0 +1,312 @@
+"""
+agent/tools/workload.py   •   replay scripted multi-client SQL workloads
+
+A scenario (JSON) describes setup SQL, groups of clients and how long to
+run them:
+
+    {
+      "name": "hot-row-updates",
+      "setup": ["CREATE TABLE IF NOT EXISTS acct (id int primary key, bal int)", …],
+      "teardown": [],
+      "duration": 10,
+      "clients": [
+        {"name": "writer", "count": 8, "think_time_ms": 2,
+         "script": ["BEGIN",
+                    "UPDATE acct SET bal = bal + 1 WHERE id = {rand:1:10}",
+                    "COMMIT"]}
+      ]
+    }
+
+Every client owns one connection (all opened up front, concurrently) and
+loops over its script until the duration is over.  `{client}`,
+`{iteration}` and `{rand:A:B}` are substituted per execution.  A failing
+statement rolls the client back to the start of its script.
+
+The result holds per-statement latency percentiles and histograms, error
+counts by SQLSTATE (deadlocks and serialization failures called out),
+and completed statements per second.  Scenarios can be saved by name in
+~/.pg_debugger_agent/scenarios/ and replayed after every patch.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import pathlib
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from ..profiles import benchmark_context
+
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+DEADLOCK, SERIALIZATION = "40P01", "40001"
+
+
+def _scenarios_dir() -> pathlib.Path:
+    return pathlib.Path.home() / ".pg_debugger_agent" / "scenarios"
+
+
+# ───────────────────────────── scenarios ────────────────────────────
+def validate(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill defaults and reject malformed scenarios (ValueError)."""
+    if not scenario.get("clients"):
+        raise ValueError("scenario needs at least one client group")
+    out = {
+        "name": scenario.get("name", "unnamed"),
+        "database": scenario.get("database", "postgres"),
+        "setup": list(scenario.get("setup", [])),
+        "teardown": list(scenario.get("teardown", [])),
+        "duration": float(scenario.get("duration", 10)),
+        "clients": [],
+    }
+    for i, group in enumerate(scenario["clients"]):
+        if not group.get("script"):
+            raise ValueError(f"client group {i} has no script")
+        out["clients"].append({
+            "name": group.get("name", f"group{i}"),
+            "count": int(group.get("count", 1)),
+            "script": list(group["script"]),
+            "think_time_ms": float(group.get("think_time_ms", 0)),
+        })
+    return out
+
+
+def save_scenario(scenario: Dict[str, Any]) -> pathlib.Path:
+    scenario = validate(scenario)
+    if not re.fullmatch(r"[\w.-]+", scenario["name"]):
+        raise ValueError(f"scenario name '{scenario['name']}' is not a valid file name")
+    path = _scenarios_dir() / f"{scenario['name']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(scenario, indent=2))
+    return path
+
+
+def load_scenario(name_or_path: str) -> Dict[str, Any]:
+    """A saved scenario by name, or a scenario file by path."""
+    path = pathlib.Path(name_or_path)
+    if not path.exists():
+        path = _scenarios_dir() / f"{name_or_path}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"No scenario file or saved scenario '{name_or_path}'")
+    return validate(json.loads(path.read_text()))
+
+
+def list_scenarios() -> List[str]:
+    return sorted(p.stem for p in _scenarios_dir().glob("*.json"))
+
+
+_PLACEHOLDER = re.compile(r"\{(client|iteration|rand:(-?\d+):(-?\d+))\}")
+
+
+def render_sql(sql: str, client: int, iteration: int, rng: random.Random) -> str:
+    def sub(m):
+        if m.group(1) == "client":
+            return str(client)
+        if m.group(1) == "iteration":
+            return str(iteration)
+        return str(rng.randint(int(m.group(2)), int(m.group(3))))
+
+    return _PLACEHOLDER.sub(sub, sql)
+
+
+# ───────────────────────────── statistics ───────────────────────────
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, Any]:
+    vals = sorted(latencies_ms)
+    hist: Counter = Counter()
+    for v in vals:
+        bound = next((b for b in BUCKETS_MS if v <= b), None)
+        hist[f"<={bound}ms" if bound is not None else f">{BUCKETS_MS[-1]}ms"] += 1
+    return {
+        "count": len(vals),
+        "mean_ms": round(sum(vals) / len(vals), 3) if vals else 0.0,
+        "p50_ms": round(_percentile(vals, 50), 3),
+        "p95_ms": round(_percentile(vals, 95), 3),
+        "p99_ms": round(_percentile(vals, 99), 3),
+        "max_ms": round(vals[-1], 3) if vals else 0.0,
+        "histogram": dict(hist),
+    }
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.per_second: Counter = Counter()
+        self.scripts_done = 0
+        self.start = time.monotonic()
+
+    def ok(self, key: str, ms: float) -> None:
+        self.latencies[key].append(ms)
+        self.per_second[int(time.monotonic() - self.start)] += 1
+
+    def error(self, key: str, sqlstate: str) -> None:
+        self.errors[key][sqlstate] += 1
+
+
+# ───────────────────────────── running ──────────────────────────────
+Connect = Callable[[], Awaitable[Any]]
+
+
+async def _client_loop(conn, group, client_id: int, deadline: float, rec: _Recorder, seed: int) -> None:
+    rng = random.Random(seed)
+    iteration = 0
+    while time.monotonic() < deadline:
+        for idx, sql in enumerate(group["script"]):
+            key = f"{group['name']}[{idx}] {sql[:60]}"
+            start = time.perf_counter()
+            try:
+                await conn.execute(render_sql(sql, client_id, iteration, rng))
+            except Exception as exc:
+                rec.error(key, getattr(exc, "sqlstate", None) or exc.__class__.__name__)
+                try:
+                    await conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+                break
+            rec.ok(key, (time.perf_counter() - start) * 1000.0)
+            if group["think_time_ms"]:
+                await asyncio.sleep(group["think_time_ms"] / 1000.0)
+        else:
+            rec.scripts_done += 1
+        iteration += 1
+
+
+async def _run(scenario: Dict[str, Any], connect: Connect) -> Dict[str, Any]:
+    admin = await connect()
+    try:
+        for sql in scenario["setup"]:
+            await admin.execute(sql)
+
+        slots = [(g, i) for g in scenario["clients"] for i in range(g["count"])]
+        conns = await asyncio.gather(*(connect() for _ in slots))
+        rec = _Recorder()
+        deadline = rec.start + scenario["duration"]
+        try:
+            await asyncio.gather(*(
+                _client_loop(conn, group, n, deadline, rec, seed=n)
+                for n, (conn, (group, _)) in enumerate(zip(conns, slots))
+            ))
+        finally:
+            await asyncio.gather(*(c.close() for c in conns), return_exceptions=True)
+        elapsed = time.monotonic() - rec.start
+
+        for sql in scenario["teardown"]:
+            await admin.execute(sql)
+    finally:
+        await admin.close()
+
+    all_errors: Counter = Counter()
+    for counts in rec.errors.values():
+        all_errors.update(counts)
+    statements = {
+        key: {**summarize_latencies(rec.latencies.get(key, [])), "errors": dict(rec.errors.get(key, {}))}
+        for key in sorted(set(rec.latencies) | set(rec.errors))
+    }
+    total = sum(len(v) for v in rec.latencies.values())
+    seconds = int(elapsed) + 1
+    return {
+        "scenario": scenario["name"],
+        "clients": len(slots),
+        "elapsed": round(elapsed, 3),
+        "statements_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "scripts_completed": rec.scripts_done,
+        "deadlocks": all_errors.get(DEADLOCK, 0),
+        "serialization_failures": all_errors.get(SERIALIZATION, 0),
+        "errors": dict(all_errors),
+        "throughput": [rec.per_second.get(s, 0) for s in range(seconds)],
+        "statements": statements,
+    }
+
+
+def run_scenario(scenario: Dict[str, Any], port: int) -> Dict[str, Any]:
+    import psycopg
+
+    scenario = validate(scenario)
+    dsn = f"host=localhost port={port} dbname={scenario['database']} user=postgres"
+
+    async def connect():
+        return await psycopg.AsyncConnection.connect(dsn, autocommit=True)
+
+    result = asyncio.run(_run(scenario, connect))
+    return {**benchmark_context(port), **result}
+
+
+# ────────────────────────── public API ──────────────────────────────
+def run_workload(
+    port: int,
+    scenario: Optional[Union[str, Dict[str, Any]]] = None,
+    name: Optional[str] = None,
+    duration: Optional[float] = None,
+    save: bool = False,
+) -> str:
+    """
+    Run a scenario against the sandbox on *port*.
+
+    Parameters
+    ----------
+    scenario : scenario JSON (string or dict); omit to replay saved *name*
+    name     : saved scenario to replay (or the name to save *scenario* under)
+    duration : override the scenario's duration in seconds
+    save     : store *scenario* for later replays
+
+    Returns
+    -------
+    JSON string with per-statement latency stats, error/deadlock counts and
+    per-second throughput.
+    """
+    if scenario is None:
+        if not name:
+            raise ValueError(f"Give a scenario or the name of a saved one: {list_scenarios()}")
+        data = load_scenario(name)
+    else:
+        data = json.loads(scenario) if isinstance(scenario, str) else dict(scenario)
+        if name:
+            data["name"] = name
+        data = validate(data)
+        if save:
+            save_scenario(data)
+    if duration:
+        data["duration"] = float(duration)
+    return json.dumps(run_scenario(data, port), indent=2)
+
+
+# ─────────────────────────── tool spec ──────────────────────────────
+tool_spec = {
+    "type": "function",
+    "name": "run_workload",
+    "description": (
+        "Run a multi-client SQL workload scenario (setup SQL, client groups with scripts, "
+        "counts, think times, duration) against a sandbox and return per-statement latency "
+        "percentiles/histograms, error and deadlock counts, and throughput per second. "
+        "Scenarios can be saved by name and replayed after each patch."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "port": {"type": "integer"},
+            "scenario": {
+                "type": "string",
+                "description": (
+                    "Scenario JSON: {name, setup: [sql], teardown: [sql], duration, "
+                    "clients: [{name, count, script: [sql], think_time_ms}]}. SQL may use "
+                    "{client}, {iteration} and {rand:A:B}. Omit to replay a saved scenario."
+                ),
+            },
+            "name": {"type": "string", "description": "Saved scenario to replay, or name to save under."},
+            "duration": {"type": "number", "description": "Override the duration in seconds."},
+            "save": {"type": "boolean", "description": "Save the scenario for later replays."},
+        },
+        "required": ["port"],
+        "additionalProperties": False,
+    },
+}
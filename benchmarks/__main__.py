@@ -0,0 +1,74 @@
+"""
+python -m benchmarks   •   standalone tool-layer benchmark run
+
+    python -m benchmarks                     # run, compare with the saved baseline
+    python -m benchmarks --save-baseline     # run and store as the new baseline
+    python -m benchmarks --only search_code --repeat 20 --scale 0.25
+
+Exits with status 1 when a case regressed beyond --threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+
+from . import harness
+from .synthetic_tree import cached_tree, tree_stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--scale", type=float, default=1.0, help="synthetic tree size (1.0 ≈ PostgreSQL src/)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=10, help="timed runs per case")
+    ap.add_argument("--only", help="run only cases whose name contains this")
+    ap.add_argument("--baseline", type=pathlib.Path, default=None,
+                    help="baseline file (default ~/.pg_debugger_agent/bench/baseline.json)")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown/growth (0.2 = 20%%)")
+    ap.add_argument("--json", type=pathlib.Path, help="also write the results here")
+    args = ap.parse_args(argv)
+
+    root = cached_tree(args.scale, args.seed)
+    stats = tree_stats(root)
+    print(f"tree: {root} ({stats['files']} files, {stats['lines']:,} lines, {stats['bytes'] / 1e6:.1f} MB)")
+
+    with tempfile.TemporaryDirectory(prefix="pgdbg_bench_") as tmp:
+        results = harness.run_suite(root, pathlib.Path(tmp), repeat=args.repeat, only=args.only)
+
+    print(f"{'case':32} {'median ms':>10} {'p95 ms':>10} {'ops/s':>10} {'MB/s':>8} {'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:32} {r['median_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['ops_per_s'] or 0:>10.1f} "
+              f"{r.get('mb_per_s') or '':>8} {r['peak_kib']:>10.1f}")
+
+    meta = {"scale": args.scale, "seed": args.seed, "repeat": args.repeat}
+    if args.json:
+        args.json.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+
+    path = args.baseline or harness.default_baseline_path()
+    if args.save_baseline:
+        harness.save_baseline(path, results, meta)
+        print(f"baseline saved to {path}")
+        return 0
+    if not path.exists():
+        print(f"no baseline at {path}; run with --save-baseline first")
+        return 0
+
+    baseline = harness.load_baseline(path)
+    if {k: baseline["meta"].get(k) for k in ("scale", "seed")} != {"scale": args.scale, "seed": args.seed}:
+        print(f"baseline was taken with {baseline['meta']}; results are not comparable")
+        return 0
+    regressions = harness.compare(results, baseline["results"], args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r['case']}: {r['metric']} {r['baseline']} → {r['current']} (+{r['change_pct']}%)")
+    if not regressions:
+        print(f"no regressions beyond {args.threshold:.0%} against {path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
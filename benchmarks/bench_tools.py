@@ -0,0 +1,50 @@
+"""
+pytest-benchmark entry point for the tool-layer cases in harness.py.
+
+    pytest benchmarks/bench_tools.py --benchmark-autosave
+    pytest benchmarks/bench_tools.py --benchmark-compare --benchmark-compare-fail=median:20%
+
+Not collected by the unit-test run (file name); set PG_DEBUGGER_BENCH_SCALE
+to shrink the synthetic tree.  Peak memory is recorded in extra_info.
+"""
+
+import os
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks import harness
+from benchmarks.synthetic_tree import cached_tree
+
+SCALE = float(os.environ.get("PG_DEBUGGER_BENCH_SCALE", "1.0"))
+CASE_NAMES = [
+    "search_code.common", "search_code.full_scan", "search_code.subtree",
+    "lookup_code_reference", "lookup_code_reference.path", "find_definition",
+    "list_dir.src_include_utils", "list_dir.root", "list_dir.tree_src_backend", "read_file.largest",
+    "registry.read", "registry.write", "registry.read.sqlite", "registry.write.sqlite",
+    "conversation.serialize",
+]
+
+
+@pytest.fixture(scope="session")
+def bench_cases(tmp_path_factory):
+    root = cached_tree(SCALE)
+    with harness.fake_sandbox(root, tmp_path_factory.mktemp("bench")):
+        yield harness.cases(root)
+
+
+@pytest.mark.parametrize("name", CASE_NAMES)
+def test_tool(benchmark, bench_cases, name):
+    case = bench_cases[name]
+    with harness._env(case.env):
+        benchmark(case.fn)
+        tracemalloc.start()
+        try:
+            case.fn()
+            benchmark.extra_info["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+    if case.nbytes:
+        benchmark.extra_info["nbytes"] = case.nbytes
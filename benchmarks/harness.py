@@ -0,0 +1,225 @@
+"""
+benchmarks/harness.py   •   tool-layer benchmark cases, measurement, baselines
+
+`fake_sandbox(root, workdir)` points the registry at *workdir*, registers
+the synthetic tree as sandbox "bench" (plus filler entries, so registry
+operations see a realistic fleet) and activates it with
+`context.session`, the way `tests/conftest.py` isolates the registry.
+Conversation logs go to *workdir* as well.
+
+`cases(root)` returns the benchmark cases: the file tools as the model
+calls them (through the tool manifest), registry reads/writes on both
+backends, and conversation serialization.  `measure` times a case
+(median/p95 latency, throughput) and takes its peak Python allocation
+with tracemalloc in a separate run; `compare` flags cases that got slower
+or hungrier than a saved baseline by more than a threshold.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import itertools
+import json
+import os
+import pathlib
+import platform
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from agent import context, registry, tools
+
+from .synthetic_tree import KNOWN_SYMBOLS, NEEDLE, tree_stats
+
+LABEL = "bench"
+FILLER_INSTANCES = 50
+# ignore changes smaller than this, whatever the percentage
+NOISE_FLOOR = {"median_ms": 0.05, "peak_kib": 64}
+
+
+@dataclasses.dataclass
+class Case:
+    name: str
+    fn: Callable[[], Any]
+    nbytes: int = 0                         # bytes processed per call, for MB/s
+    env: Dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+# ───────────────────────────── fake sandbox ─────────────────────────
+@contextlib.contextmanager
+def _env(values: Dict[str, str]) -> Iterator[None]:
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+@contextlib.contextmanager
+def fake_sandbox(root: pathlib.Path, workdir: pathlib.Path) -> Iterator[str]:
+    """Registry under *workdir* with sandbox "bench" at *root*, active for the block."""
+    from agent import llm_agent
+
+    workdir.mkdir(parents=True, exist_ok=True)
+    saved = registry.REG_PATH, llm_agent.LOG_DIR, llm_agent.LOG_FILE
+    registry.REG_PATH = workdir / "registry.json"
+    llm_agent.LOG_DIR, llm_agent.LOG_FILE = workdir, workdir / "conversation.log"
+    try:
+        for backend in ("sqlite", "json"):
+            with _env({registry.BACKEND_ENV: backend}):
+                for i in range(FILLER_INSTANCES):
+                    registry.add_instance(f"filler-{i}", 50000 + i, workdir / f"pgdbg_filler{i}",
+                                          profile="default")
+                registry.add_instance(LABEL, 59999, root, profile="default")
+        # registry.db now exists; keep the default cases on the JSON backend
+        with _env({registry.BACKEND_ENV: "json"}), context.session(LABEL):
+            yield LABEL
+    finally:
+        registry.REG_PATH, llm_agent.LOG_DIR, llm_agent.LOG_FILE = saved
+
+
+# ───────────────────────────── cases ────────────────────────────────
+def _conversation(turns: int = 60, tool_output_bytes: int = 8000) -> List[Dict[str, Any]]:
+    body = ("static void\nExecFoo(void)\n{\n\treturn;\n}\n" * (tool_output_bytes // 40))[:tool_output_bytes]
+    convo: List[Dict[str, Any]] = [{"role": "user", "content": "why is autovacuum so busy?"}]
+    for i in range(turns):
+        convo.append({"role": "assistant", "content": f"Step {i}: reading the vacuum code."})
+        convo.append({"role": "assistant", "content": f"[tool read_file] {body}"})
+    return convo
+
+
+_churn = itertools.count()
+
+
+def _registry_write() -> None:
+    n = next(_churn)
+    name = f"churn-{n}"
+    registry.add_instance(name, 40000 + n % 1000, f"/tmp/pgdbg_churn{n}")
+    registry.update_instance(name, profile="benchmark")
+    registry.remove_instance(name)
+
+
+def _registry_read() -> None:
+    registry.list_instances()
+    registry.get_instance(LABEL)
+    registry.find_by_port(59999)
+
+
+def cases(root: pathlib.Path) -> Dict[str, Case]:
+    from agent import llm_agent
+    from agent.tools.code_lookup import find_definition
+
+    impl = {name: tools.load(name)["impl"] for name in
+            ("search_code", "lookup_code_reference", "list_dir", "read_file")}
+    src_bytes = tree_stats(root)["bytes"]
+    largest = max((p for p in (root / "src").rglob("*.c")), key=lambda p: p.stat().st_size)
+    largest_rel = str(largest.relative_to(root))
+    symbol, (def_file, _) = next(iter(KNOWN_SYMBOLS.items()))
+    access = root / "src/backend/access"
+    access_bytes = sum(p.stat().st_size for p in access.rglob("*.[chy]"))
+    convo = _conversation()
+
+    found = [
+        Case("search_code.common", lambda: impl["search_code"](r"\belog\(ERROR")),
+        Case("search_code.full_scan", lambda: impl["search_code"](NEEDLE), nbytes=src_bytes),
+        Case("search_code.subtree", lambda: impl["search_code"](NEEDLE, path="src/backend/access"),
+             nbytes=access_bytes),
+        Case("lookup_code_reference", lambda: impl["lookup_code_reference"](symbol)),
+        Case("lookup_code_reference.path", lambda: impl["lookup_code_reference"](
+            symbol, path=def_file.rsplit("/", 1)[0])),
+        Case("find_definition", lambda: find_definition("ExecInitNode", root)),
+        Case("list_dir.src_include_utils", lambda: impl["list_dir"]("src/include/utils")),
+        Case("list_dir.root", lambda: impl["list_dir"](".")),
+        Case("list_dir.tree_src_backend", lambda: impl["list_dir"]("src/backend", depth=3, hide_build=True)),
+        Case("read_file.largest", lambda: impl["read_file"](largest_rel), nbytes=largest.stat().st_size),
+        Case("registry.read", _registry_read),
+        Case("registry.write", _registry_write),
+        Case("registry.read.sqlite", _registry_read, env={registry.BACKEND_ENV: "sqlite"}),
+        Case("registry.write.sqlite", _registry_write, env={registry.BACKEND_ENV: "sqlite"}),
+        Case("conversation.serialize", lambda: llm_agent._log_conversation("prompt", 60, convo),
+             nbytes=len(json.dumps(convo))),
+    ]
+    return {c.name: c for c in found}
+
+
+# ───────────────────────────── measuring ────────────────────────────
+def measure(case: Case, repeat: int = 10, warmup: int = 1) -> Dict[str, Any]:
+    """{runs, median_ms, p95_ms, min_ms, ops_per_s, mb_per_s, peak_kib}."""
+    with _env(case.env):
+        for _ in range(warmup):
+            case.fn()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case.fn()
+            times.append((time.perf_counter() - start) * 1000.0)
+
+        tracemalloc.start()
+        try:
+            case.fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    times.sort()
+    median = statistics.median(times)
+    result = {
+        "runs": repeat,
+        "median_ms": round(median, 3),
+        "p95_ms": round(times[min(len(times) - 1, int(0.95 * len(times)))], 3),
+        "min_ms": round(times[0], 3),
+        "ops_per_s": round(1000.0 / median, 1) if median else None,
+        "peak_kib": round(peak / 1024, 1),
+    }
+    if case.nbytes:
+        result["mb_per_s"] = round(case.nbytes / 1e6 / (median / 1000.0), 1) if median else None
+    return result
+
+
+def run_suite(root: pathlib.Path, workdir: pathlib.Path, repeat: int = 10,
+              only: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    with fake_sandbox(root, workdir):
+        selected = [c for name, c in cases(root).items() if not only or only in name]
+        return {c.name: measure(c, repeat=repeat) for c in selected}
+
+
+# ───────────────────────────── baselines ────────────────────────────
+def default_baseline_path() -> pathlib.Path:
+    return pathlib.Path.home() / ".pg_debugger_agent" / "bench" / "baseline.json"
+
+
+def save_baseline(path: pathlib.Path, results: Dict[str, Dict[str, Any]], meta: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {**meta, "python": platform.python_version(), "machine": platform.node(), "saved": time.time()}
+    path.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+
+
+def load_baseline(path: pathlib.Path) -> Dict[str, Any]:
+    return json.loads(path.read_text())
+
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """Cases whose median latency or peak memory grew by more than *threshold*."""
+    regressions = []
+    for name, now in sorted(current.items()):
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append({
+                    "case": name, "metric": metric, "baseline": old, "current": new,
+                    "change_pct": round(100.0 * (new - old) / old, 1),
+                })
+    return regressions
@@ -0,0 +1,303 @@
+"""
+benchmarks/synthetic_tree.py   •   deterministic PostgreSQL-sized C tree
+
+`generate(dest, scale=1.0, seed=0)` writes a fake checkout whose shape
+follows PostgreSQL's `src/`: the same top-level directories, ~1,200 .c
+files with PostgreSQL-style function definitions (return type on its own
+line), ~900 headers under src/include, a large `gram.y`, and a Makefile /
+meson.build per directory.  At scale 1.0 it is roughly a million lines,
+close to the real thing; *scale* shrinks or grows the file counts and the
+grammar.  The same (scale, seed) always produces byte-identical files.
+
+A few symbols are planted at known places so benchmarks can look them up
+(`KNOWN_SYMBOLS`), and `NEEDLE` occurs exactly once, in `NEEDLE_FILE`, to
+force full-tree scans.
+
+`cached_tree(scale, seed)` generates once into
+~/.pg_debugger_agent/bench/ and reuses the result.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import random
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+GENERATOR_VERSION = 1
+
+# directory → number of .c files at scale 1.0
+C_LAYOUT: Dict[str, int] = {
+    "src/backend/access/brin": 8, "src/backend/access/common": 15, "src/backend/access/gin": 15,
+    "src/backend/access/gist": 12, "src/backend/access/hash": 10, "src/backend/access/heap": 12,
+    "src/backend/access/nbtree": 12, "src/backend/access/spgist": 10, "src/backend/access/transam": 20,
+    "src/backend/catalog": 40, "src/backend/commands": 45, "src/backend/executor": 60,
+    "src/backend/nodes": 15, "src/backend/optimizer/path": 10, "src/backend/optimizer/plan": 8,
+    "src/backend/optimizer/prep": 6, "src/backend/optimizer/util": 12, "src/backend/parser": 25,
+    "src/backend/postmaster": 15, "src/backend/replication": 20, "src/backend/replication/logical": 20,
+    "src/backend/storage/buffer": 6, "src/backend/storage/file": 6, "src/backend/storage/ipc": 15,
+    "src/backend/storage/lmgr": 12, "src/backend/storage/smgr": 4, "src/backend/tcop": 8,
+    "src/backend/utils/adt": 120, "src/backend/utils/cache": 20, "src/backend/utils/error": 5,
+    "src/backend/utils/fmgr": 4, "src/backend/utils/misc": 25, "src/backend/utils/mmgr": 12,
+    "src/bin/initdb": 3, "src/bin/pg_basebackup": 12, "src/bin/pg_dump": 20, "src/bin/pgbench": 5,
+    "src/bin/psql": 30, "src/common": 60, "src/fe_utils": 20, "src/interfaces/ecpg/ecpglib": 15,
+    "src/interfaces/ecpg/preproc": 30, "src/interfaces/libpq": 40, "src/pl/plperl": 6,
+    "src/pl/plpgsql/src": 8, "src/pl/plpython": 20, "src/port": 60, "src/test/isolation": 6,
+    "src/test/modules/test_misc": 40, "src/test/regress": 4, "src/timezone": 6,
+    "src/backend/jit/llvm": 8, "src/backend/statistics": 8, "src/backend/rewrite": 8,
+    "src/backend/partitioning": 4, "src/backend/libpq": 15, "src/backend/lib": 15,
+    "src/backend/snowball/libstemmer": 60, "src/backend/tsearch": 20, "src/backend/regex": 10,
+    "src/backend/main": 1, "src/backend/bootstrap": 2, "src/backend/foreign": 1,
+    "src/backend/backup": 15, "src/backend/archive": 2,
+}
+
+# directory → number of headers at scale 1.0
+H_LAYOUT: Dict[str, int] = {
+    "src/include": 40, "src/include/access": 110, "src/include/catalog": 120,
+    "src/include/commands": 50, "src/include/common": 50, "src/include/executor": 60,
+    "src/include/lib": 25, "src/include/libpq": 20, "src/include/mb": 3, "src/include/nodes": 30,
+    "src/include/optimizer": 20, "src/include/parser": 25, "src/include/port": 30,
+    "src/include/postmaster": 20, "src/include/replication": 40, "src/include/storage": 60,
+    "src/include/tcop": 12, "src/include/utils": 150, "src/include/fe_utils": 20,
+    "src/interfaces/libpq": 10, "src/bin/psql": 20, "src/bin/pg_dump": 10,
+}
+
+C_LINES = (80, 900, 9000)          # min, typical, max lines per .c file
+H_LINES = (25, 130, 1500)
+GRAM_Y_LINES = 19000
+
+# symbol → (file that defines it, header that declares it)
+KNOWN_SYMBOLS: Dict[str, tuple] = {
+    "heap_insert": ("src/backend/access/heap/heapam.c", "src/include/access/heapam.h"),
+    "ExecInitNode": ("src/backend/executor/execProcnode.c", "src/include/executor/executor.h"),
+    "LWLockAcquire": ("src/backend/storage/lmgr/lwlock.c", "src/include/storage/lwlock.h"),
+    "palloc": ("src/backend/utils/mmgr/mcxt.c", "src/include/utils/palloc.h"),
+    "standard_planner": ("src/backend/optimizer/plan/planner.c", "src/include/optimizer/planner.h"),
+}
+NEEDLE = "pgdbg_bench_needle_7f3a"
+NEEDLE_FILE = "src/backend/utils/adt/zz_needle.c"
+
+_VERBS = ["Init", "End", "ReScan", "Get", "Set", "Build", "Check", "Create", "Drop", "Find",
+          "Lookup", "Scan", "Update", "Insert", "Delete", "Process", "Compute", "Make", "Free",
+          "Copy", "Read", "Write", "Flush", "Reset", "Mark", "Release", "Acquire", "Open", "Close"]
+_NOUNS = ["Tuple", "Buffer", "Relation", "Index", "Node", "Plan", "Path", "State", "Slot",
+          "Snapshot", "Page", "Lock", "Entry", "Cache", "Context", "Expr", "Var", "Query",
+          "Target", "Key", "Datum", "Attr", "Xact", "Segment", "Record", "Stats", "Hash", "Range"]
+_TYPES = ["void", "bool", "int", "Datum", "Oid", "Size", "Node *", "List *", "Relation",
+          "TupleTableSlot *", "HeapTuple", "Buffer", "uint32", "char *", "PlanState *"]
+_INCLUDE_DIRS = ["access", "catalog", "executor", "nodes", "storage", "utils"]
+_WORDS = ["tuple", "buffer", "relation", "snapshot", "lock", "index", "page", "transaction",
+          "catalog", "plan", "expression", "segment", "checkpoint", "datum", "attribute"]
+
+
+def _lines(rng: random.Random, bounds) -> int:
+    lo, typical, hi = bounds
+    return int(min(hi, max(lo, rng.lognormvariate(0, 0.8) * typical * 0.75)))
+
+
+def _prefix(directory: str) -> str:
+    base = directory.rstrip("/").rsplit("/", 1)[-1]
+    return "".join(p.capitalize() for p in base.replace("-", "_").split("_"))
+
+
+def _name(rng: random.Random, prefix: str) -> str:
+    if rng.random() < 0.4:
+        return f"{prefix.lower()}_{rng.choice(_VERBS).lower()}_{rng.choice(_NOUNS).lower()}"
+    return f"{prefix}{rng.choice(_VERBS)}{rng.choice(_NOUNS)}"
+
+
+def _function(rng: random.Random, name: str, callees: List[str], static: bool) -> List[str]:
+    rettype = rng.choice(_TYPES)
+    word = rng.choice(_WORDS)
+    params = ", ".join(f"{rng.choice(_TYPES[1:])} {w}" for w in rng.sample(_WORDS, rng.randint(0, 3))) or "void"
+    out = [
+        "/*",
+        f" * {name}",
+        f" *\t\tHandle the {word} for the current {rng.choice(_WORDS)}.",
+        " */",
+        f"{'static ' if static else ''}{rettype}",
+        f"{name}({params})",
+        "{",
+        "\tint\t\t\ti;",
+        f"\t{rng.choice(_TYPES[1:])} {word}_state;",
+        "",
+    ]
+    for _ in range(rng.randint(2, 14)):
+        kind = rng.random()
+        callee = rng.choice(callees) if callees else "elog"
+        if kind < 0.3:
+            out += [f"\tif ({word}_state == NULL)",
+                    f'\t\telog(ERROR, "unexpected {word} state: %d", i);']
+        elif kind < 0.6:
+            out += ["\tfor (i = 0; i < nitems; i++)", "\t{",
+                    f"\t\t{callee}({word}_state, i);", "\t}"]
+        elif kind < 0.8:
+            out += [f"\t/* {rng.choice(_WORDS)} must be locked by the caller */",
+                    f"\t{word}_state = {callee}({rng.choice(_WORDS)});"]
+        else:
+            out += [f"\tAssert({word}_state != InvalidOid);"]
+    if rettype != "void":
+        out += ["", f"\treturn ({rettype}) {word}_state;"]
+    out += ["}", ""]
+    return out
+
+
+def _c_file(rng: random.Random, path: str, target: int, planted: List[str]) -> str:
+    prefix = _prefix(path.rsplit("/", 1)[0])
+    out = [
+        "/*-------------------------------------------------------------------------",
+        " *",
+        f" * {path.rsplit('/', 1)[-1]}",
+        f" *\t  Routines for {rng.choice(_WORDS)} {rng.choice(_WORDS)} handling.",
+        " *",
+        " * Portions Copyright (c) 1996-2024, PostgreSQL Global Development Group",
+        " *",
+        f" * IDENTIFICATION\n *\t  {path}",
+        " *",
+        " *-------------------------------------------------------------------------",
+        " */",
+        '#include "postgres.h"',
+        "",
+    ]
+    out += [f'#include "{rng.choice(_INCLUDE_DIRS)}/{w}.h"' for w in rng.sample(_WORDS, 5)]
+    out.append("")
+    names = [_name(rng, prefix) for _ in range(max(2, target // 30))]
+    statics = names[len(names) // 2:]
+    out += [f"static {rng.choice(_TYPES)} {n}(void);" for n in statics]
+    out.append("")
+    for symbol in planted:
+        out += _function(rng, symbol, names, static=False)
+    for n in names:
+        if len(out) >= target:
+            break
+        out += _function(rng, n, names, static=n in statics)
+    return "\n".join(out) + "\n"
+
+
+def _h_file(rng: random.Random, path: str, target: int, planted: List[str]) -> str:
+    guard = path.rsplit("/", 1)[-1].replace(".", "_").upper()
+    prefix = _prefix(path.rsplit("/", 1)[0])
+    out = [
+        "/*-------------------------------------------------------------------------",
+        " *",
+        f" * {path.rsplit('/', 1)[-1]}",
+        f" *\t  Declarations for {rng.choice(_WORDS)} routines.",
+        " *",
+        " *-------------------------------------------------------------------------",
+        " */",
+        f"#ifndef {guard}",
+        f"#define {guard}",
+        "",
+    ]
+    out += [f"extern {rng.choice(_TYPES)} {s}(void);" for s in planted]
+    while len(out) < target - 2:
+        r = rng.random()
+        if r < 0.5:
+            out.append(f"extern {rng.choice(_TYPES)} {_name(rng, prefix)}({rng.choice(_TYPES[1:])} arg);")
+        elif r < 0.8:
+            struct = f"{prefix}{rng.choice(_NOUNS)}Data"
+            out += [f"typedef struct {struct}", "{"]
+            out += [f"\t{rng.choice(_TYPES[1:])} {w};\t/* {rng.choice(_WORDS)} */" for w in rng.sample(_WORDS, 4)]
+            out += [f"}} {struct};", ""]
+        else:
+            out.append(f"#define {prefix.upper()}_{rng.choice(_NOUNS).upper()}_{rng.randint(0, 999)}\t{rng.randint(0, 1 << 16)}")
+    out += ["", f"#endif\t\t\t\t\t\t\t/* {guard} */"]
+    return "\n".join(out) + "\n"
+
+
+def _gram_y(rng: random.Random, target: int) -> str:
+    out = ["%{", '#include "postgres.h"', "%}", "", "%%", ""]
+    while len(out) < target:
+        rule = f"{rng.choice(_WORDS)}_{rng.choice(_NOUNS).lower()}_{rng.randint(0, 9999)}"
+        out.append(f"{rule}:")
+        for alt in range(rng.randint(1, 5)):
+            toks = " ".join(rng.choice(_NOUNS).upper() for _ in range(rng.randint(1, 4)))
+            out += [f"\t\t\t{'|' if alt else ' '} {toks}", "\t\t\t\t{",
+                    f"\t\t\t\t\t$$ = makeNode({rng.choice(_NOUNS)}Stmt);", "\t\t\t\t}"]
+        out += ["\t\t;", ""]
+    return "\n".join(out) + "\n"
+
+
+def _write(root: pathlib.Path, rel: str, text: str, stats: Dict[str, int]) -> None:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    stats["files"] += 1
+    stats["lines"] += text.count("\n")
+    stats["bytes"] += len(text.encode())
+
+
+# ────────────────────────── public API ──────────────────────────────
+def generate(dest: pathlib.Path, scale: float = 1.0, seed: int = 0) -> Dict[str, int]:
+    """Write the tree under *dest*; returns {files, lines, bytes}."""
+    rng = random.Random(seed)
+    dest = pathlib.Path(dest)
+    stats = {"files": 0, "lines": 0, "bytes": 0}
+
+    planted_c: Dict[str, List[str]] = {}
+    planted_h: Dict[str, List[str]] = {}
+    for symbol, (cfile, hfile) in KNOWN_SYMBOLS.items():
+        planted_c.setdefault(cfile, []).append(symbol)
+        planted_h.setdefault(hfile, []).append(symbol)
+
+    directories = set()
+    for layout, ext, bounds, planted, render in (
+        (C_LAYOUT, "c", C_LINES, planted_c, _c_file),
+        (H_LAYOUT, "h", H_LINES, planted_h, _h_file),
+    ):
+        for directory, count in sorted(layout.items()):
+            directories.add(directory)
+            files = {f for f in planted if f.rsplit("/", 1)[0] == directory}
+            n = len(files) + max(1, round(count * scale))
+            i = 0
+            while len(files) < n:
+                base = f"{rng.choice(_WORDS)}{rng.choice(_NOUNS).lower()}{i}"
+                files.add(f"{directory}/{base}.{ext}")
+                i += 1
+            for rel in sorted(files):
+                _write(dest, rel, render(rng, rel, _lines(rng, bounds), planted.get(rel, [])), stats)
+
+    directories.add(NEEDLE_FILE.rsplit("/", 1)[0])
+    _write(dest, NEEDLE_FILE, _c_file(rng, NEEDLE_FILE, 200, []).replace(
+        '#include "postgres.h"', f'#include "postgres.h"\n\n/* {NEEDLE} */', 1), stats)
+    _write(dest, "src/backend/parser/gram.y", _gram_y(rng, int(GRAM_Y_LINES * scale)), stats)
+
+    for directory in sorted(directories):
+        name = directory.rsplit("/", 1)[-1]
+        _write(dest, f"{directory}/Makefile",
+               f"subdir = {directory}\ntop_builddir = {'../' * directory.count('/')}..\n"
+               f"include $(top_builddir)/src/Makefile.global\n\nOBJS = {name}.o\n", stats)
+        _write(dest, f"{directory}/meson.build", f"# {name}\n{name}_sources = files()\n", stats)
+    return stats
+
+
+def _cache_root() -> pathlib.Path:
+    env = os.environ.get("PG_DEBUGGER_BENCH_CACHE")
+    return pathlib.Path(env) if env else pathlib.Path.home() / ".pg_debugger_agent" / "bench"
+
+
+def cached_tree(scale: float = 1.0, seed: int = 0, cache_dir: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """Path of a generated tree for (scale, seed), generating it on first use."""
+    root = pathlib.Path(cache_dir) if cache_dir else _cache_root()
+    dest = root / f"tree-v{GENERATOR_VERSION}-s{scale:g}-{seed}"
+    if (dest / ".complete").exists():
+        return dest
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = pathlib.Path(tempfile.mkdtemp(dir=root, prefix=".gen-"))
+    try:
+        stats = generate(tmp, scale, seed)
+        (tmp / ".complete").write_text(json.dumps(stats))
+        if dest.exists():
+            shutil.rmtree(dest)
+        os.replace(tmp, dest)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return dest
+
+
+def tree_stats(root: pathlib.Path) -> Dict[str, int]:
+    return json.loads((pathlib.Path(root) / ".complete").read_text())
@@ -0,0 +1,87 @@
+import http.server, threading
+from unittest import mock
+
+import pytest
+
+from agent.tools.archive_fetch import ArchiveFetcher, CacheMiss
+
+MESSAGE = b"""<html><body>
+<div class="message-content">Here is v2 of the patch.</div>
+<a href="/message-id/attachment/1/v2-0001-fix.patch">v2-0001-fix.patch</a>
+</body></html>"""
+FLAT = b"""<html><body>
+<a href="/message-id/abc%40example.com">msg</a>
+<a href="/message-id/def%40example.com">reply</a>
+<a href="/message-id/attachment/1/v2-0001-fix.patch">v2-0001-fix.patch</a>
+</body></html>"""
+ROUTES = {
+    "/message-id/abc%40example.com": MESSAGE,
+    "/message-id/def%40example.com": MESSAGE,
+    "/message-id/flat/abc%40example.com": FLAT,
+    "/message-id/attachment/1/v2-0001-fix.patch": b"diff --git a/x b/x\n",
+}
+
+
+@pytest.fixture
+def archive():
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def do_GET(self):
+            hits.append(self.path)
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = ROUTES[self.path]
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits, server
+    server.shutdown()
+
+
+def test_message_cached_and_revalidated(archive, tmp_path):
+    base, hits, _ = archive
+    fetcher = ArchiveFetcher(base_url=base, cache_dir=tmp_path)
+    text, attachments = fetcher.message("abc@example.com")
+    assert text == "Here is v2 of the patch."
+    assert fetcher.fetch_all(attachments) == {"v2-0001-fix.patch": "diff --git a/x b/x\n"}
+
+    again = ArchiveFetcher(base_url=base, cache_dir=tmp_path)
+    _, attachments = again.message("abc@example.com")
+    again.fetch_all(attachments)
+    assert again.stats == {"network": 0, "revalidated": 1, "cached": 1}
+    assert hits.count("/message-id/attachment/1/v2-0001-fix.patch") == 1
+
+
+def test_prefetch_then_offline(archive, tmp_path):
+    base, hits, server = archive
+    stats = ArchiveFetcher(base_url=base, cache_dir=tmp_path).prefetch_thread(f"{base}/message-id/abc%40example.com")
+    assert (stats["messages"], stats["attachments"]) == (2, 1)
+    server.shutdown()
+
+    offline = ArchiveFetcher(base_url=base, cache_dir=tmp_path, offline=True)
+    assert offline.message("def@example.com")[0] == "Here is v2 of the patch."
+    with pytest.raises(CacheMiss):
+        offline.fetch("/message-id/unknown%40example.com")
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    from agent import fsutil
+
+    monkeypatch.setattr(fsutil.os, "replace", mock.Mock(side_effect=OSError("disk full")))
+    with pytest.raises(OSError):
+        fsutil.atomic_write(tmp_path / "objects" / "abc", b"body")
+    assert list((tmp_path / "objects").iterdir()) == []
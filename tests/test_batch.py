@@ -0,0 +1,67 @@
+import threading, time
+
+from agent import context
+
+
+def test_session_label_is_per_thread():
+    seen = {}
+
+    def worker(label):
+        with context.session(label):
+            time.sleep(0.05)
+            seen[label] = context.get_label()
+
+    threads = [threading.Thread(target=worker, args=(f"s{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {f"s{i}": f"s{i}" for i in range(4)}
+    assert context.get_label() is None
+
+
+def test_run_batch_bounds_sandbox_pool(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from agent import batch
+
+    lock = threading.Lock()
+    busy, overlaps = set(), []
+
+    def fake_loop(prompt, sandbox_label, **kw):
+        with lock:
+            if sandbox_label in busy:
+                overlaps.append(sandbox_label)
+            busy.add(sandbox_label)
+        time.sleep(0.02)
+        with lock:
+            busy.discard(sandbox_label)
+        if prompt == "boom":
+            raise RuntimeError("bad")
+        return f"done {prompt}"
+
+    monkeypatch.setattr(batch, "_ensure_live", lambda label: None)
+    monkeypatch.setattr(batch.llm_agent, "run_llm_loop", fake_loop)
+
+    prompts_file = tmp_path / "prompts.txt"
+    prompts_file.write_text("# triage\na\nb\n\nboom\nc\nd\n")
+    results, seconds = batch.run_batch(batch.read_prompts(str(prompts_file)), jobs=2)
+
+    assert [r["prompt"] for r in results] == ["a", "b", "boom", "c", "d"]
+    assert {r["sandbox"] for r in results} <= {"batch-0", "batch-1"}
+    assert not overlaps
+    summary = batch.summarize(results, seconds)
+    assert summary["counts"] == {"finished": 4, "error": 1}
+    assert summary["seconds"] == seconds and summary["prompt_seconds"] == round(sum(r["seconds"] for r in results), 1)
+
+
+def test_dead_sandbox_worktree_is_reclaimed(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from agent import batch, registry
+
+    old = tmp_path / "pgdbg_old"
+    (old / "data").mkdir(parents=True)
+    registry.add_instance("batch-0", 58100, old)
+    monkeypatch.setattr(batch.health, "is_live", lambda info, use_cache: False)
+    monkeypatch.setattr(batch, "fresh_clone_and_launch", lambda label: None)
+    batch._ensure_live("batch-0")
+    assert not old.exists() and registry.get_instance("batch-0") is None
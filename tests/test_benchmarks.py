@@ -0,0 +1,35 @@
+import filecmp
+
+from benchmarks import harness, synthetic_tree
+
+
+def test_synthetic_tree_is_deterministic(tmp_path):
+    a = synthetic_tree.generate(tmp_path / "a", scale=0.01, seed=3)
+    b = synthetic_tree.generate(tmp_path / "b", scale=0.01, seed=3)
+    assert a == b and a["files"] > 100
+    cmp = filecmp.dircmp(tmp_path / "a", tmp_path / "b")
+    assert not cmp.diff_files and not cmp.left_only and not cmp.right_only
+
+    heapam = (tmp_path / "a" / "src/backend/access/heap/heapam.c").read_text()
+    assert "\nheap_insert(" in heapam
+    needle = tmp_path / "a" / synthetic_tree.NEEDLE_FILE
+    assert synthetic_tree.NEEDLE in needle.read_text()
+
+
+def test_suite_runs_against_fake_sandbox(tmp_path):
+    root = synthetic_tree.cached_tree(scale=0.01, cache_dir=tmp_path / "cache")
+    results = harness.run_suite(root, tmp_path / "work", repeat=1, only="search_code")
+    assert set(results) == {"search_code.common", "search_code.full_scan", "search_code.subtree"}
+    assert results["search_code.full_scan"]["mb_per_s"] > 0
+    assert results["search_code.full_scan"]["peak_kib"] > 0
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"a": {"median_ms": 10.0, "peak_kib": 1000.0}, "b": {"median_ms": 0.01, "peak_kib": 5.0}}
+    current = {"a": {"median_ms": 13.0, "peak_kib": 1100.0}, "b": {"median_ms": 0.03, "peak_kib": 5.0},
+               "new": {"median_ms": 1.0, "peak_kib": 1.0}}
+    regressions = harness.compare(current, baseline, threshold=0.2)
+    # b tripled but stays under the noise floor; peak memory of a is within 20%
+    assert regressions == [
+        {"case": "a", "metric": "median_ms", "baseline": 10.0, "current": 13.0, "change_pct": 30.0}
+    ]
@@ -0,0 +1,88 @@
+import json
+import subprocess
+from collections import Counter
+from unittest import mock
+
+import pytest
+
+from agent import registry
+from agent.tools import cpu_profile
+
+PERF_SCRIPT = """\
+postgres 4242 1000.000001:   10101010 cpu-clock:
+\t    55d1c0a1b2c3 hash_search_with_hash_value+0x53 (/pg/install/bin/postgres)
+\t    55d1c0a1b000 ExecHashJoin+0x10 (/pg/install/bin/postgres)
+\t    55d1c0a1a000 PostgresMain+0x99 (/pg/install/bin/postgres)
+
+postgres 4242 1000.010001:   10101010 cpu-clock:
+\t    55d1c0a1b000 ExecHashJoin+0x20 (/pg/install/bin/postgres)
+\t    55d1c0a1a000 PostgresMain+0x99 (/pg/install/bin/postgres)
+
+"""
+
+GDB_BT = """\
+0x00007f in epoll_wait () from /lib/libc.so.6
+#0  0x00007f3 in epoll_wait () from /lib/libc.so.6
+#1  0x000055 in WaitEventSetWait (set=0x1) at latch.c:1100
+#2  PostgresMain (dbname=0x2) at postgres.c:4500
+"""
+
+
+def test_fold_and_top_functions():
+    stacks = cpu_profile.fold_perf_script(PERF_SCRIPT)
+    assert stacks == Counter({
+        "PostgresMain;ExecHashJoin;hash_search_with_hash_value": 1,
+        "PostgresMain;ExecHashJoin": 1,
+    })
+    exclusive, inclusive, total = cpu_profile.top_functions(stacks)
+    assert total == 2
+    assert dict(exclusive) == {"hash_search_with_hash_value": 1, "ExecHashJoin": 1}
+    assert dict(inclusive) == {"PostgresMain": 2, "ExecHashJoin": 2, "hash_search_with_hash_value": 1}
+
+
+def test_parse_gdb_backtrace():
+    assert cpu_profile.parse_gdb_backtrace(GDB_BT) == "PostgresMain;WaitEventSetWait;epoll_wait"
+
+
+def test_diff_profiles_links_source(tmp_path):
+    src = tmp_path / "pg" / "src" / "backend"
+    src.mkdir(parents=True)
+    (src / "hashjoin.c").write_text("static void ExecHashJoin(int);\n\nvoid\nExecHashJoin(int x)\n{\n}\n")
+    registry.add_instance("patched", 58000, tmp_path / "pg")
+    meta = {"port": 58000, "sql": "SELECT 1", "sampler": "perf"}
+    cpu_profile._save("base", Counter({"main;ExecHashJoin": 1, "main;other": 3}), {**meta, "sandbox": None})
+    cpu_profile._save("new", Counter({"main;ExecHashJoin": 3, "main;other": 1}), {**meta, "sandbox": "patched"})
+
+    out = json.loads(cpu_profile.diff_cpu_profiles("base", "new"))
+    row = next(r for r in out["exclusive"] if r["function"] == "ExecHashJoin")
+    assert (row["baseline_pct"], row["patched_pct"], row["delta_pct"]) == (25.0, 75.0, 50.0)
+    assert row["source"] == "src/backend/hashjoin.c:4"
+
+
+def test_profile_ids_are_unique_and_checked():
+    ids = {cpu_profile.new_profile_id("my sandbox/1", 5432) for _ in range(50)}
+    assert len(ids) == 50 and all(i.startswith("my_sandbox_1-") for i in ids)
+    for bad in ("../../etc/passwd", "a/b", ""):
+        with pytest.raises(ValueError):
+            cpu_profile._load(bad)
+
+
+def test_perf_unwinds_with_dwarf(tmp_path):
+    cmd = cpu_profile.perf_record_command(4242, 99, tmp_path / "perf.data")
+    assert cmd[cmd.index("--call-graph") + 1] == f"dwarf,{cpu_profile.PERF_STACK_BYTES}"
+    assert "-g" not in cmd and cmd[cmd.index("-p") + 1] == "4242"
+
+
+def test_find_definition_falls_back_to_grep(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "heap.c").write_text("extern int heap_insert(int);\n\nint\nheap_insert(int x)\n{\n}\n")
+    real_run = subprocess.run
+
+    def run(cmd, **kw):
+        if cmd[0] == "rg":      # e.g. a broken rg install
+            return subprocess.CompletedProcess(cmd, 2, stdout="", stderr="rg: error")
+        return real_run(cmd, **kw)
+
+    with mock.patch("agent.tools.code_lookup.subprocess.run", side_effect=run):
+        assert cpu_profile.find_definition("heap_insert", tmp_path) == "src/heap.c:4"
@@ -0,0 +1,59 @@
+import subprocess
+from unittest import mock
+
+from agent import fleet, registry
+
+
+def _sandbox(tmp_path, name="pgdbg_a"):
+    work = tmp_path / name
+    (work / "data").mkdir(parents=True)
+    (work / "data" / "postmaster.pid").write_text("999999\n")
+    return work
+
+
+@mock.patch("agent.fleet.subprocess.run")
+def test_stop_escalates_on_timeout(run, tmp_path):
+    work = _sandbox(tmp_path)
+    run.side_effect = [
+        subprocess.TimeoutExpired("pg_ctl", 40),
+        mock.Mock(returncode=0, stderr=""),
+    ]
+    result = fleet.stop_instance("a", {"port": 58000, "path": str(work)}, timeout=30)
+    assert result == {"label": "a", "status": "stopped", "mode": "fast"}
+    modes = [c.args[0][c.args[0].index("-m") + 1] for c in run.call_args_list]
+    assert modes == ["smart", "fast"]
+
+
+@mock.patch("agent.fleet.health.is_live", return_value=False)
+def test_gc_reclaims_dead_worktrees(_live, tmp_path):
+    dead = _sandbox(tmp_path, "pgdbg_dead")
+    (dead / "big.o").write_bytes(b"x" * 100_000)
+    foreign = _sandbox(tmp_path, "somewhere_else")
+    registry.add_instance("dead", 58000, dead)
+    registry.add_instance("foreign", 58001, foreign)
+
+    report = fleet.gc(dry_run=True)
+    assert dead.exists() and report["freed_bytes"] >= 100_000
+
+    report = fleet.gc()
+    assert report["dead_entries"] == ["dead", "foreign"]
+    assert not dead.exists()
+    assert foreign.exists()     # not a pgdbg_* worktree: entry dropped, files kept
+    assert registry.list_instances() == {}
+
+
+def test_gc_orphans_spares_sandboxes_still_being_built(tmp_path):
+    import os, time
+
+    old = time.time() - 2 * fleet.ORPHAN_GRACE
+    stale, fresh, building = (tmp_path / f"pgdbg_{n}" for n in ("stale", "fresh", "building"))
+    for d in (stale, fresh, building):
+        (d / "src").mkdir(parents=True)
+    for d in (stale, building):
+        for p in (d / "src", d):
+            os.utime(p, (old, old))
+    registry.next_free_port(path=building)      # another process is cloning into it
+
+    report = fleet.gc(orphans=True, base_dir=str(tmp_path))
+    assert [r["path"] for r in report["removed"]] == [str(stale)]
+    assert fresh.exists() and building.exists() and not stale.exists()
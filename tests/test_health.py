@@ -0,0 +1,43 @@
+import os
+from unittest import mock
+
+from agent import health
+
+
+def _sandbox(tmp_path, pid, port=58000, with_socket=True):
+    data = tmp_path / "data"
+    data.mkdir()
+    sockdir = tmp_path / "sock"
+    sockdir.mkdir()
+    if with_socket:
+        (sockdir / f".s.PGSQL.{port}").touch()
+    (data / "postmaster.pid").write_text(
+        f"{pid}\n{data}\n1700000000\n{port}\n{sockdir}\nlocalhost\n"
+    )
+    return {"port": port, "path": str(tmp_path)}
+
+
+@mock.patch.object(health, "ping", side_effect=AssertionError("should not connect"))
+def test_live_from_pidfile_and_socket(_ping, tmp_path):
+    assert health.is_live(_sandbox(tmp_path, os.getpid()), use_cache=False)
+
+
+@mock.patch.object(health, "ping", side_effect=AssertionError("should not connect"))
+def test_dead_without_pidfile(_ping, tmp_path):
+    assert not health.is_live({"port": 58000, "path": str(tmp_path)}, use_cache=False)
+
+
+@mock.patch.object(health, "ping", return_value=True)
+def test_falls_back_to_connection(ping, tmp_path):
+    info = _sandbox(tmp_path, os.getpid(), with_socket=False)
+    assert health.is_live(info, use_cache=False)
+    ping.assert_called_once_with(58000)
+
+
+@mock.patch.object(health, "ping", return_value=False)
+def test_check_all_caches(ping, tmp_path):
+    info = _sandbox(tmp_path, os.getpid(), with_socket=False)
+    health.invalidate()
+    assert health.check_all({"a": info}) == {"a": False}
+    assert health.check_all({"a": info}) == {"a": False}
+    assert ping.call_count == 1
@@ -0,0 +1,82 @@
+import json
+import subprocess
+from unittest import mock
+
+import pytest
+
+from agent.tools import list_dir, tree_index
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch):
+    root = tmp_path / "pgdbg_src"
+    parser = root / "src" / "backend" / "parser"
+    parser.mkdir(parents=True)
+    (parser / "gram.y").write_text("%%\nstmt: ;\n%%\n")
+    (parser / "parser.c").write_text("int a;\nint b;\n")
+    (root / "README").write_text("hi\n")
+    (root / ".gitignore").write_text("*.o\n/src/backend/parser/gram.c\n")
+    git = ["git", "-C", str(root), "-c", "user.name=t", "-c", "user.email=t@t"]
+    subprocess.run(["git", "init", "-q", str(root)], check=True)
+    subprocess.run([*git, "add", "."], check=True)
+    subprocess.run([*git, "commit", "-qm", "init"], check=True)
+    (parser / "gram.c").write_text("/* generated */\n" * 10)
+    (parser / "parser.o").write_bytes(b"\0ELF" * 100)
+    (root / "data").mkdir()
+    (root / "data" / "PG_VERSION").write_text("18\n")
+    monkeypatch.setenv("PG_DEBUGGER_SRC", str(root))
+    tree_index.invalidate()
+    return root
+
+
+def test_plain_listing_is_unchanged(checkout):
+    assert json.loads(list_dir.list_dir(".")) == [".git/", ".gitignore", "README", "data/", "src/"]
+
+
+def test_tree_mode_sizes_lines_and_flags(checkout):
+    tree = {e["path"]: e for e in json.loads(list_dir.list_dir("src", depth=4))}
+    assert "backend/parser/" in tree and tree["backend/"]["files"] == 4
+    assert tree["backend/parser/parser.c"]["lines"] == 2
+    assert tree["backend/parser/gram.c"]["flags"] == ["generated"]
+    assert tree["backend/parser/parser.o"]["flags"] == ["build"]
+    assert tree["backend/parser/parser.o"]["lines"] is None
+
+    shown = json.loads(list_dir.list_dir(".", depth=9, hide_generated=True, hide_build=True))
+    assert [e["path"] for e in shown if e["type"] == "file"] == [
+        ".gitignore", "README", "src/backend/parser/gram.y", "src/backend/parser/parser.c"]  # no data/
+
+    only_c = json.loads(list_dir.list_dir("src", depth=9, glob="*.c"))
+    assert [e["path"] for e in only_c if e["type"] == "file"] == [
+        "backend/parser/gram.c", "backend/parser/parser.c"]
+
+
+def test_snapshot_refreshes_incrementally(checkout):
+    files = tree_index.snapshot(checkout)
+    assert files["src/backend/parser/parser.c"][tree_index.LINES] == 2
+
+    (checkout / "src/backend/parser/parser.c").write_text("int a;\n" * 5)
+    (checkout / "src/backend/parser/new.c").write_text("x\n")
+    (checkout / "README").unlink()
+    tree_index.invalidate(checkout)
+    tree_index._memory.clear()                  # as a new session would: from the disk cache
+    with mock.patch.object(tree_index, "count_lines", wraps=tree_index.count_lines) as counted:
+        files = tree_index.snapshot(checkout)
+    assert sorted(c.args[0].name for c in counted.call_args_list) == ["new.c", "parser.c"]
+    assert files["src/backend/parser/parser.c"][tree_index.LINES] == 5
+    assert "README" not in files and not any(rel.startswith("data/") for rel in files)
+
+
+def test_tree_paths_are_normalised(checkout):
+    plain = list_dir.list_dir("src", depth=3)
+    assert json.loads(plain)
+    for spelling in ("./src", "src/", "src/backend/.."):
+        assert list_dir.list_dir(spelling, depth=3) == plain
+
+
+def test_unsaved_snapshot_still_serves(checkout, monkeypatch):
+    cache = tree_index._cache_dir()
+    cache.mkdir(parents=True)
+    monkeypatch.setattr(tree_index.os, "replace", mock.Mock(side_effect=OSError("disk full")))
+    files = tree_index.snapshot(checkout)
+    assert "README" in files
+    assert list(cache.iterdir()) == []          # no .tmp- leftovers
@@ -0,0 +1,116 @@
+import http.server, json, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+@pytest.fixture
+def fake_endpoint():
+    """Local stand-in for POST /v1/responses that streams SSE events."""
+    tool_started = threading.Event()
+    seen = {}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen["stream"] = body.get("stream")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for delta in ("Looking ", "at it."):
+                self.wfile.write(_sse({"type": "response.output_text.delta", "delta": delta,
+                                       "item_id": "m1", "output_index": 0,
+                                       "content_index": 0, "sequence_number": 1}))
+            self.wfile.write(_sse({
+                "type": "response.output_item.done", "output_index": 1, "sequence_number": 2,
+                "item": {"type": "function_call", "id": "fc1", "call_id": "c1",
+                         "name": "probe", "arguments": json.dumps({"x": 2})},
+            }))
+            self.wfile.flush()
+            # the tool must be running before the model output is over
+            seen["dispatched_early"] = tool_started.wait(5)
+            self.wfile.write(_sse({"type": "response.completed", "sequence_number": 3,
+                                   "response": {}}))
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1", tool_started, seen
+    server.shutdown()
+
+
+def test_stream_turn_dispatches_tools_early(fake_endpoint, monkeypatch, capsys):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from openai import OpenAI
+    from agent import llm_agent
+
+    base_url, tool_started, seen = fake_endpoint
+
+    def probe(x):
+        tool_started.set()
+        return x * 21
+
+    monkeypatch.setitem(llm_agent.TOOLS, "probe", {"impl": probe, "spec": {}})
+    client = OpenAI(base_url=base_url, api_key="test")
+    turn = llm_agent._Turn()
+    with ThreadPoolExecutor() as pool:
+        llm_agent._stream_turn(client, [{"role": "user", "content": "hi"}], pool, turn)
+
+    assert seen == {"stream": True, "dispatched_early": True}
+    assert turn.output_text == "Looking at it."
+    [(name, args, future)] = turn.calls
+    assert (name, args, future.result()) == ("probe", {"x": 2}, 42)
+    assert "Looking at it." in capsys.readouterr().out
+
+
+def test_calls_run_one_at_a_time_and_bad_names_become_results(monkeypatch):
+    import time
+    from agent import llm_agent
+
+    running, overlaps = [], []
+
+    def slow(x):
+        running.append(x)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.remove(x)
+        return x
+
+    monkeypatch.setitem(llm_agent.TOOLS, "slow", {"impl": slow, "spec": {}})
+    turn = llm_agent._Turn()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for x in range(3):
+            llm_agent._submit(turn, pool, "slow", json.dumps({"x": x}))
+        llm_agent._submit(turn, pool, "no_such_tool", "{}")
+        llm_agent._submit(turn, pool, "slow", '{"x": ')
+        results, interrupted = llm_agent._collect(turn)
+
+    assert overlaps == [1, 1, 1] and not interrupted
+    assert [r for _, _, r in results[:3]] == ["0", "1", "2"]
+    assert results[3][2].startswith("❌ KeyError")
+    assert results[4][2].startswith("❌ bad arguments") and len(overlaps) == 3
+
+
+def test_failed_response_does_not_end_the_session(monkeypatch):
+    from agent import llm_agent
+
+    turns = []
+
+    def run_turn(client_, conversation, pool, turn, echo=True):
+        turns.append(conversation[-1]["content"])
+        if len(turns) == 1:
+            raise llm_agent.TurnFailed("Model stream ended with response.failed")
+        llm_agent._submit(turn, pool, "finish", json.dumps({"summary": "ok"}))
+
+    monkeypatch.setattr(llm_agent, "_stream_turn", run_turn)
+    monkeypatch.setattr(llm_agent, "get_client", lambda: None)
+    monkeypatch.setattr(llm_agent, "_log_conversation", lambda *a: None)
+    assert llm_agent._session_loop("hi", 5432, max_turns=3, stream=True, echo=False) == "ok"
+    assert turns[1] == "[Model stream ended with response.failed]"
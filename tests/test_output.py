@@ -0,0 +1,78 @@
+import json
+from unittest import mock
+
+from agent import llm_agent
+from agent.tools import output, query_exec
+
+PATCH = """Subject: [PATCH v2] fix
+
+diff --git a/src/backend/a.c b/src/backend/a.c
+--- a/src/backend/a.c
++++ b/src/backend/a.c
+@@ -1,2 +1,2 @@
+ ctx
+--- removed SQL comment
++new
+@@ -10,2 +10,3 @@ func
+ a
++b
+ c
+diff --git a/src/test/regress/sql/x.sql b/src/test/regress/sql/x.sql
+--- a/src/test/regress/sql/x.sql
++++ b/src/test/regress/sql/x.sql
+@@ -1 +1 @@
+-x
++y
+--
+2.40.0
+"""
+
+
+def test_table_and_grouped_hits():
+    assert output.table(["id", "note"], [(1, "a\tb"), (2, None)]) == "id\tnote\n1\ta\\tb\n2\tNULL\n(2 rows)"
+    hits = [{"file": "a.c", "line": 3, "text": "x"}, {"file": "a.c", "line": 9, "text": "y"},
+            {"file": "b.c", "line": 1, "text": "z"}]
+    assert output.hits_by_file(hits) == "a.c\n  3: x\n  9: y\nb.c\n  1: z\n(3 hits in 2 files)"
+
+
+def test_diffstat_and_hunk_selection():
+    assert output.diffstat("v2.patch", PATCH).splitlines() == [
+        "v2.patch: 2 files, +3 -2",
+        "  src/backend/a.c  +2 -1  (2 hunks)",
+        "  src/test/regress/sql/x.sql  +1 -1  (1 hunk)",
+    ]
+    shown = output.select_hunks(PATCH, file="src/backend/a.c", hunks="2")
+    assert shown.startswith("--- src/backend/a.c\n[hunk 2]\n@@ -10,2")
+    assert "removed SQL" not in shown
+
+
+def test_emit_is_unchanged_outside_compact_mode():
+    assert output.emit(["a/", "b"], "\n".join) == json.dumps(["a/", "b"], indent=2)
+    with output.compact_mode():
+        out = output.emit(["a/", "b"], "\n".join)
+    assert out.text == "a/\nb" and out.verbose == json.dumps(["a/", "b"], indent=2)
+
+
+@mock.patch("agent.tools.query_exec.psycopg.connect")
+def test_execute_query_compact_table(mock_connect):
+    cur = mock_connect.return_value.cursor.return_value.__enter__.return_value
+    cur.description = ("relname", "n")
+    cur.fetchall.return_value = [("pg_class", 1)] * 500
+    with output.compact_mode():
+        out = query_exec.execute_query("SELECT …", port=5432)
+    assert out.text.startswith("relname\tn\npg_class\t1\n") and out.text.endswith("(500 rows)")
+
+
+def test_results_are_compacted_budgeted_and_metered(monkeypatch):
+    big = json.dumps([{"file": f"f{i}.c", "line": i} for i in range(2000)], indent=2)
+    monkeypatch.setitem(llm_agent.TOOLS, "fake", {"impl": lambda: big, "spec": {}, "budget": 500})
+    with output.session(compact=True) as meter:
+        text = llm_agent._render_result("fake", llm_agent._dispatch("fake", {}))
+    assert text.startswith('[{"file":"f0.c","line":0}')
+    assert "…[truncated: ~" in text and output.estimate_tokens(text) < 600
+    summary = meter.summary()
+    assert summary["tools"]["fake"]["calls"] == 1
+    assert summary["sent_tokens"] < summary["verbose_tokens"] and summary["saved_pct"] > 90
+
+    with output.session(compact=False):
+        assert llm_agent._render_result("fake", big).startswith('[\n  {\n    "file"')
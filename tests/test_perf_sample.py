@@ -0,0 +1,41 @@
+import json
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
+
+import psycopg
+
+from agent.tools import perf_sample
+
+
+def test_delta_keeps_nonzero_numeric_changes():
+    before = {"t1": {"seq_scan": 3, "n_dead_tup": 10, "relname": "t1"}}
+    after = {
+        "t1": {"seq_scan": 5, "n_dead_tup": 10, "relname": "t1"},
+        "t2": {"seq_scan": 1, "n_dead_tup": 0, "relname": "t2"},
+        "q": {"calls": 2, "total_exec_time": Decimal("1.23456"), "query": "SELECT 1"},
+    }
+    assert perf_sample.delta(before, after) == {
+        "t1": {"seq_scan": 2},
+        "t2": {"seq_scan": 1},
+        "q": {"calls": 2, "total_exec_time": 1.235, "query": "SELECT 1"},
+    }
+
+
+def test_histogram_sorted_with_percentages():
+    hist = perf_sample.histogram(Counter({"CPU": 30, "LWLock:WALWrite": 60, "IO:DataFileRead": 10}))
+    assert [h["event"] for h in hist] == ["LWLock:WALWrite", "CPU", "IO:DataFileRead"]
+    assert [h["pct"] for h in hist] == [60.0, 30.0, 10.0]
+
+
+def test_sampler_errors_are_reported(monkeypatch):
+    connections = [mock.MagicMock(), psycopg.OperationalError("too many clients")]
+    monkeypatch.setattr(perf_sample, "_connect", mock.Mock(side_effect=connections))
+    monkeypatch.setattr(perf_sample, "ensure_instrumentation", lambda port: [])
+    monkeypatch.setattr(perf_sample, "snapshot", lambda conn: {})
+    monkeypatch.setattr(perf_sample, "benchmark_context", lambda port: {})
+    monkeypatch.setattr(perf_sample.time, "sleep", lambda s: None)
+
+    out = json.loads(perf_sample.sample_performance(58000, duration=0))
+    assert out["sampler_error"] == "OperationalError: too many clients"
+    assert out["ticks"] == 0 and out["wait_events"] == []
@@ -0,0 +1,42 @@
+from unittest import mock
+
+from agent import profiles, registry
+
+HOST = {"cpus": 16, "mem_bytes": 64 * 1024 ** 3, "hugepages": 0}
+
+
+def test_benchmark_sized_from_host():
+    s = profiles.render("benchmark", HOST)
+    assert s["shared_buffers"] == "16384MB"
+    assert s["effective_cache_size"] == "49152MB"
+    assert s["max_parallel_workers"] == "16"
+    assert s["huge_pages"] == "off"
+    assert profiles.render("benchmark", {**HOST, "hugepages": 512})["huge_pages"] == "try"
+    assert profiles.render("fast-iteration", HOST)["shared_buffers"] == "32MB"
+
+
+def test_write_profile_includes_once(tmp_path):
+    (tmp_path / "postgresql.conf").write_text("port = 5432")
+    for name in ("fast-iteration", "default"):
+        profiles.write_profile(tmp_path, name, profiles.render(name, HOST))
+    conf = (tmp_path / "postgresql.conf").read_text()
+    assert conf.count(profiles.INCLUDE_LINE) == 1
+    assert "fsync" not in (tmp_path / profiles.PROFILE_FILE).read_text()
+
+
+@mock.patch("agent.profiles.subprocess.run")
+@mock.patch("agent.fleet.restart_instance", return_value={"status": "started"})
+def test_apply_profile_restarts_only_when_needed(restart, run, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiles, "host_facts", lambda: HOST)
+    registry.add_instance("s", 58000, tmp_path, **profiles.initial_profile(tmp_path / "data", "default"))
+
+    result = profiles.apply_profile("s", "fast-iteration")
+    assert result["restarted"]             # shared_buffers changed
+    assert restart.call_count == 1
+    assert registry.get_instance("s")["profile"] == "fast-iteration"
+
+    registry.update_instance("s", profile_settings={**profiles.render("fast-iteration", HOST), "fsync": "on"})
+    result = profiles.apply_profile("s", "fast-iteration")
+    assert result == {"label": "s", "profile": "fast-iteration", "changed": ["fsync"], "restarted": False}
+    assert run.call_args.args[0][-1] == "reload"
+    assert profiles.benchmark_context(58000)["profile"] == "fast-iteration"
@@ -15,3 +15,58 @@ def test_next_free_port_unique(monkeypatch):
     p1 = registry.next_free_port()
     p2 = registry.next_free_port()
     assert p1 != p2
+
+def test_concurrent_adds_are_not_lost():
+    import multiprocessing
+    ctx = multiprocessing.get_context("fork")
+    procs = [
+        ctx.Process(target=registry.add_instance, args=(f"p{i}", 57000 + i, f"/tmp/p{i}"))
+        for i in range(8)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert set(registry.list_instances()) == {f"p{i}" for i in range(8)}
+
+
+def test_cache_sees_external_writes():
+    registry.add_instance("foo", 58000, "/tmp/foo")
+    assert registry.get_instance("foo")["port"] == 58000
+    data = json.loads(registry.REG_PATH.read_text())
+    data["foo"]["port"] = 58001
+    registry.REG_PATH.write_text(json.dumps(data))
+    assert registry.get_instance("foo")["port"] == 58001
+
+
+def test_sqlite_backend_and_migration():
+    registry.add_instance("foo", 58000, "/tmp/foo", profile="benchmark")
+    registry.add_instance("bar", 58002, "/tmp/bar")
+    assert registry.migrate_to_sqlite() == 2
+    assert not registry.REG_PATH.exists()
+
+    assert registry.find_by_port(58002)[0] == "bar"
+    registry.update_instance("foo", profile="fast-iteration")
+    assert registry.get_instance("foo")["profile"] == "fast-iteration"
+    registry.remove_instance("bar")
+    assert list(registry.list_instances()) == ["foo"]
+
+def test_next_free_port_skips_bound_ports(monkeypatch):
+    import socket
+    busy = socket.socket()
+    busy.bind(("127.0.0.1", 0))
+    busy.listen()
+    taken = busy.getsockname()[1]
+    picks = iter([taken, 58123])
+    monkeypatch.setattr(registry.random, "randint", lambda a, b: next(picks))
+    try:
+        assert registry.next_free_port() == 58123
+    finally:
+        busy.close()
+
+
+def test_reservation_released_on_register():
+    p = registry.next_free_port()
+    assert p in registry._load_reservations()
+    registry.add_instance("foo", p, "/tmp/foo")
+    assert p not in registry._load_reservations()
@@ -0,0 +1,112 @@
+import json
+from unittest import mock
+
+from agent import context, registry
+from agent.tools import regress
+
+PATCH = """\
+diff --git a/src/backend/utils/adt/jsonb.c b/src/backend/utils/adt/jsonb.c
+--- a/src/backend/utils/adt/jsonb.c
++++ b/src/backend/utils/adt/jsonb.c
+@@ -1 +1 @@
+-old
++new
+diff --git a/contrib/hstore/hstore_io.c b/contrib/hstore/hstore_io.c
+--- a/contrib/hstore/hstore_io.c
++++ b/contrib/hstore/hstore_io.c
+"""
+
+
+def _tree(root):
+    sql = root / "src/test/regress/sql"
+    sql.mkdir(parents=True)
+    for name in ("test_setup", "jsonb", "json", "select", "join", "vacuum", "boolean"):
+        (sql / f"{name}.sql").touch()
+    specs = root / "src/test/isolation/specs"
+    specs.mkdir(parents=True)
+    (specs / "deadlock-simple.spec").touch()
+    return root
+
+
+def test_select_tests_from_patch(tmp_path):
+    root = _tree(tmp_path)
+    files = regress.files_from_patch(PATCH)
+    assert files == ["contrib/hstore/hstore_io.c", "src/backend/utils/adt/jsonb.c"]
+    picked = {(t["suite"], t["name"]) for t in regress.select_tests(root, files)}
+    assert picked == {("regress", "jsonb"), ("contrib", "hstore")}
+
+    picked = regress.select_tests(root, ["src/backend/storage/lmgr/deadlock.c"])
+    assert [(t["suite"], t["name"]) for t in picked] == [("isolation", "deadlock-simple")]
+
+    smoke = {t["name"] for t in regress.select_tests(root, ["src/backend/foo/bar.c"])}
+    assert smoke == {"boolean", "select", "join"}
+
+
+def test_order_prefers_signal_then_speed():
+    tests = [
+        {"suite": "regress", "name": "slow", "score": 80},
+        {"suite": "regress", "name": "fast", "score": 80},
+        {"suite": "regress", "name": "direct", "score": 100},
+    ]
+    ordered = regress.order_tests(tests, {"regress:slow": 30.0, "regress:fast": 0.5})
+    assert [t["name"] for t in ordered] == ["direct", "fast", "slow"]
+
+
+def test_plan_runs_score_tiers_in_order_and_fits_the_budget():
+    tests = [
+        {"suite": "regress", "name": "smoke", "score": 10},
+        {"suite": "regress", "name": "slow", "score": 80},
+        {"suite": "isolation", "name": "deadlock-simple", "score": 60},
+        {"suite": "regress", "name": "direct", "score": 100},
+        {"suite": "regress", "name": "fast", "score": 80},
+    ]
+    durations = {"regress:slow": 30.0, "regress:fast": 0.5, "regress:direct": 2.0}
+    units = regress.plan(tests, durations)
+    assert [[t["name"] for t in u] for u in units] == [
+        ["direct"], ["fast", "slow"], ["deadlock-simple"], ["smoke"]]
+
+    run, later = regress.fit(units[1], durations, remaining=10)
+    assert ([t["name"] for t in run], [t["name"] for t in later]) == (["fast"], ["slow"])
+    assert regress.fit(units[1], durations, remaining=0.1) == (units[1][:1], units[1][1:])
+
+
+def test_run_reports_only_failing_diffs(tmp_path):
+    root = _tree(tmp_path / "pg")
+    registry.add_instance("t", 58000, root)
+
+    def fake_batch(suite, tests, root, port, workdir, deadline, max_parallel):
+        return [{**t, "status": "failed", "seconds": 1.0, "diff": "-a\n+b"} for t in tests]
+
+    def fake_run_one(test, root, port, deadline):
+        return {**test, "status": "passed", "seconds": 0.2}
+
+    with mock.patch.object(regress, "_run_batch", side_effect=fake_batch), \
+            mock.patch.object(regress, "_run_one", side_effect=fake_run_one), \
+            mock.patch.object(regress, "_prepare"), context.session("t"):
+        out = json.loads(regress.run_regression_tests(patch=PATCH))
+
+    assert out["passed"] == ["contrib:hstore"]
+    assert out["failed"] == {"regress:jsonb": "-a\n+b"}
+    assert regress._load_durations() == {"regress:jsonb": 1.0, "contrib:hstore": 0.2}
+
+
+def test_schedule_keeps_upstream_groups(tmp_path):
+    root = _tree(tmp_path)
+    (root / "src/test/regress/parallel_schedule").write_text(
+        "# comment\ntest: test_setup\ntest: boolean char json\ntest: select\ntest: jsonb join\n")
+    order = regress.write_schedule(root, ["join", "json", "vacuum", "boolean", "select"], tmp_path / "s")
+    assert order == ["test_setup", "boolean", "json", "select", "join", "vacuum"]
+    assert (tmp_path / "s").read_text().splitlines() == [
+        "test: test_setup", "test: boolean json", "test: select", "test: join", "test: vacuum"]
+
+
+def test_parse_results_and_split_diffs():
+    new = "ok 1         - test_setup    300 ms\n# parallel group (2 tests): a b\nok 2   + a  12 ms\nnot ok 3  + b  40 ms\n"
+    old = "test test_setup            ... ok          256 ms\n     b                      ... FAILED       80 ms\n"
+    assert regress.parse_results(new) == {"test_setup": {"passed": True, "seconds": 0.3},
+                                          "a": {"passed": True, "seconds": 0.012},
+                                          "b": {"passed": False, "seconds": 0.04}}
+    assert regress.parse_results(old)["b"] == {"passed": False, "seconds": 0.08}
+    diffs = "diff -U3 /x/expected/a.out /x/results/a.out\n-1\n+2\ndiff -U3 /x/expected/b_1.out /x/results/b.out\n-3\n"
+    assert regress.split_diffs(diffs) == {"a": "diff -U3 /x/expected/a.out /x/results/a.out\n-1\n+2\n",
+                                          "b": "diff -U3 /x/expected/b_1.out /x/results/b.out\n-3\n"}
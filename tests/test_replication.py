@@ -0,0 +1,108 @@
+import pathlib
+import time
+from unittest import mock
+
+from agent import fleet, registry, replication, storage
+from agent.tools import replication as replication_tool
+
+
+def _primary(tmp_path, label="pri", port=58000):
+    work = tmp_path / "pgdbg_pri"
+    (work / "install" / "bin").mkdir(parents=True)
+    (work / "install" / "bin" / "postgres").write_bytes(b"x" * 50_000)
+    (work / "data" / "base").mkdir(parents=True)
+    (work / "data" / "base" / "1259").write_bytes(b"x" * 20_000)
+    registry.add_instance(label, port, work)
+    return work
+
+
+def test_rates_from_two_samples():
+    assert replication_tool.lsn("1/10") == (1 << 32) + 16
+    row = {"state": "streaming", "sync_state": "async", "write_lag_s": 0.01, "flush_lag_s": 0.02,
+           "replay_lag_s": 0.5, "sent_lsn": "0/3000", "flush_lsn": "0/2000", "write_lsn": "0/2000"}
+    before = {"t": 10.0, "lsn": 0x1000, "standbys": {"pri-r1": {**row, "replay_lsn": "0/800"}}}
+    after = {"t": 12.0, "lsn": 0x5000, "standbys": {"pri-r1": {**row, "replay_lsn": "0/1800"}}}
+    report = replication_tool.rates(before, after)
+    assert report["wal_bytes_per_s"] == 0x2000
+    (standby,) = report["standbys"]
+    assert standby["replay_lag_bytes"] == 0x5000 - 0x1800 and standby["sent_lag_bytes"] == 0x2000
+    assert standby["apply_bytes_per_s"] == 0x800 and standby["replay_lag_s"] == 0.5
+
+
+@mock.patch("agent.replication.prepare_primary")
+@mock.patch("agent.fleet.start_instance", return_value={"status": "started"})
+@mock.patch("agent.replication.subprocess.run")
+def test_add_replicas_shares_the_primary_build(run, start, _prepare, tmp_path):
+    work = _primary(tmp_path)
+
+    def fake_run(cmd, **kw):
+        if cmd[0].endswith("pg_basebackup"):
+            datadir = pathlib.Path(cmd[cmd.index("-D") + 1])
+            datadir.mkdir(parents=True)
+            (datadir / "PG_VERSION").write_text("18\n")
+        return mock.Mock(returncode=1 if cmd[:2] == ["git", "-C"] else 0, stdout="", stderr="")
+    run.side_effect = fake_run
+
+    added = replication.add_replicas("pri", count=2)
+    assert [r["label"] for r in added] == ["pri-r1", "pri-r2"]
+    backup = run.call_args_list[0].args[0]
+    assert backup[0] == str(work / "install" / "bin" / "pg_basebackup")
+    assert {"-R", "-C"} <= set(backup) and backup[backup.index("-S") + 1] == "pgdbg_pri_r1"
+
+    r2 = registry.get_instance("pri-r2")
+    assert r2["path"] == str(work) and r2["datadir"] == str(work / "replica_2")
+    assert (r2["role"], r2["primary"], r2["group"], r2["mode"]) == ("replica", "pri", "pri", "streaming")
+    assert registry.get_instance("pri")["role"] == "primary"
+    assert fleet._datadir(r2) == work / "replica_2"
+    assert "cluster_name = 'pri-r2'" in (work / "replica_2" / "postgresql.auto.conf").read_text()
+    assert [*replication.members("pri")] == ["pri", "pri-r1", "pri-r2"]
+
+
+@mock.patch("agent.replication._drop_slot")
+@mock.patch("agent.fleet.stop_instance")
+def test_replicas_are_measured_and_evicted_on_their_own(stop, drop_slot, tmp_path):
+    work = _primary(tmp_path)
+    replica = work / "replica_1"
+    (replica / "base").mkdir(parents=True)
+    (replica / "base" / "1259").write_bytes(b"x" * 30_000)
+    registry.add_instance("pri-r1", 58001, work, datadir=str(replica), primary="pri", group="pri", role="replica")
+    old = time.time() - 7200
+    for label in ("pri", "pri-r1"):
+        registry.update_instance(label, last_used=old)
+
+    pri, rep = storage.record("pri"), storage.record("pri-r1")
+    assert rep["data"] == rep["total"] and 30_000 <= rep["total"] < 40_000
+    assert pri["data"] < 30_000            # the replica is not counted twice
+
+    # install can't go while the replica runs from it; the replica goes first
+    report = storage.enforce(cap=1)
+    assert [(a["label"], a["evict"]) for a in report["actions"]] == [("pri-r1", "sandbox"), ("pri", "sandbox")]
+    assert not work.exists() and registry.list_instances() == {}
+    assert drop_slot.call_args.args[0] == "pri-r1"     # the primary keeps no WAL for it
+
+
+@mock.patch("agent.replication._drop_slot")
+@mock.patch("agent.fleet.stop_instance")
+def test_gc_tears_down_dead_replica_but_keeps_live_primary(stop, drop_slot, tmp_path):
+    work = _primary(tmp_path)
+    replica = work / "replica_1"
+    (replica / "base").mkdir(parents=True)
+    (replica / "base" / "1259").write_bytes(b"x" * 30_000)
+    registry.add_instance("pri-r1", 58001, work, datadir=str(replica), primary="pri", role="replica", slot="s1")
+
+    with mock.patch("agent.fleet.health.check_all", return_value={"pri": True, "pri-r1": False}):
+        report = fleet.gc()
+    assert report["dead_entries"] == ["pri-r1"] and report["freed_bytes"] >= 30_000
+    assert not replica.exists() and (work / "install").exists()
+    assert [*registry.list_instances()] == ["pri"]
+    drop_slot.assert_called_once()
+
+
+def test_default_session_sandbox_is_never_a_replica(tmp_path):
+    from agent import llm_agent
+
+    work = tmp_path / "pgdbg_pri"
+    registry.add_instance("pri-r1", 58001, work, datadir=str(work / "replica_1"), primary="pri", role="replica")
+    _primary(tmp_path)          # registered after its replica
+    with mock.patch("agent.llm_agent.health.check_all", side_effect=lambda inst: dict.fromkeys(inst, True)):
+        assert llm_agent._ensure_sandbox(None) == ("pri", 58000)
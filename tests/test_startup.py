@@ -0,0 +1,36 @@
+"""Startup guards: scripts call `list` / `apply-patch` in tight loops."""
+import json, os, pathlib, subprocess, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+HEAVY = ("openai", "psycopg", "requests", "bs4", "agent.llm_agent", "agent.tools.pg_manager")
+LIST_BUDGET_SECONDS = 1.5
+
+
+def _python(code_or_args, tmp_path):
+    env = {**os.environ, "HOME": str(tmp_path)}
+    env.pop("OPENAI_API_KEY", None)
+    args = ["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+
+
+def test_cli_import_skips_heavy_modules(tmp_path):
+    proc = _python(
+        "import sys, json, agent.cli\n"
+        f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))",
+        tmp_path,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout) == []
+
+
+def test_list_is_fast_without_api_key(tmp_path):
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        proc = _python(["-m", "agent.cli", "list"], tmp_path)
+        timings.append(time.perf_counter() - start)
+        assert proc.returncode == 0, proc.stderr
+        assert json.loads(proc.stdout) == {}
+    assert sorted(timings)[1] < LIST_BUDGET_SECONDS, timings
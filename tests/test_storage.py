@@ -0,0 +1,145 @@
+import subprocess
+import time
+from unittest import mock
+
+import pytest
+
+from agent import registry, storage
+from agent.tools import pg_manager
+
+
+def _worktree(base, name, build=0, install=0, data=0, source=4096):
+    work = base / name
+    for sub, size, fname in (("src", source, "a.c"), ("src", build, "a.o"),
+                             ("install/bin", install, "postgres"), ("data/base", data, "1259")):
+        if size:
+            (work / sub).mkdir(parents=True, exist_ok=True)
+            (work / sub / fname).write_bytes(b"x" * size)
+    return work
+
+
+def test_parse_size():
+    assert storage.parse_size("50G") == 50 * 1024 ** 3
+    assert storage.parse_size("1.5m") == int(1.5 * 1024 ** 2)
+    assert storage.parse_size("4096") == 4096
+    with pytest.raises(ValueError):
+        storage.parse_size("lots")
+
+
+def test_measure_uses_git_ignores_for_build_output(tmp_path):
+    work = _worktree(tmp_path, "pgdbg_a", build=40_000, install=20_000, data=10_000)
+    (work / "src" / "postgres").write_bytes(b"x" * 30_000)     # linked binary, no suffix
+    (work / ".gitignore").write_text("*.o\n/src/postgres\n")
+    subprocess.run(["git", "init", "-q", str(work)], check=True)
+
+    usage = storage.measure(work)
+    assert usage["build"] >= 70_000
+    assert 20_000 <= usage["install"] < 40_000 and 10_000 <= usage["data"] < 20_000
+    assert usage["total"] == sum(usage[p] for p in storage.PARTS)
+
+
+@mock.patch("agent.fleet.stop_instance")
+@mock.patch("agent.storage.subprocess.run")
+def test_enforce_evicts_build_then_install_then_sandbox_lru(run, stop, tmp_path):
+    mb = 1024 * 1024
+    old = time.time() - 7200
+    for i, name in enumerate(("oldest", "older", "busy")):
+        work = _worktree(tmp_path, f"pgdbg_{name}", build=mb, install=mb, data=mb)
+        registry.add_instance(name, 58000 + i, work)
+        registry.update_instance(name, last_used=old + i if name != "busy" else time.time())
+
+    def fake_run(cmd, cwd=None, **kw):
+        if cmd[:3] == ["make", "-s", "clean"]:
+            for obj in cwd.rglob("*.o"):
+                obj.unlink()
+        return mock.Mock(returncode=1)      # git: not a checkout, classify by suffix
+    run.side_effect = fake_run
+
+    # three sandboxes of ~3MB each; a 7MB cap costs both idle ones their build objects
+    report = storage.enforce(cap=7 * mb + 100_000)
+    assert [(a["label"], a["evict"]) for a in report["actions"]] == [("oldest", "build"), ("older", "build")]
+    assert registry.get_instance("oldest")["evicted"] == ["build"]
+
+    report = storage.enforce(cap=5 * mb)
+    assert [(a["label"], a["evict"]) for a in report["actions"]] == [
+        ("oldest", "install"), ("older", "install"), ("oldest", "sandbox")]
+    assert not (tmp_path / "pgdbg_oldest").exists()
+    assert registry.get_instance("oldest") is None
+    assert not (tmp_path / "pgdbg_older" / "install").exists()
+    assert (tmp_path / "pgdbg_busy" / "install").exists()      # used recently: never touched
+
+
+def test_sandbox_dir_is_passed_to_mkdtemp(tmp_path, monkeypatch):
+    seen = {}
+
+    def mkdtemp(prefix, dir=None):
+        seen["dir"] = dir
+        raise RuntimeError("stop here")
+
+    monkeypatch.setenv(storage.SANDBOX_DIR_ENV, str(tmp_path / "nvme"))
+    monkeypatch.setattr(pg_manager.tempfile, "mkdtemp", mkdtemp)
+    with pytest.raises(RuntimeError):
+        pg_manager.fresh_clone_and_launch("x")
+    assert seen["dir"] == str(tmp_path / "nvme") and (tmp_path / "nvme").is_dir()
+
+
+def test_enforce_reuses_recent_measurements(tmp_path):
+    work = _worktree(tmp_path, "pgdbg_a", data=4096)
+    registry.add_instance("a", 58000, work)
+    storage.record("a")
+    with mock.patch("agent.storage.measure", wraps=storage.measure) as measure:
+        storage.enforce(cap=10 * 1024 ** 3)
+        measure.assert_not_called()
+        storage.refresh()               # the `usage` command still measures afresh
+        measure.assert_called_once()
+
+
+@mock.patch("agent.batch.fresh_clone_and_launch")
+@mock.patch("agent.batch.health.is_live", return_value=False)
+def test_evicted_sandboxes_are_restored_not_dropped(_live, clone, monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from agent import batch, llm_agent
+
+    registry.add_instance("batch-0", 58000, _worktree(tmp_path, "pgdbg_b0"), evicted=["install"])
+    with mock.patch("agent.storage.restore", return_value={"status": "started"}) as restore:
+        batch._ensure_live("batch-0")
+    restore.assert_called_once_with("batch-0")
+    clone.assert_not_called()
+    assert registry.get_instance("batch-0")
+
+    # the default session sandbox restores it too, and never prunes it
+    dead = mock.patch("agent.llm_agent.health.check_all", side_effect=lambda inst: dict.fromkeys(inst, False))
+    with dead, mock.patch("agent.storage.restore", return_value={"status": "started"}) as restore:
+        assert llm_agent._ensure_sandbox(None) == ("batch-0", 58000)
+    restore.assert_called_once_with("batch-0")
+    with dead, mock.patch("agent.storage.restore", side_effect=RuntimeError("no make")), \
+            mock.patch("agent.llm_agent.fresh_clone_and_launch", return_value=(58001, tmp_path)):
+        assert llm_agent._ensure_sandbox(None) == ("default", 58001)
+    assert registry.get_instance("batch-0")
+
+
+@mock.patch("agent.storage.restore")
+def test_default_sandbox_is_never_cloned_over(restore, monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from agent import llm_agent
+
+    registry.add_instance("default", 58000, _worktree(tmp_path, "pgdbg_d"), evicted=["build"])
+    with mock.patch("agent.llm_agent.health.check_all", side_effect=lambda inst: dict.fromkeys(inst, True)):
+        assert llm_agent._ensure_sandbox(None) == ("default", 58000)     # still running: used as is
+    restore.assert_not_called()
+
+    restore.side_effect = subprocess.CalledProcessError(2, "make")
+    with mock.patch("agent.llm_agent.health.check_all", side_effect=lambda inst: dict.fromkeys(inst, False)), \
+            mock.patch("agent.llm_agent.fresh_clone_and_launch", return_value=(58001, tmp_path)) as clone:
+        assert llm_agent._ensure_sandbox(None) == ("default-2", 58001)
+    clone.assert_called_once_with("default-2")
+    assert registry.get_instance("default")["port"] == 58000
+
+
+def test_rebuild_clears_eviction(tmp_path):
+    work = _worktree(tmp_path, "pgdbg_e")
+    (work / "a.c").write_text("old")
+    registry.add_instance("e", 58000, work, evicted=["build", "install"])
+    with mock.patch.object(pg_manager, "_rebuild_and_install"):
+        pg_manager.edit_and_rebuild("a.c", "new", "e")
+    assert registry.get_instance("e")["evicted"] == []
@@ -0,0 +1,74 @@
+import asyncio
+import random
+
+import pytest
+
+from agent.tools import workload
+
+
+class Deadlock(Exception):
+    sqlstate = "40P01"
+
+
+class FakeConn:
+    def __init__(self, log):
+        self.log = log
+        self.updates = 0
+
+    async def execute(self, sql):
+        self.log.append(sql)
+        if sql.startswith("UPDATE"):
+            self.updates += 1
+            if self.updates % 3 == 0:
+                raise Deadlock()
+        await asyncio.sleep(0)
+
+    async def close(self):
+        pass
+
+
+def test_render_sql_placeholders():
+    rng = random.Random(0)
+    sql = workload.render_sql("UPDATE t SET c = {client} WHERE id = {rand:1:1} -- {iteration}", 7, 3, rng)
+    assert sql == "UPDATE t SET c = 7 WHERE id = 1 -- 3"
+
+
+def test_validate_and_save_roundtrip():
+    with pytest.raises(ValueError):
+        workload.validate({"clients": [{"count": 2}]})
+    scen = {"name": "hot-row", "clients": [{"script": ["SELECT 1"], "count": 2}]}
+    workload.save_scenario(scen)
+    assert workload.list_scenarios() == ["hot-row"]
+    loaded = workload.load_scenario("hot-row")
+    assert loaded["clients"][0]["count"] == 2 and loaded["duration"] == 10.0
+
+
+def test_summarize_latencies_percentiles_and_buckets():
+    stats = workload.summarize_latencies([float(i) for i in range(1, 101)])
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == 51.0 and stats["p99_ms"] == 99.0 and stats["max_ms"] == 100.0
+    assert stats["histogram"]["<=1ms"] == 1 and stats["histogram"]["<=100ms"] == 50
+
+
+def test_run_counts_deadlocks_and_rolls_back():
+    log = []
+
+    async def connect():
+        return FakeConn(log)
+
+    scen = workload.validate({
+        "name": "t",
+        "setup": ["CREATE TABLE t (id int)"],
+        "teardown": ["DROP TABLE t"],
+        "duration": 0.05,
+        "clients": [{"name": "w", "count": 2, "script": ["BEGIN", "UPDATE t SET id = 1", "COMMIT"]}],
+    })
+    result = asyncio.run(workload._run(scen, connect))
+
+    assert result["clients"] == 2
+    assert result["deadlocks"] > 0 and result["errors"] == {"40P01": result["deadlocks"]}
+    assert log[0] == "CREATE TABLE t (id int)" and log[-1] == "DROP TABLE t"
+    assert "ROLLBACK" in log
+    update = next(k for k in result["statements"] if "UPDATE" in k)
+    assert result["statements"][update]["errors"] == {"40P01": result["deadlocks"]}
+    assert sum(result["throughput"]) == sum(s["count"] for s in result["statements"].values())